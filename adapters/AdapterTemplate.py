@@ -9,9 +9,33 @@ from typing import List, Union
 
 import config
 import utils.logger_utils as logger_utils
+import utils.tracing_utils as tracing_utils
 from utils.tbcs_api import TbcsApi
 
 
+class SessionContext():
+    """
+    Context of a Test Session, shared by all adapters executing Test Cases of the session.
+    """
+
+    def __init__(self, tbcs: TbcsApi, product_id: str, test_session_id: str):
+        self.tbcs: TbcsApi = tbcs
+        self.product_id: str = product_id
+        self.test_session_id: str = test_session_id
+        # Test Cases (id => Test Case) and rows of DDT tables ((Test Case id, table id) => {row id: row}) requested
+        # once per session (managed by the agent)
+        self.test_cases: dict = {}
+        self.ddt_tables: dict = {}
+        # (Test Case id, table id) => True if concrete Test Cases of the table can be expanded locally (managed by the
+        # agent)
+        self.ddt_expansion: dict = {}
+        # file id => path of a downloaded attachment in the directory 'attachment_dir' (managed by the agent)
+        self.attachments: dict = {}
+        self.attachment_dir: Union[TemporaryDirectory, None] = None
+        # adapter classes used in the session => True if their setup succeeded (managed by the agent)
+        self.adapters: dict = {}
+
+
 class AdapterTemplate(ABC):
 
     # public variables needed by agent
@@ -19,6 +43,54 @@ class AdapterTemplate(ABC):
     test_case_id: str
     execution_id: str
 
+    # Capabilities of the adapter, used by the agent for scheduling (only values differing from these need to be set):
+    # - batching: executions are collected and run together; the handle returned by execute_test_case starts the run
+    #   when the agent polls it the first time
+    # - max_parallel: maximum number of executions of the adapter running in parallel (0: no limit)
+    # - in_process: tests are run within the agent process
+    capabilities: dict = {'batching': False, 'max_parallel': 0, 'in_process': False}
+
+    # Context of the Test Session currently executed, set by the agent before setup_session() is called
+    session: Union[SessionContext, None] = None
+
+    @classmethod
+    def setup_session(cls, session: SessionContext) -> None:
+        """
+        This method is called once per Test Session, before the first Test Case of the session is executed with this
+        adapter.
+
+        Preparations needed by all Test Cases (e.g. creating directories, building indexes, starting tools or opening
+        connections) should be done here instead of in __init__. Their results can be kept in class variables (reset
+        in teardown_session()), the instances can access the context as self.session.
+
+        Parameters
+        ----------
+        session: SessionContext
+            Context of the Test Session
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    @classmethod
+    def teardown_session(cls, session: SessionContext) -> None:
+        """
+        This method is called once per Test Session, after the results of all Test Cases of the session have been
+        collected and final_cleanup() was called for each of them.
+
+        Parameters
+        ----------
+        session: SessionContext
+            Context of the Test Session
+
+        Returns
+        -------
+        None
+        """
+        pass
+
     # Default constructor for adapter initialization
     @abstractmethod
     def __init__(self, tbcs: TbcsApi, concrete_test_case: dict, abstract_test_case: dict, execution_id: str,
@@ -106,13 +178,14 @@ class AdapterTemplate(ABC):
 
         self.__logger.info(f"Starting Test Case: {self.__test_case_name} ...")
 
+        # The environment contains the trace context of the agent (if tracing is on), tools may continue the trace
         try:
             if parallel:
                 # Call to execute test cases parallel
-                return subprocess.Popen(call, shell=True)
+                return subprocess.Popen(call, shell=True, env=tracing_utils.get_env())
             else:
                 # Call to execute test cases sequential
-                return subprocess.run(call, shell=True)
+                return subprocess.run(call, shell=True, env=tracing_utils.get_env())
         except subprocess.SubprocessError as e:
             self.__logger.error(
                 f"Subprocess Exception occured for Test Case '{str(self.__test_case_name)}'!\n\t{e.__str__()}")
@@ -9,19 +9,191 @@ import subprocess
 from pathlib import Path
 
 import config
+import utils.artifact_utils as artifact_utils
+import utils.behave_utils as behave_utils
 import utils.comparison_utils as comparison_utils
 import utils.logger_utils as logger_utils
+import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.tbcs_api import TbcsApi
 
 from adapters.AdapterTemplate import AdapterTemplate
 
 
+class _UserStoryCache():
+    # User Stories of a Test Session by id; their names are used as feature names of the scenarios.
+    # Scenarios of a session usually belong to a few User Stories only, so each is requested once.
+
+    def __init__(self, tbcs, product_id):
+        self.__tbcs: TbcsApi = tbcs
+        self.__product_id = product_id
+        self.__logger = logger_utils.get_logger("BehaveUserStories", config.LOGLEVEL)
+        self.__user_stories = {}
+
+    def prefetch(self, user_story_ids):
+        # Requests all missing User Stories concurrently
+        missing = [str(id) for id in user_story_ids if id != None and str(id) not in self.__user_stories]
+        if missing:
+            self.__logger.debug(f"Requesting {len(set(missing))} User Story(s) ...")
+            self.__user_stories.update(
+                tbcs_utils.get_user_stories(self.__logger, self.__tbcs, self.__product_id, missing,
+                                            config.BEHAVE.get("prefetch_workers", 4)))
+            for id in missing:
+                # User Stories which could not be read are not requested again
+                self.__user_stories.setdefault(id, {})
+
+    def get_feature_name(self, user_story_id):
+        # Name of the User Story, "generic" if the Test Case has none
+        if user_story_id == None:
+            return "generic"
+        self.prefetch([user_story_id])
+        user_story = self.__user_stories.get(str(user_story_id))
+        if user_story == None or user_story.get('name', "") == "":
+            return "generic"
+        return user_story['name']
+
+
+class _BehaveBatch():
+    # One behave run for all scenarios of a Test Session. Scenarios are grouped by feature (User Story)
+    # into a few feature files. The run is started when the agent asks for its state the first time,
+    # i.e. after all Test Cases of the Test Session have been added.
+    __count = 0
+
+    def __init__(self, scenario_dir, result_dir, user_stories):
+        _BehaveBatch.__count += 1
+        self.number = _BehaveBatch.__count
+
+        self.__logger = logger_utils.get_logger("BehaveBatch_" + str(self.number), config.LOGLEVEL)
+        self.__name = f"tbcs-batch-{os.getpid()}-{self.number}"
+        self.__scenario_dir = scenario_dir
+        self.__result_file = result_dir + "/" + self.__name + ".json"
+        self.__user_stories = user_stories
+        self.__scenarios_to_run = []  # [(execution id, User Story id, scenario lines), ...]
+        self.__locations = {}  # execution id -> (feature file name, line of the scenario)
+        self.__feature_files = []
+        self.__started = False
+        self.__process = None
+        self.__span = None
+        self.__scenarios = None
+
+    @property
+    def started(self):
+        return self.__started
+
+    def add(self, execution_id, user_story_id, scenario_lines):
+        self.__scenarios_to_run.append((execution_id, user_story_id, scenario_lines))
+
+    def __start(self):
+        self.__started = True
+        self.__span = tracing_utils.get_tracer().start_span("behave_batch", {
+            'tbcs.batch': self.number,
+            'tbcs.scenarios': len(self.__scenarios_to_run)
+        })
+
+        try:
+            # feature names of all scenarios of the batch are requested at once
+            self.__user_stories.prefetch([user_story_id for _, user_story_id, _ in self.__scenarios_to_run])
+            features = {}  # feature name -> [(execution id, scenario lines), ...]
+            for execution_id, user_story_id, scenario_lines in self.__scenarios_to_run:
+                feature_name = self.__user_stories.get_feature_name(user_story_id)
+                features.setdefault(feature_name, []).append((execution_id, scenario_lines))
+
+            for number, (feature_name, scenarios) in enumerate(features.items()):
+                feature_file = f"{self.__scenario_dir}/{self.__name}-{number}.feature"
+                line = 3
+                with open(feature_file, "w", encoding="utf-8") as scFile:
+                    scFile.write("Feature: " + feature_name + "\n\n")
+                    for execution_id, scenario_lines in scenarios:
+                        self.__locations[execution_id] = (os.path.basename(feature_file), line)
+                        scFile.writelines(scenario_lines)
+                        scFile.write("\n")
+                        line += len(scenario_lines) + 1
+                self.__feature_files.append(feature_file)
+
+            self.__logger.info(f"Starting Behave batch run {self.number} with {len(self.__locations)} scenario(s) ...")
+            runner = config.BEHAVE.get("runner", "subprocess")
+            if runner in ("inprocess", "worker"):
+                self.__process = behave_utils.start_run(self.__feature_files, runner)
+            else:
+                call = ["behave", "-o", self.__result_file, "--format=json.pretty"]
+                call.extend(self.__feature_files)
+                self.__logger.debug(call)
+                self.__process = subprocess.Popen(call, env=tracing_utils.get_env(self.__span))
+        except Exception as e:
+            self.__logger.error(f"Starting Behave batch run {self.number} failed!\n\t{e.__str__()}")
+            self.__process = None
+            self.__span.set_error(e.__str__())
+            self.__span.end()
+
+    def poll(self):
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        return self.__process.poll()
+
+    @property
+    def returncode(self):
+        # waits for the batch to finish
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        returncode = self.__process.wait()
+        self.__span.end()  # type: ignore  # only the first call has an effect
+        return returncode
+
+    def is_finished(self):
+        return self.__started and (self.__process == None or self.__process.poll() != None)
+
+    def get_scenario(self, execution_id):
+        # Returns (feature, scenario) of the behave result for an execution; (None, None) if not found
+        self.returncode
+        location = self.__locations.get(execution_id)
+
+        if self.__scenarios == None:
+            self.__scenarios = {}
+            try:
+                if isinstance(self.__process, behave_utils.BehaveRun):
+                    # results were passed directly by the formatter
+                    for location_of_run in self.__locations.values():
+                        self.__scenarios[location_of_run] = self.__process.get_scenario(*location_of_run)
+                elif self.__process != None:
+                    with open(self.__result_file, 'r') as file:
+                        obj = json.load(file)
+                    for feature in obj:
+                        for scenario in feature.get("elements", []):
+                            file_name, line = scenario["location"].rsplit(":", 1)
+                            self.__scenarios[(os.path.basename(file_name), int(line))] = (feature, scenario)
+                    if config.BEHAVE["cleanup"]:
+                        os.remove(self.__result_file)
+
+                if config.BEHAVE["cleanup"]:
+                    for feature_file in self.__feature_files:
+                        os.remove(feature_file)
+            except Exception as e:
+                self.__logger.error(f"Failed to read result of Behave batch run {self.number}!\n\t{e.__str__()}")
+            logger_utils.remove_logger(self.__logger.name)
+
+        return self.__scenarios.get(location, (None, None))
+
+
 class Behave(AdapterTemplate):
 
     product_id: str
     test_case_id: str
     execution_id: str
 
+    capabilities = {
+        'batching': config.BEHAVE.get("batch", False),
+        'in_process': config.BEHAVE.get("runner", "subprocess") == "inprocess"
+    }
+
+    # open batch runs, see config.BEHAVE["batch"]
+    __batches = {}
+    # User Stories of the current Test Session, see setup_session()
+    __user_stories: _UserStoryCache = None  # type: ignore
+
     def __init__(self, tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir):
         self.product_id = str(concrete_test_case['productId'])
         self.test_case_id = str(concrete_test_case['id'])
@@ -31,6 +203,8 @@ class Behave(AdapterTemplate):
         self.__concrete_test_case = concrete_test_case
         self.__abstract_test_case = abstract_test_case
         self.__test_case_name = concrete_test_case['name']
+        self.__batch = None
+        self.__run = None
 
         # Create logger
         self.__logger = logger_utils.get_logger(self.__class__.__name__ + "_" + self.execution_id, config.LOGLEVEL)
@@ -43,13 +217,22 @@ class Behave(AdapterTemplate):
         self.__featureFileName = self.__scenario_dir + \
             "/" + self.__test_case_name + ".feature"
 
+        self.__logger.info("Adapter initialized")
+
+    @classmethod
+    def setup_session(cls, session):
         # Create folder for created files, if it doesn't exist
-        Path(self.__scenario_dir).mkdir(parents=True, exist_ok=True)
+        Path(config.BEHAVE['base_dir'] + config.BEHAVE['scenario_dir']).mkdir(parents=True, exist_ok=True)
 
         # Create result folder, if it doesn't exist
-        Path(self.__result_dir).mkdir(parents=True, exist_ok=True)
+        Path(config.BEHAVE['base_dir'] + config.BEHAVE['result_dir']).mkdir(parents=True, exist_ok=True)
 
-        self.__logger.info("Adapter initialized")
+        # User Stories are cached for the Test Session
+        Behave.__user_stories = _UserStoryCache(session.tbcs, session.product_id)
+
+    @classmethod
+    def teardown_session(cls, session):
+        Behave.__user_stories = None  # type: ignore
 
     def execute_test_case(self, parallel, ddt_row):
 
@@ -62,22 +245,74 @@ class Behave(AdapterTemplate):
         # Prepare name of Test Case - resolve varaibles, if any.
         self.__logger.info("Name of Test Case: " + self.__test_case_name)
 
+        # For feature name use name of parent user story, if test case has one.
+        # User Stories are cached for the Test Session.
+        userStoryId = self.__abstract_test_case.get('userStoryId')
+        key = (self.__tbcs.test_session_id, self.product_id)
+        if Behave.__user_stories == None:
+            # used without session setup
+            Behave.__user_stories = _UserStoryCache(self.__tbcs, self.product_id)
+
+        scenario_lines = self.__get_scenario_lines()
+
+        if config.BEHAVE.get("batch", False):
+            # collect all scenarios of the Test Session for a single behave run,
+            # the feature name is resolved when the batch starts
+            batch = Behave.__batches.get(key)
+            if batch == None or batch.started:
+                batch = _BehaveBatch(self.__scenario_dir, self.__result_dir, Behave.__user_stories)
+                Behave.__batches[key] = batch
+            batch.add(self.execution_id, userStoryId, scenario_lines)
+            self.__batch = batch
+            self.__logger.info(f"Scenario '{self.__test_case_name}' added to Behave batch run {batch.number}")
+            return batch
+
+        feature_name = Behave.__user_stories.get_feature_name(userStoryId)
+
         # Create feature file
         self.__logger.info("creating scenario file: " + self.__featureFileName)
         scFile = open(self.__featureFileName, "w", encoding="utf-8")
+        scFile.write("Feature: " + feature_name + "\n\n")
+        scFile.writelines(scenario_lines)
+        scFile.close()
 
-        # For feature name use name of parent user story, if test case has one.
-        feature_name = ""
-        if "userStoryId" in self.__abstract_test_case:
-            userStoryId = self.__abstract_test_case['userStoryId']
-            if userStoryId != None:
-                user_story = self.__tbcs.get_user_story(self.product_id, userStoryId)
-                feature_name = user_story['name']
-        if feature_name == "":
-            feature_name = "generic"
+        self.__resultFile = self.__result_dir + "/" + self.__test_case_name + ".json"
 
-        scFile.write("Feature: " + feature_name + "\n\n")
-        scFile.write("  Scenario: " + self.__test_case_name + "\n")
+        runner = config.BEHAVE.get("runner", "subprocess")
+        if runner in ("inprocess", "worker"):
+            # run behave via its runner API, results are passed directly by a formatter (no result file)
+            try:
+                self.__run = behave_utils.start_run([self.__featureFileName], runner)
+            except Exception as e:
+                self.__logger.error(f"Behave runner failed!\n\t{e.__str__()}")
+                return None
+            return self.__run
+
+        call = ["behave", "-o", self.__resultFile]
+
+        # Select output and test case to run
+        call.extend(["--format=json.pretty"])
+        call.extend([self.__featureFileName])
+
+        self.__logger.debug(call)
+
+        try:
+            if parallel:
+                # Call to execute behave cases parallel
+                result = subprocess.Popen(call, env=tracing_utils.get_env())
+            else:
+                # Call to execute behave test cases sequential
+                result = subprocess.run(call, env=tracing_utils.get_env())
+
+        except Exception as e:
+            self.__logger.error(f"Subprocess method failed!\n\t{e.__str__()}")
+            return None
+
+        return result
+
+    def __get_scenario_lines(self):
+        # Lines of the Gherkin scenario of this Test Case, the text of each step is kept in step['stepOutput']
+        lines = ["  Scenario: " + self.__test_case_name + "\n"]
 
         for blocks in self.__concrete_test_case["testSequence"]["testStepBlocks"]:
             if len(blocks["steps"]) > 0:
@@ -89,24 +324,24 @@ class Behave(AdapterTemplate):
                         if comparison_utils.is_equal_ignore_separators(
                                 blocks["title"], "Preparation") or comparison_utils.is_equal_ignore_separators(
                                     blocks["title"], "Given"):
-                            scFile.write("    Given ")
+                            line = "    Given "
                         elif comparison_utils.is_equal_ignore_separators(
                                 blocks["title"], "Test") or comparison_utils.is_equal_ignore_separators(
                                     blocks["title"], "When"):
-                            scFile.write("     When ")
+                            line = "     When "
                         elif comparison_utils.is_equal_ignore_separators(
                                 blocks["title"], "ResultCheck") or comparison_utils.is_equal_ignore_separators(
                                     blocks["title"], "Then"):
-                            scFile.write("     Then ")
+                            line = "     Then "
                         else:
-                            scFile.write("      And ")
+                            line = "      And "
                     else:
-                        scFile.write("      And ")
+                        line = "      And "
 
                     first = False
 
                     if step["testStepType"] == "TestStep":
-                        scFile.write(step["description"] + "\n")
+                        lines.append(line + step["description"] + "\n")
                         step['stepOutput'] = step["description"]
                     if step["testStepType"] == "Keyword":
                         kwd = self.__tbcs.get_keyword(self.product_id, step['keywordId'])
@@ -125,32 +360,9 @@ class Behave(AdapterTemplate):
 
                             step['stepOutput'] = kwd_text
 
-                        scFile.write(kwd_text + "\n")
-
-        scFile.close()
-
-        self.__resultFile = self.__result_dir + "/" + self.__test_case_name + ".json"
-        call = ["behave", "-o", self.__resultFile]
+                        lines.append(line + kwd_text + "\n")
 
-        # Select output and test case to run
-        call.extend(["--format=json.pretty"])
-        call.extend([self.__featureFileName])
-
-        self.__logger.debug(call)
-
-        try:
-            if parallel:
-                # Call to execute behave cases parallel
-                result = subprocess.Popen(call)
-            else:
-                # Call to execute behave test cases sequential
-                result = subprocess.run(call)
-
-        except Exception as e:
-            self.__logger.error(f"Subprocess method failed!\n\t{e.__str__()}")
-            return None
-
-        return result
+        return lines
 
     def check_result(self, executed_cmd):
         # Check if behave call failed
@@ -158,23 +370,45 @@ class Behave(AdapterTemplate):
 
         # read result file
         try:
-            self.__tbcs.upload_file_to_execution(self.product_id, self.test_case_id, self.execution_id,
-                                                 self.__resultFile)
-
-            with open(self.__resultFile, 'r') as file:
-                obj = json.load(file)
-
             myScenario = {}
             verdict = "open"
-            for features in obj:
-                if "elements" in features:
-                    for scenarios in features["elements"]:
-                        if scenarios["name"] == self.__test_case_name:
-                            verdict = scenarios["status"]
-                            myScenario = scenarios
+            if self.__batch != None or self.__run != None:
+                if self.__batch != None:
+                    myFeature, scenario = self.__batch.get_scenario(self.execution_id)
+                else:
+                    # the scenario of a single feature file starts in line 3
+                    myFeature, scenario = self.__run.get_scenario(self.__featureFileName, 3)  # type: ignore
+                if scenario != None:
+                    verdict = scenario["status"]
+                    myScenario = scenario
+
+                    # result file of this scenario only
+                    self.__resultFile = self.__result_dir + "/" + self.__test_case_name + ".json"
+                    with open(self.__resultFile, 'w') as file:
+                        json.dump([dict(myFeature, elements=[myScenario])], file, indent=2)
+                    artifact_utils.get_uploader().upload(self.__tbcs, self.product_id, self.test_case_id,
+                                                         self.execution_id, [self.__resultFile], self.__test_case_name)
+                    if config.BEHAVE["cleanup"]:
+                        os.remove(self.__resultFile)
+                # the scenario's own result decides (not the result of the whole batch)
+                returncode = 0 if verdict == "passed" else 1
+            else:
+                artifact_utils.get_uploader().upload(self.__tbcs, self.product_id, self.test_case_id, self.execution_id,
+                                                     [self.__resultFile], self.__test_case_name)
+
+                with open(self.__resultFile, 'r') as file:
+                    obj = json.load(file)
+
+                for features in obj:
+                    if "elements" in features:
+                        for scenarios in features["elements"]:
+                            if scenarios["name"] == self.__test_case_name:
+                                verdict = scenarios["status"]
+                                myScenario = scenarios
 
             if verdict != "open":
                 # try to associate steps in TestBench with steps in behave result file - normally, that should work 1:1
+                step_results = []
                 stepCount = 0
                 for blocks in self.__concrete_test_case["testSequence"]["testStepBlocks"]:
                     if len(blocks["steps"]) > 0:
@@ -187,15 +421,17 @@ class Behave(AdapterTemplate):
                                 # if a step fails, the following steps will not receive a result - thus it could be missing
                                 if "result" in gherkinStep:
                                     if gherkinStep["result"]["status"] == "passed":
-                                        self.__tbcs.report_step_result(self.product_id, self.test_case_id, step['id'],
-                                                                       self.execution_id, {"result": "Passed"})
+                                        step_results.append((step['id'], {"result": "Passed"}))
                                     if gherkinStep["result"]["status"] == "failed":
-                                        self.__tbcs.report_step_result(self.product_id, self.test_case_id, step['id'],
-                                                                       self.execution_id, {"result": "Failed"})
+                                        step_results.append((step['id'], {"result": "Failed"}))
 
                             stepCount = stepCount + 1
 
-            if config.BEHAVE["cleanup"]:
+                tbcs_utils.report_step_results(self.__logger, self.__tbcs, self.product_id, self.test_case_id,
+                                               self.execution_id, step_results,
+                                               getattr(config, "RESULT_UPLOAD_WORKERS", 4))
+
+            if config.BEHAVE["cleanup"] and self.__batch == None:
                 os.remove(self.__featureFileName)
         except Exception as e:
             self.__logger.error(f"Failed to import result!\n\t{e.__str__()}")
@@ -213,6 +449,9 @@ class Behave(AdapterTemplate):
     def final_cleanup(self):
         self.__logger.info('Final cleanup')
         # Do some adapter specific cleanup
+        for key, batch in list(Behave.__batches.items()):
+            if batch.is_finished():
+                del Behave.__batches[key]
 
         # remove logger instances (save memory)
         logger_utils.remove_logger(self.__logger.name)
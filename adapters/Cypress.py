@@ -5,23 +5,186 @@
 
 import codecs
 import glob
+import json
 import os
 import re
 import subprocess
+import time
 from pathlib import Path
 
 import config
+import utils.cypress_utils as cypress_utils
 import utils.logger_utils as logger_utils
+import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 
 from adapters.AdapterTemplate import AdapterTemplate
 
 
+def _get_trace_env(span=None):
+    # Trace context for the result reporter (Cypress.env('traceparent')), see tracing_utils.get_traceparent()
+    traceparent = tracing_utils.get_traceparent(span)
+    return ",traceparent=" + traceparent if traceparent else ""
+
+
+class _CypressBatch():
+    # One "cypress run" for several Test Cases (all it() are marked with it.only in temporary specs).
+    # The run is started when the agent asks for its state the first time, i.e. after all Test Cases
+    # of the Test Session have been added. Results are read from the file written by the result reporter.
+    __count = 0
+
+    def __init__(self, tbcs, product_id, tmp_file_ending):
+        _CypressBatch.__count += 1
+        self.number = _CypressBatch.__count
+
+        self.__logger = logger_utils.get_logger("CypressBatch_" + str(self.number), config.LOGLEVEL)
+        self.__tbcs = tbcs
+        self.__product_id = product_id
+        self.__tmp_file_ending = f".b{self.number}{tmp_file_ending}"
+        self.__tests = {}  # External ID -> (spec file, line of it(), execution id)
+        self.__started = False
+        self.__start_time = 0.0
+        self.__process = None
+        self.__span = None
+        self.__results = None
+        self.__reports = None
+        self.__result_file = os.path.abspath(
+            os.path.join(config.CYPRESS["base_dir"], config.CYPRESS["result_dir"],
+                         f"tbcs-batch-{os.getpid()}-{self.number}.jsonl"))
+
+    def add(self, external_id, spec_file, it_line, execution_id):
+        # a Test Case can be contained only once (e.g. several DDT rows need several runs)
+        if self.__started or external_id in self.__tests:
+            return False
+        self.__tests[external_id] = (spec_file, it_line, execution_id)
+        return True
+
+    def __start(self):
+        self.__started = True
+        self.__start_time = time.time()
+        self.__span = tracing_utils.get_tracer().start_span("cypress_batch", {
+            'tbcs.batch': self.number,
+            'tbcs.tests': len(self.__tests)
+        })
+
+        # one temporary spec per spec file, containing an it.only for every Test Case of the batch
+        spec_lines = {}
+        for spec_file, it_line, _ in self.__tests.values():
+            spec_lines.setdefault(spec_file, []).append(it_line)
+
+        specs = []
+        try:
+            for spec_file, it_lines in spec_lines.items():
+                with open(spec_file) as org:
+                    fileContents = org.readlines()
+                for it_line in it_lines:
+                    fileContents[it_line - 1] = re.sub(r'\b(it|specify)(\s*\()',
+                                                       r'\1.only\2',
+                                                       fileContents[it_line - 1],
+                                                       count=1)
+                with open(spec_file + self.__tmp_file_ending, 'w') as f:
+                    f.writelines(fileContents)
+                # file name sytax especially for Cypress
+                specs.append(config.CYPRESS["cypress_spec_folder"] + '/**/' + os.path.basename(spec_file) +
+                             self.__tmp_file_ending)
+
+            os.makedirs(os.path.dirname(self.__result_file), exist_ok=True)
+            if os.path.isfile(self.__result_file):
+                os.remove(self.__result_file)
+
+            executions = "|".join([f"{external_id}:{test[2]}" for external_id, test in self.__tests.items()])
+            call = [
+                config.CYPRESS["cypress_bin"], "run", "--env",
+                "executions=" + executions + ",resultfile=" + self.__result_file + ",tenantid=" +
+                self.__tbcs.tenant_id + ",productid=" + self.__product_id + ",tbcsurl=" + config.ACCOUNT["TBCS_BASE"] +
+                ",sessiontoken=" + self.__tbcs.session_token + _get_trace_env(self.__span), "--spec", ",".join(specs)
+            ]
+
+            self.__logger.info(f"Starting Cypress batch run {self.number} with {len(self.__tests)} Test Case(s) ...")
+            self.__process = subprocess.Popen(call,
+                                              cwd=config.CYPRESS["base_dir"],
+                                              env=tracing_utils.get_env(self.__span))
+        except Exception as e:
+            self.__logger.error(f"Starting Cypress batch run {self.number} failed!\n\t{e.__str__()}")
+            self.__process = None
+            self.__span.set_error(e.__str__())
+            self.__span.end()
+
+    def poll(self):
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        return self.__process.poll()
+
+    @property
+    def returncode(self):
+        # waits for the batch to finish
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        returncode = self.__process.wait()
+        self.__span.end()  # type: ignore  # only the first call has an effect
+        return returncode
+
+    def is_running(self):
+        return self.__process != None and self.__process.poll() == None
+
+    def is_finished(self):
+        return self.__started and not self.is_running()
+
+    def get_reports(self, pattern):
+        # reports written by this run (read once for all Test Cases of the batch)
+        if self.__reports == None:
+            self.returncode
+            self.__reports = cypress_utils.read_reports(self.__logger, pattern, self.__start_time - 1)
+        return self.__reports
+
+    def result(self, external_id, report=None):
+        returncode = self.returncode
+
+        if self.__results == None:
+            self.__results = {}
+            try:
+                with open(self.__result_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            result = json.loads(line)
+                            self.__results[result['externalId']] = result['failed']
+                if config.CYPRESS["cleanup"]:
+                    os.remove(self.__result_file)
+            except (OSError, ValueError, KeyError) as e:
+                self.__logger.debug(f"No results of Cypress batch run {self.number} found\n\t{e.__str__()}")
+            logger_utils.remove_logger(self.__logger.name)
+
+        if external_id in self.__results:
+            return "Failed" if self.__results[external_id] else "Passed"
+
+        if report != None and not report['skipped']:
+            return "Failed" if report['failed'] else "Passed"
+
+        # reporter not set up (or Test Case not run): only the exit code (number of failed tests) is known
+        return "Passed" if returncode == 0 else "Failed"
+
+
 class Cypress(AdapterTemplate):
     # public variables needed by agent
     product_id: str
     test_case_id: str
     execution_id: str
 
+    capabilities = {'batching': config.CYPRESS.get("batch", "") != ""}
+
+    # External ID -> spec file index, shared by all instances and refreshed once per Test Session
+    __spec_index: cypress_utils.SpecIndex = None  # type: ignore
+
+    # ending of temporary spec files
+    __tmpFileEnding = ".tbcs-agent-temp.js"
+
+    # open batch runs, see config.CYPRESS["batch"]
+    __batches = {}
+
     def __init__(self, tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir):
         self.product_id = str(concrete_test_case['productId'])
         self.test_case_id = str(concrete_test_case['id'])
@@ -29,20 +192,56 @@ class Cypress(AdapterTemplate):
 
         self.__test_case_name = str(concrete_test_case['name'])
         self.__tbcs = tbcs
+        self.__concrete_test_case = concrete_test_case
         self.__external_id = concrete_test_case['automation']['externalId']
         self.__execution_id = execution_id
-        self.__tmpFileEnding = ".tbcs-agent-temp.js"
+        self.__batch = None
+        self.__run_start = 0.0
 
         # Create logger
         self.__logger = logger_utils.get_logger(self.__class__.__name__ + "_" + self.__execution_id, config.LOGLEVEL)
 
-        # create file for test session ID
-        self.__test_session_id_file = Path(config.CYPRESS['base_dir'] + "/testSessionId.txt")
-        file = codecs.open(str(self.__test_session_id_file), "w", "utf-8")
-        file.write(self.__tbcs.test_session_id)
+        self.__logger.info("Adapter initialized")
+
+    @classmethod
+    def setup_session(cls, session):
+        logger = logger_utils.get_logger(cls.__name__, config.LOGLEVEL)
+
+        # create file for test session ID (read by the TBCS reporter of the Cypress project)
+        file = codecs.open(str(cls.__get_test_session_id_file()), "w", "utf-8")
+        file.write(session.test_session_id)
         file.close()
 
-        self.__logger.info("Adapter initialized")
+        # bring the spec index up to date once per Test Session
+        cls.__get_spec_index(logger).refresh()
+
+    @classmethod
+    def teardown_session(cls, session):
+        logger = logger_utils.get_logger(cls.__name__, config.LOGLEVEL)
+
+        # all batch runs of the session are finished
+        Cypress.__batches.clear()
+
+        # Do some adapter specific cleanup
+        fileList = glob.glob(os.path.join(config.CYPRESS["base_dir"], config.CYPRESS["cypress_spec_folder"]) + '/**/*' +
+                             cls.__tmpFileEnding,
+                             recursive=True)
+        # Iterate over the list of filepaths & remove each file.
+        for filePath in fileList:
+            try:
+                os.remove(filePath)
+            except OSError:
+                logger.error(f'Error while deleting file: {filePath}')
+
+        # remove file with test session id
+        try:
+            os.remove(cls.__get_test_session_id_file())
+        except OSError as e:
+            logger.debug(f'Deleting file {cls.__get_test_session_id_file()} failed.\n\t{e}')
+
+    @staticmethod
+    def __get_test_session_id_file():
+        return Path(config.CYPRESS['base_dir'] + "/testSessionId.txt")
 
     def execute_test_case(self, parallel, _):
         if not str(self.__external_id):
@@ -56,111 +255,150 @@ class Cypress(AdapterTemplate):
         cypress_spec_folder = config.CYPRESS["cypress_spec_folder"]
 
         # find the test case by external ID within the specs
-        self.__logger.info(f"Scanning Cypres Specs for Test Case with 'External ID' '{self.__external_id}' ...")
-        file_found = ""
-        file_fullPath = ""
-        rootdir = os.path.join(cypress_root_folder, cypress_spec_folder)
-        for folder, _, files in os.walk(rootdir):
-            if file_found != "": break
-            for file in files:
-                if file.endswith(self.__tmpFileEnding): continue
-                if file_found != "": break
-                fullpath = os.path.join(folder, file)
-                with open(fullpath, 'r') as f:
-                    for line in f:
-                        if str(self.__external_id) in line:
-                            file_fullPath = fullpath
-                            file_found = cypress_spec_folder + '/**/' + file  # file name sytax especially for Cypress
-                            self.__logger.info(
-                                f"Test Case with 'External ID' '{self.__external_id}' found in Spec '{file_fullPath}'")
-                            break
-
-        if (file_found == ""):
+        self.__logger.info(f"Searching Cypres Specs for Test Case with 'External ID' '{self.__external_id}' ...")
+        spec_index = self.__get_spec_index(self.__logger)
+        found = spec_index.find(str(self.__external_id))
+        if found == None:
+            # the spec may have been added or changed during the Test Session
+            spec_index.refresh()
+            found = spec_index.find(str(self.__external_id))
+
+        if found == None:
             self.__logger.error(f"Test Case with 'External ID' '{self.__external_id}' not found! Skipping ...")
             return None
 
-        if self.__getTemporarySpec(file_fullPath, self.__tmpFileEnding) == None:
+        file_fullPath, it_line = found
+        # file name sytax especially for Cypress
+        file_found = cypress_spec_folder + '/**/' + os.path.basename(file_fullPath)
+        self.__logger.info(f"Test Case with 'External ID' '{self.__external_id}' found in Spec '{file_fullPath}'")
+
+        if config.CYPRESS.get("batch", "") in ("spec", "session"):
+            # group the Test Cases of a spec file (or of the whole Test Session) into one Cypress run
+            key = (self.__tbcs.test_session_id, self.product_id,
+                   file_fullPath if config.CYPRESS.get("batch", "") == "spec" else "")
+            batch = Cypress.__batches.get(key)
+            if batch == None or not batch.add(str(self.__external_id), file_fullPath, it_line, self.__execution_id):
+                batch = _CypressBatch(self.__tbcs, self.product_id, self.__tmpFileEnding)
+                batch.add(str(self.__external_id), file_fullPath, it_line, self.__execution_id)
+                Cypress.__batches[key] = batch
+            self.__batch = batch
+            self.__logger.info(f"Test Case '{str(self.__test_case_name)}' added to Cypress batch run {batch.number}")
+            return batch
+
+        if self.__getTemporarySpec(file_fullPath, self.__tmpFileEnding, it_line) == None:
             self.__logger.error("Failed to generate a temporary Spec file for single (it.only) execution! Skipping ...")
             return None
 
         call = [
             cypress_bin, "run", "--env",
             "extid=" + self.__execution_id + ",tenantid=" + self.__tbcs.tenant_id + ",productid=" + self.product_id +
-            ",tbcsurl=" + config.ACCOUNT["TBCS_BASE"] + ",sessiontoken=" + self.__tbcs.session_token, "--spec",
-            file_found + self.__tmpFileEnding
+            ",tbcsurl=" + config.ACCOUNT["TBCS_BASE"] + ",sessiontoken=" + self.__tbcs.session_token + _get_trace_env(),
+            "--spec", file_found + self.__tmpFileEnding
         ]
 
         self.__logger.info(f"Starting Test Case: {str(self.__test_case_name)} ...")
+        self.__run_start = time.time()
 
         # Wait for processes to finish if parallel == false
         try:
             if parallel:
                 # Call to execute test cases parallel
-                return subprocess.Popen(call, cwd=cypress_root_folder)
+                return subprocess.Popen(call, cwd=cypress_root_folder, env=tracing_utils.get_env())
             else:
                 # Call to execute test cases sequential
-                return subprocess.run(call, cwd=cypress_root_folder)
+                return subprocess.run(call, cwd=cypress_root_folder, env=tracing_utils.get_env())
         except Exception as e:
             self.__logger.error(
                 f"Subprocess Exception occured for Test Case '{str(self.__test_case_name)}'!\n\t{e.__str__()}")
             return None
 
     def check_result(self, executed_cmd):
-        # Check if call failed
+        # Wait for the run (a batch run is started now, if not done yet)
         returncode = executed_cmd['subprocess_instance'].returncode
 
-        if returncode == 0:
-            return "Passed"
+        # Find the result of this Test Case in the reports written by Cypress
+        report = None
+        if config.CYPRESS.get("report_files", ""):
+            pattern = os.path.join(config.CYPRESS["base_dir"], config.CYPRESS["report_files"])
+            if self.__batch != None:
+                reports = self.__batch.get_reports(pattern)
+            else:
+                reports = cypress_utils.read_reports(self.__logger, pattern, self.__run_start - 1)
+            report = reports.get('id:' + str(self.__external_id), reports.get('name:' + self.__test_case_name))
+            if report == None:
+                self.__logger.warning(f"No result for Test Case '{self.__test_case_name}' found in Cypress reports")
+
+        if self.__batch != None:
+            result = self.__batch.result(str(self.__external_id), report)
+        elif report != None and not report['skipped']:
+            result = "Failed" if report['failed'] else "Passed"
+        else:
+            # Check if call failed
+            result = "Passed" if returncode == 0 else "Failed"
 
-        return "Failed"
+        if report != None:
+            self.__report_step_results(report, result)
+
+        return result
+
+    def __report_step_results(self, report, result):
+        # Steps of the Test Case are the cy.log() lines of the it(), in the same order (see import_cypress.py)
+        test_steps = []
+        for block in self.__concrete_test_case["testSequence"]["testStepBlocks"]:
+            test_steps.extend(block["steps"])
+
+        executed = min(len(test_steps), len(report['steps']))
+        if executed == 0:
+            return
+        if executed < len(report['steps']):
+            self.__logger.debug(f"Cypress reported {len(report['steps'])} steps, Test Case has {len(test_steps)}")
+
+        step_results = []
+        for i in range(executed):
+            step_result = "Passed"
+            if result == "Failed" and i == executed - 1:
+                # the last executed step failed
+                step_result = "Failed"
+            step_results.append((str(test_steps[i]['id']), {"result": step_result}))
+
+        failed = tbcs_utils.report_step_results(self.__logger, self.__tbcs, self.product_id, self.test_case_id,
+                                                self.execution_id, step_results,
+                                                getattr(config, "RESULT_UPLOAD_WORKERS", 4))
+        if failed > 0:
+            self.__logger.error(f"{failed} step result(s) of Test Case '{self.__test_case_name}' could not be reported")
 
     # This method is called after all tests are executed.
     def final_cleanup(self):
         self.__logger.debug('Final cleanup')
-        # Do some adapter specific cleanup
-        fileList = glob.glob(os.path.join(config.CYPRESS["base_dir"], config.CYPRESS["cypress_spec_folder"]) + '/**/*' +
-                             self.__tmpFileEnding,
-                             recursive=True)
-        # Iterate over the list of filepaths & remove each file.
-        for filePath in fileList:
-            try:
-                os.remove(filePath)
-            except OSError:
-                self.__logger.error(f'Error while deleting file: {filePath}')
-
-        # remove file with test session id
-        try:
-            os.remove(self.__test_session_id_file)
-        except OSError as e:
-            self.__logger.debug(f'Deleting file {self.__test_session_id_file} failed.\n\t{e}')
+        # forget finished batch runs; temporary specs and the test session id are removed in teardown_session()
+        for key, batch in list(Cypress.__batches.items()):
+            if batch.is_finished():
+                del Cypress.__batches[key]
 
         # remove logger instances (save memory)
         logger_utils.remove_logger(self.__logger.name)
 
-    def __getTemporarySpec(self, specFileName, tmpFileEnding):
-        itPattern = "it\('.+',"  # pyright: reportInvalidStringEscapeSequence=false
-        lastItIndex = 0
-        fileContents = []
-        found = False
+    @classmethod
+    def __get_spec_index(cls, logger) -> cypress_utils.SpecIndex:
+        # Build (or load) the index once, it is brought up to date once per Test Session in setup_session(),
+        # so looking up a Test Case does not read any spec file
+        if Cypress.__spec_index == None:
+            Cypress.__spec_index = cypress_utils.SpecIndex(
+                logger, os.path.join(config.CYPRESS["base_dir"], config.CYPRESS["cypress_spec_folder"]),
+                config.CYPRESS.get("spec_index", ".tbcs_cypress_spec_index.json"), cls.__tmpFileEnding)
+        return Cypress.__spec_index
 
+    def __getTemporarySpec(self, specFileName, tmpFileEnding, itLine):
         with open(specFileName) as org:
             fileContents = org.readlines()
 
-        for i, line in enumerate(fileContents):
-            matchIt = re.search(itPattern, line)
-            if (matchIt):
-                lastItIndex = i
-
-            matchId = re.search(self.__external_id, line)
-            if (matchId):
-                fileContents[lastItIndex] = re.sub(r'it\(', 'it.only(', fileContents[lastItIndex])
-                found = True
-                break
-
-        if (found):
-            tmpFileName = specFileName + tmpFileEnding
-            with open(tmpFileName, 'w') as f:
-                for item in fileContents:
-                    f.write(item)
-            return tmpFileName
-        return None
+        # run only the it() of this Test Case
+        if itLine < 1 or itLine > len(fileContents):
+            return None
+        fileContents[itLine - 1] = re.sub(r'\b(it|specify)(\s*\()', r'\1.only\2', fileContents[itLine - 1], count=1)
+
+        tmpFileName = specFileName + tmpFileEnding
+        with open(tmpFileName, 'w') as f:
+            for item in fileContents:
+                f.write(item)
+        return tmpFileName
@@ -4,24 +4,158 @@
 #
 
 import json
+import os
 import subprocess
 from glob import glob
 from pathlib import Path
 from shutil import rmtree
 
 import config
+import utils.artifact_utils as artifact_utils
 import utils.comparison_utils as comparison_utils
 import utils.logger_utils as logger_utils
+import utils.robot_utils as robot_utils
+import utils.tracing_utils as tracing_utils
 
 from adapters.AdapterTemplate import AdapterTemplate
 
 
+def _get_variables(ddt_row):
+    # Variables section with the values of a DDT row
+    variables = "*** Variables ***\n"
+    for ddt_item in ddt_row:
+        variables += "${" + ddt_item['column'] + "}    " + ddt_item['value'] + "\n"
+    return variables + "\n"
+
+
+class _RFKdtBatch():
+    # One Robot Framework run for all rows of a DDT Test Case of a Test Session. Each row gets its own .robot file
+    # with the values of the row as variables (as for a single row), all files are run by a single robot call.
+    # The run is started when the agent asks for its state the first time, i.e. after all rows have been added.
+    # The results of all rows are read from the output.xml at once.
+    __count = 0
+
+    def __init__(self, tbcs, test_case_item, test_case_name, settings, test_body, script_dir, result_dir):
+        _RFKdtBatch.__count += 1
+        self.number = _RFKdtBatch.__count
+
+        self.__logger = logger_utils.get_logger("RFKdtBatch_" + str(self.number), config.LOGLEVEL)
+        self.__name = f"tbcs-ddt-{os.getpid()}-{self.number}"
+        self.__tbcs = tbcs
+        # Test Case with the keyword texts of its Test Steps, the same for all rows
+        self.test_case_item = test_case_item
+        self.__test_case_name = test_case_name
+        self.__settings = settings
+        self.__test_body = test_body
+        self.__script_dir = script_dir + "/" + self.__name
+        self.__result_dir = result_dir
+        self.__rows = []  # [(execution id, ddt row), ...]
+        self.__started = False
+        self.__process = None
+        self.__span = None
+        self.__results = None
+
+    @property
+    def started(self):
+        return self.__started
+
+    def add(self, execution_id, ddt_row):
+        self.__rows.append((execution_id, ddt_row))
+
+    def __get_test_name(self, execution_id):
+        return self.__test_case_name + " " + execution_id
+
+    def __start(self):
+        self.__started = True
+        self.__span = tracing_utils.get_tracer().start_span("robot_batch", {
+            'tbcs.batch': self.number,
+            'tbcs.rows': len(self.__rows)
+        })
+
+        try:
+            Path(self.__script_dir).mkdir(parents=True, exist_ok=True)
+            for execution_id, ddt_row in self.__rows:
+                test_name = self.__get_test_name(execution_id)
+                with open(self.__script_dir + "/" + test_name + ".robot", "w", encoding="utf-8") as robotFile:
+                    robotFile.write(self.__settings + _get_variables(ddt_row) + "*** Test Cases ***\n" + test_name +
+                                    self.__test_body)
+
+            # the results of the rows are read from the output.xml, the listener cannot tell the executions apart
+            call = [
+                "python", "-m", "robot", "--outputdir", self.__result_dir, "--log", self.__name + "-log.html",
+                "--report", self.__name + "-report.html", "--output", self.__name + "-output.xml", self.__script_dir
+            ]
+
+            self.__logger.info(f"Starting Robot Framework batch run {self.number} with {len(self.__rows)} row(s) ...")
+            self.__process = subprocess.Popen(call, env=tracing_utils.get_env(self.__span))
+        except Exception as e:
+            self.__logger.error(f"Starting Robot Framework batch run {self.number} failed!\n\t{e.__str__()}")
+            self.__process = None
+            self.__span.set_error(e.__str__())
+            self.__span.end()
+
+    def poll(self):
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        return self.__process.poll()
+
+    @property
+    def returncode(self):
+        # waits for the batch to finish
+        if not self.__started:
+            self.__start()
+        if self.__process == None:
+            return 1
+        returncode = self.__process.wait()
+        self.__span.end()  # type: ignore  # only the first call has an effect
+        return returncode
+
+    def is_finished(self):
+        return self.__started and (self.__process == None or self.__process.poll() != None)
+
+    def get_result(self, execution_id):
+        # Returns the result of the test of a row (see robot_utils.read_outputs()); None if not found
+        self.returncode
+
+        if self.__results == None:
+            self.__results = {}
+            try:
+                # Upload robot result files (in the background); they contain all rows,
+                # so they are uploaded to the execution of the first row only
+                result_files = [
+                    self.__result_dir + "/" + self.__name + file for file in ["-output.xml", "-log.html", "-report.html"]
+                ]
+                artifact_utils.get_uploader().upload(self.__tbcs, str(self.test_case_item['productId']),
+                                                     str(self.test_case_item['id']), self.__rows[0][0], result_files,
+                                                     self.__name)
+
+                if self.__process != None:
+                    for result in robot_utils.read_outputs(result_files[0],
+                                                           robot_utils.get_test_steps(self.test_case_item)):
+                        self.__results[result['name']] = result
+                if config.ROBOT_KDT['cleanup']:
+                    rmtree(self.__script_dir, ignore_errors=True)
+            except Exception as e:
+                self.__logger.error(
+                    f"Failed to read result of Robot Framework batch run {self.number}!\n\t{e.__str__()}")
+            logger_utils.remove_logger(self.__logger.name)
+
+        return self.__results.get(self.__get_test_name(execution_id))
+
+
 class RFKdt(AdapterTemplate):
 
     product_id: str
     test_case_id: str
     execution_id: str
 
+    capabilities = {'batching': config.ROBOT_KDT.get("ddt_batch", False)}
+
+    # open batch runs of DDT rows, see config.ROBOT_KDT["ddt_batch"]
+    __batches = {}
+
     def __init__(self, tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir):
         self.product_id = str(concrete_test_case['productId'])
         self.test_case_id = str(concrete_test_case['id'])
@@ -32,6 +166,7 @@ class RFKdt(AdapterTemplate):
         self.__abstract_test_case = abstract_test_case
         self.__test_case_name = concrete_test_case['name']
         self.__external_id = concrete_test_case['automation']['externalId']
+        self.__batch = None
 
         # Avoid Winerror 206
         self.__concrete_test_case['executions'] = self.__abstract_test_case['executions'] = ""
@@ -50,17 +185,19 @@ class RFKdt(AdapterTemplate):
         self.__resource_dir = str(Path(config.ROBOT_KDT['base_dir'] +
                                        config.ROBOT_KDT['resource_dir']).absolute()).replace("\\", "/")
 
-        # Create folder for created files, if it doesn't exist
-        Path(self.__script_dir).mkdir(parents=True, exist_ok=True)
-
         # Create result folder, if it doesn't exist
         Path(self.__result_dir).mkdir(parents=True, exist_ok=True)
 
-        # Create resource folder, if it doesn't exist
-        Path(self.__resource_dir).mkdir(parents=True, exist_ok=True)
-
         self.__logger.info("Adapter initialized")
 
+    @classmethod
+    def setup_session(cls, session):
+        # Create folder for created files, if it doesn't exist
+        Path(config.ROBOT_KDT['base_dir'] + config.ROBOT_KDT['script_dir']).mkdir(parents=True, exist_ok=True)
+
+        # Create resource folder, if it doesn't exist
+        Path(config.ROBOT_KDT['base_dir'] + config.ROBOT_KDT['resource_dir']).mkdir(parents=True, exist_ok=True)
+
     def execute_test_case(self, parallel, ddt_row):
 
         if self.__abstract_test_case["testCaseType"] != 'StructuredTestCase':
@@ -69,12 +206,81 @@ class RFKdt(AdapterTemplate):
                                 self.__abstract_test_case["testCaseType"])
             exit(-1)
 
+        self.__logger.info("Name of Test Case: " + self.__test_case_name)
+
+        if ddt_row and config.ROBOT_KDT.get("ddt_batch", False):
+            # collect all rows of the DDT Test Case for a single robot run,
+            # the Test Steps are prepared once for all rows
+            key = (self.__tbcs.test_session_id, self.test_case_id)
+            batch = RFKdt.__batches.get(key)
+            if batch == None or batch.started:
+                lib, res = self.__prepare_test_steps()
+                batch = _RFKdtBatch(self.__tbcs, self.__abstract_test_case, self.__test_case_name,
+                                    self.__get_settings(lib, res), self.__get_test_body(), self.__script_dir,
+                                    self.__result_dir)
+                RFKdt.__batches[key] = batch
+            batch.add(self.execution_id, ddt_row)
+            self.__batch = batch
+            self.__logger.info(f"DDT row added to Robot Framework batch run {batch.number}")
+            return batch
+
+        lib, res = self.__prepare_test_steps()
+
+        # Create robot file
+        robotFile = open(self.__script_dir + "/" + self.__test_case_name + ".robot", "w", encoding="utf-8")
+        robotFile.write(self.__get_settings(lib, res))
+
+        if ddt_row:
+            robotFile.write(_get_variables(ddt_row))
+
+        robotFile.write("*** Test Cases ***\n" + self.__test_case_name + self.__get_test_body())
+        robotFile.close()
+
+        call = ["python", "-m", "robot", "--outputdir", self.__result_dir]
+
+        if self.__external_id:
+            # Use external_id for Test Case selection
+            call.extend(["-i", "ID:" + self.__external_id])
+        else:
+            # Use Test Case name for selection
+            call.extend(["-t", self.__test_case_name])
+
+        if config.ROBOT_KDT.get("step_results", "listener") != "output":
+            # report results of the Test Steps during the run
+            call.extend([
+                "--listener",
+                "./addons/robotListener.py;" + str(self.__tbcs.tbcs_base) + ";" + str(self.__tbcs.tenant_id) + ";" +
+                str(self.__tbcs.user_id) + ";" + str(self.__tbcs.session_token) + ";" + str(self.__tbcs.verify) + ";" +
+                json.dumps(self.__abstract_test_case) + ";" + self.execution_id
+            ])
+
+        call.extend([
+            "--log", self.__test_case_name + "-log.html", "--report", self.__test_case_name + "-report.html",
+            "--output", self.__test_case_name + "-output.xml", self.__script_dir
+        ])
+
+        try:
+            if parallel:
+                # Call to execute robot framework test cases parallel
+                result = subprocess.Popen(call, env=tracing_utils.get_env())
+            else:
+                # Call to execute robot framework test cases sequential
+                result = subprocess.run(call, env=tracing_utils.get_env())
+
+        except Exception as e:
+            self.__logger.error(f"Subprocess method failed!\n\t{e.__str__()}")
+            return None
+
+        return result
+
+    def __prepare_test_steps(self):
+        # Sets the keyword text of the Test Steps (in 'description') and returns the libraries and resources to include
         # create list of resources/libraries to include; temporary solution! TODO: adapt to real Keywords which have lib=resource as aproperty
         # temporarily we pretend that the structure is KEYWORD%%RESOURCE
         # TODO: figure out if we need to include libraries AND resources
         lib = []
         res = []
-        self.__logger.debug("Starting execution ...")
+        self.__logger.debug("Preparing Test Steps ...")
 
         for blocks in self.__abstract_test_case['testSequence']['testStepBlocks']:
             self.__logger.debug("entering block: " + blocks["title"])
@@ -131,50 +337,46 @@ class RFKdt(AdapterTemplate):
                         if not (libOrRes in res):
                             res.append(libOrRes)
 
-        self.__logger.info("Name of Test Case: " + self.__test_case_name)
-
-        # Create robot file
-        robotFile = open(self.__script_dir + "/" + self.__test_case_name + ".robot", "w", encoding="utf-8")
+        return lib, res
 
+    def __get_settings(self, lib, res):
+        # Settings section including the libraries and resources
+        settings = ""
         if len(lib) > 0 or len(res) > 0:
-            robotFile.write("*** Settings ***\n")
+            settings += "*** Settings ***\n"
 
         if len(lib) > 0:
             for item in lib:
-                robotFile.write("Library    " + item + "\n")
-            robotFile.write("\n")
+                settings += "Library    " + item + "\n"
+            settings += "\n"
 
         if len(res) > 0:
             for item in res:
-                robotFile.write("Resource    " + self.__resource_dir + "/" + item + "\n")
-            robotFile.write("\n")
-
-        if ddt_row:
-            robotFile.write("*** Variables ***\n")
-            for ddt_item in ddt_row:
-                robotFile.write("${" + ddt_item['column'] + "}    " + ddt_item['value'] + "\n")
-            robotFile.write("\n")
-
-        robotFile.write("*** Test Cases ***\n" + self.__test_case_name + "\n\t")
+                settings += "Resource    " + self.__resource_dir + "/" + item + "\n"
+            settings += "\n"
+        return settings
 
+    def __get_test_body(self):
+        # Test Steps of the test, following the line with the name of the test
+        body = "\n\t"
         for blocks in self.__abstract_test_case["testSequence"]["testStepBlocks"]:
             if len(blocks["steps"]) > 0:
-                robotFile.write("#    " + blocks["title"] + "\n\t")
+                body += "#    " + blocks["title"] + "\n\t"
                 if comparison_utils.is_equal_ignore_separators(
                         blocks["title"], "Reset Environment") or comparison_utils.is_equal_ignore_separators(
                             blocks["title"], "Teardown") or comparison_utils.is_equal_ignore_separators(
                                 blocks["title"], "Cleanup"):
-                    robotFile.write("[Teardown]    ")
+                    body += "[Teardown]    "
                     # RF cannot have more than one Keywords in Teardown; "Run Keywords" can be used to cluster them if more than one.
                     if len(blocks["steps"]) > 1:
-                        robotFile.write("Run Keywords    ")
+                        body += "Run Keywords    "
                 if comparison_utils.is_equal_ignore_separators(
                         blocks["title"], "Preparation") or comparison_utils.is_equal_ignore_separators(
                             blocks["title"], "Setup"):
-                    robotFile.write("[Setup]    ")
+                    body += "[Setup]    "
                     # RF cannot have more than one Keywords in Setup; "Run Keywords" can be used to cluster them if more than one.
                     if len(blocks["steps"]) > 1:
-                        robotFile.write("Run Keywords    ")
+                        body += "Run Keywords    "
                 for count in range(0, len(blocks["steps"])):
                     step = blocks["steps"][count]
 
@@ -184,63 +386,40 @@ class RFKdt(AdapterTemplate):
                                     blocks["title"], "Cleanup") or comparison_utils.is_equal_ignore_separators(
                                         blocks["title"], "Preparation") or comparison_utils.is_equal_ignore_separators(
                                             blocks["title"], "Setup"):
-                        robotFile.write(step["description"])
+                        body += step["description"]
                         if count < len(blocks["steps"]) - 1:
-                            robotFile.write("    AND\n    ...    ")
+                            body += "    AND\n    ...    "
                         else:
-                            robotFile.write("\n\t")
+                            body += "\n\t"
                     else:
-                        robotFile.write(step["description"] + "\n\t")
-
-        robotFile.close()
-
-        call = ["python", "-m", "robot", "--outputdir", self.__result_dir]
-
-        if self.__external_id:
-            # Use external_id for Test Case selection
-            call.extend(["-i", "ID:" + self.__external_id])
-        else:
-            # Use Test Case name for selection
-            call.extend(["-t", self.__test_case_name])
-
-        call.extend([
-            "--listener", "./addons/robotListener.py;" + str(self.__tbcs.tbcs_base) + ";" + str(self.__tbcs.tenant_id) +
-            ";" + str(self.__tbcs.user_id) + ";" + str(self.__tbcs.session_token) + ";" + str(self.__tbcs.verify) +
-            ";" + json.dumps(self.__abstract_test_case) + ";" + self.execution_id
-        ])
-
-        call.extend([
-            "--log", self.__test_case_name + "-log.html", "--report", self.__test_case_name + "-report.html",
-            "--output", self.__test_case_name + "-output.xml", self.__script_dir
-        ])
-
-        try:
-            if parallel:
-                # Call to execute robot framework test cases parallel
-                result = subprocess.Popen(call)
-            else:
-                # Call to execute robot framework test cases sequential
-                result = subprocess.run(call)
-
-        except Exception as e:
-            self.__logger.error(f"Subprocess method failed!\n\t{e.__str__()}")
-            return None
-
-        return result
+                        body += step["description"] + "\n\t"
+        return body
 
     def check_result(self, executed_cmd):
+        if self.__batch != None:
+            return self.__check_batch_result(executed_cmd)
+
         if config.ROBOT_KDT['cleanup']:
             Path(self.__script_dir + "/" + self.__test_case_name + ".robot").unlink()
 
-        # Upload robot result files
-        result_files = [glob(self.__result_dir + file) for file in ['/*.xml', '/*.html']]
-        for list in result_files:
-            for result_file in list:
-                self.__tbcs.upload_file_to_execution(self.product_id, self.test_case_id, self.execution_id, result_file)
+        # Upload robot result files (in the background)
+        result_files = [result_file for file in ['/*.xml', '/*.html'] for result_file in glob(self.__result_dir + file)]
+        artifact_utils.get_uploader().upload(self.__tbcs, self.product_id, self.test_case_id, self.execution_id,
+                                             result_files, self.__test_case_name)
 
         # Check if robot framework call failed
         returncode = executed_cmd['subprocess_instance'].returncode
 
+        if config.ROBOT_KDT.get("step_results", "listener") == "output":
+            # report results of the Test Steps from the output file, the result of the test decides
+            result = robot_utils.report_output(self.__logger, self.__tbcs, self.__abstract_test_case, self.execution_id,
+                                               self.__result_dir + "/" + self.__test_case_name + "-output.xml",
+                                               self.__test_case_name, str(self.__external_id or ""))
+            if result != None:
+                if result == "Failed":
+                    self.__logger.error("Test Case '" + executed_cmd['name'] + "' failed.")
+                return result
+
         if returncode != 0:
             if returncode == 252:
                 self.__logger.error("Could not find a Robot Testcase with name: '" + executed_cmd['name'] + "'")
@@ -254,10 +433,29 @@ class RFKdt(AdapterTemplate):
         else:
             return "Passed"
 
+    def __check_batch_result(self, executed_cmd):
+        # the result of the test of this row decides (not the result of the whole batch)
+        result = None
+        test_result = self.__batch.get_result(self.execution_id)
+        if test_result != None:
+            result = robot_utils.report_result(self.__logger, self.__tbcs, self.__batch.test_case_item,
+                                               self.execution_id, test_result)
+        else:
+            self.__logger.error("No result found for DDT row of Test Case '" + executed_cmd['name'] + "'")
+
+        if result != "Passed":
+            self.__logger.error("Test Case '" + executed_cmd['name'] + "' failed.")
+            return "Failed"
+        return "Passed"
+
     # This method is called after all tests are executed.
     def final_cleanup(self):
         self.__logger.info('Final cleanup')
         # Do some adapter specific cleanup
+        for key, batch in list(RFKdt.__batches.items()):
+            if batch.is_finished():
+                del RFKdt.__batches[key]
+
         if config.ROBOT_KDT['cleanup']:
             rmtree(self.__result_dir,
                    ignore_errors=True,
@@ -9,6 +9,8 @@ from shutil import rmtree
 
 import config
 import utils.logger_utils as logger_utils
+import utils.robot_utils as robot_utils
+import utils.tracing_utils as tracing_utils
 
 from adapters.AdapterTemplate import AdapterTemplate
 
@@ -60,11 +62,14 @@ class RobotFramework(AdapterTemplate):
             # Use Test Case name for selection
             call.extend(["-t", self.__test_case_name])
 
-        call.extend([
-            "--listener", "./addons/robotListener.py;" + str(self.__tbcs.tbcs_base) + ";" + str(self.__tbcs.tenant_id) +
-            ";" + str(self.__tbcs.user_id) + ";" + str(self.__tbcs.session_token) + ";" + str(self.__tbcs.verify) +
-            ";" + str(json.dumps(self.__concrete_test_case)) + ";" + self.execution_id
-        ])
+        if config.ROBOT_FRAMEWORK.get("step_results", "listener") != "output":
+            # report results of the Test Steps during the run
+            call.extend([
+                "--listener",
+                "./addons/robotListener.py;" + str(self.__tbcs.tbcs_base) + ";" + str(self.__tbcs.tenant_id) + ";" +
+                str(self.__tbcs.user_id) + ";" + str(self.__tbcs.session_token) + ";" + str(self.__tbcs.verify) + ";" +
+                str(json.dumps(self.__concrete_test_case)) + ";" + self.execution_id
+            ])
 
         if ddt_row:
             ddt_name = ""
@@ -83,10 +88,10 @@ class RobotFramework(AdapterTemplate):
         try:
             if parallel:
                 # Call to execute robot framework test cases parallel
-                return subprocess.Popen(call)
+                return subprocess.Popen(call, env=tracing_utils.get_env())
             else:
                 # Call to execute robot framework test cases sequential
-                return subprocess.run(call)
+                return subprocess.run(call, env=tracing_utils.get_env())
         except Exception as e:
             self.__logger.error(f"Subprocess method failed!\n\t{e.__str__()}")
             return None
@@ -95,6 +100,16 @@ class RobotFramework(AdapterTemplate):
         # Check if robot framework call failed
         returncode = executed_cmd['subprocess_instance'].returncode
 
+        if config.ROBOT_FRAMEWORK.get("step_results", "listener") == "output":
+            # report results of the Test Steps from the output file, the result of the test decides
+            result = robot_utils.report_output(self.__logger, self.__tbcs, self.__concrete_test_case, self.execution_id,
+                                               self.__result_dir + "/" + self.__test_case_name + "-output.xml",
+                                               self.__concrete_test_case['name'], str(self.__external_id or ""))
+            if result != None:
+                if result == "Failed":
+                    self.__logger.error("Test Case '" + executed_cmd['name'] + "' failed.")
+                return result
+
         if returncode != 0:
             if returncode == 252:
                 self.__logger.error("Could not find a Robot Testcase with name: '" + executed_cmd['name'] + "'")
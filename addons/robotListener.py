@@ -16,6 +16,7 @@ from tempfile import TemporaryDirectory
 import config
 import utils.comparison_utils as comparison_utils
 import utils.logger_utils as logger_utils
+import utils.tracing_utils as tracing_utils
 from utils.tbcs_api import TbcsApi
 
 
@@ -32,6 +33,7 @@ class robotListener:
 
     execution_id: str
     skip: bool
+    span: tracing_utils.Span
 
     test_steps = []
 
@@ -55,13 +57,23 @@ class robotListener:
         self.logger = logger_utils.get_logger(self.__class__.__name__ + "_" + self.execution_id, config.LOGLEVEL)
         self.logger.info("Initialize Listener")
 
+        # spans of the test are children of the span of the agent passed in the environment
+        tracing_utils.configure(self.logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-robot-listener")
+
     def start_test(self, name, attributes):
         self.logger.info("Start Test Case with name: " + name)
+        self.span = tracing_utils.get_tracer().start_span("robot_test", {'tbcs.execution_id': self.execution_id})
+        tracing_utils.set_current_span(self.span)
 
         # Retrieve Test Steps from TBCS
         for test_step_block in self.test_case_item['testSequence']['testStepBlocks']:
             self.test_steps.extend([step for step in test_step_block['steps']])
 
+    def end_test(self, name, attributes):
+        self.span.set_attribute('robot.status', attributes['status'])
+        tracing_utils.set_current_span(None)
+        self.span.end()
+
     def start_keyword(self, name, attributes):
         # Check if keyword matches Test Step in TBCS
 
@@ -1,46 +1,95 @@
 # Global imports
 import argparse
-import importlib
-import json
+import copy
+import shutil
 from ssl import SSLError
 import traceback
 from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from time import sleep
+from time import sleep, time
 
 # Import adapters, config and utils
-import adapters
 import config
+from adapters.AdapterTemplate import SessionContext
+import utils.adapter_utils as adapter_utils
+import utils.artifact_utils as artifact_utils
 import utils.comparison_utils as comparison_utils
 import utils.logger_utils as logger_utils
+import utils.metrics_utils as metrics_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 
 
-def get_test_case_attachment(test_case_item):
+def get_test_case_attachment(test_case_item, session):
     # Get Attachments from Test Case if they exist
+    # Each file is downloaded once per Test Session (e.g. once for all rows of a DDT table),
+    # every execution gets its own copy
     if test_case_item['attachments'] == []:
         return None
 
     logger.info(f"Downloading Attachments of Test Case '{test_case_item['name']}' ...")
     temp_dir = TemporaryDirectory()
 
-    for item in test_case_item['attachments']:
-        file_id = str(item['fileId'])
-        file_response = tbcs.get_file_response(product_id, file_id)
+    with tracing_utils.get_tracer().span("download_attachments", {
+            'tbcs.test_case_id': str(test_case_item['id']),
+            'tbcs.attachments': len(test_case_item['attachments'])
+    }):
+        for item in test_case_item['attachments']:
+            file_id = str(item['fileId'])
+            path = Path(temp_dir.name) / item['name']
+
+            cached_path = session.attachments.get(file_id)
+            metrics_utils.get_agent_metrics().count_attachment(cached_path != None)
+            if cached_path != None:
+                with open(cached_path, 'rb') as cached_file, path.open('xb') as file:  # x: exclusive, b: binary
+                    shutil.copyfileobj(cached_file, file)
+                logger.info(f"Copied Attachment '{item['name']}' to '{str(path)}")
+                continue
+
+            file_response = tbcs.get_file_response(product_id, file_id)
 
-        path = Path(temp_dir.name) / item['name']
+            with path.open('xb') as file:  # x: exclusive, b: binary
+                file.write(file_response.content)
 
-        with path.open('xb') as file:  # x: exclusive, b: binary
-            file.write(file_response.content)
+            if session.attachment_dir == None:
+                session.attachment_dir = TemporaryDirectory()
+            session.attachments[file_id] = str(Path(session.attachment_dir.name) / file_id)
+            shutil.copyfile(path, session.attachments[file_id])
 
-        logger.info(f"Downloaded Attachment '{item['name']}' to '{str(path)}")
+            logger.info(f"Downloaded Attachment '{item['name']}' to '{str(path)}")
     logger.info(f"Downloading Attachments of Test Case '{test_case_item['name']}' finished")
 
     return temp_dir
 
 
-def get_adapter_instance(tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir):
+def setup_adapter_session(_class, session):
+    # Prepares the adapter for the Test Session once, before its first Test Case is executed
+    if _class not in session.adapters:
+        _class.session = session
+        try:
+            _class.setup_session(session)
+            session.adapters[_class] = True
+        except Exception as e:
+            logger.error(f"Setup of adapter '{_class.__name__}' for the Test Session failed!\n\t{e.__str__()}")
+            traceback.print_exc()
+            session.adapters[_class] = False
+    return session.adapters[_class]
+
+
+def teardown_adapter_sessions(session):
+    # Called after all results of the Test Session have been collected
+    for _class, ready in session.adapters.items():
+        if ready:
+            try:
+                _class.teardown_session(session)
+            except Exception as e:
+                logger.error(f"Teardown of adapter '{_class.__name__}' for the Test Session failed!\n\t{e.__str__()}")
+                traceback.print_exc()
+        _class.session = None
+
+
+def get_adapter_instance(tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir, session):
     # Find out which Test Tool is defined by the user
     # and return the associated adapter
 
@@ -52,9 +101,12 @@ def get_adapter_instance(tbcs, concrete_test_case, abstract_test_case, execution
         logger.info(f"Custom Field for Adapter not set. Trying default from configuration: '{config.ADAPTER_DEFAULT}'")
         adapter_name = config.ADAPTER_DEFAULT
 
-    if adapter_name in adapters.__all__:
-        module = importlib.import_module("adapters." + adapter_name)
-        _class = getattr(module, adapter_name)
+    _class = adapter_registry.get(adapter_name)
+    if _class != None:
+        if not setup_adapter_session(_class, session):
+            logger.error(
+                f"Adapter '{adapter_name}' is not ready! Skipping Test Case '{concrete_test_case['name']}' ...")
+            return None
         logger.info(f"Adapter found. Using: \033[1;32m{str(_class.__name__)}\033[0m")
         return _class(tbcs, concrete_test_case, abstract_test_case, execution_id, temp_dir)
 
@@ -62,68 +114,134 @@ def get_adapter_instance(tbcs, concrete_test_case, abstract_test_case, execution
     return None
 
 
-def execute_test_case(tbcs, product_id, test_case_execution):
+def wait_for_parallel_slot(adapter_instance, running_cmds):
+    # Waits until less executions of the adapter are running in parallel than its capability 'max_parallel' allows
+    capabilities = adapter_utils.get_capabilities(type(adapter_instance))
+    if capabilities['max_parallel'] <= 0 or capabilities['batching']:
+        # batch runs only start when polled
+        return
+
+    while len([
+            cmd for cmd in running_cmds if cmd['parallel'] and type(cmd['adapter']) is type(adapter_instance) and
+            cmd['subprocess_instance'].poll() == None
+    ]) >= capabilities['max_parallel']:
+        sleep(0.1)
+
+
+def get_test_case(tbcs, product_id, test_case_id, session):
+    # Test Cases are requested once per Test Session (e.g. once for all rows of a DDT table),
+    # each execution gets its own copy as adapters may change it
+    if test_case_id not in session.test_cases:
+        session.test_cases[test_case_id] = tbcs.get_test_case(product_id, test_case_id)
+    return copy.deepcopy(session.test_cases[test_case_id])
+
+
+def get_ddt_row(tbcs, product_id, test_case_id, table_id, row_id, session):
+    # The DDT table is requested once per Test Session, its rows are used by all executions of the table
+    key = (test_case_id, table_id)
+    if key not in session.ddt_tables:
+        session.ddt_tables[key] = tbcs.get_ddt_rows(product_id, test_case_id, table_id)
+    return copy.deepcopy(session.ddt_tables[key][row_id])
+
+
+def get_concrete_test_case(tbcs, product_id, abstract_test_case, table_id, row_id, ddt_row, session):
+    # The concrete Test Case of a DDT row is expanded locally from the abstract Test Case and the row, if the local
+    # expansion of the first row of the table equals the concrete Test Case of TestBench CS.
+    # Otherwise it is requested for each row.
+    test_case_id = str(abstract_test_case['id'])
+    key = (test_case_id, table_id)
+    concrete_test_case = None
+    if getattr(config, "DDT_LOCAL_EXPANSION", True) and session.ddt_expansion.get(key, True):
+        concrete_test_case = tbcs_utils.expand_ddt_test_case(abstract_test_case, ddt_row)
+        if key in session.ddt_expansion:
+            return concrete_test_case
+
+    concrete_test_case_tbcs = tbcs_utils.remove_ddt_markers(
+        tbcs.get_concrete_test_case(product_id, test_case_id, table_id, row_id))
+
+    if concrete_test_case != None:
+        session.ddt_expansion[key] = concrete_test_case == concrete_test_case_tbcs
+        if not session.ddt_expansion[key]:
+            logger.info(f"Local expansion of DDT table {table_id} differs from the concrete Test Case " +
+                        "of TestBench CS, the concrete Test Cases of all rows are requested")
+    return concrete_test_case_tbcs
+
+
+def execute_test_case(tbcs, product_id, test_case_execution, running_cmds, session):
     # Prepare execution of a single Test Case (a DDT-Test Case-Row or other Test Case type)
     # and then delegate the execution to pycsTestRunner
 
-    test_case_item = tbcs.get_test_case(product_id, str(test_case_execution['testCaseIds']['testCaseId']))
+    with tracing_utils.get_tracer().span("prepare_test_case",
+                                         {'tbcs.execution_id': str(test_case_execution['executionId'])}):
+        test_case_item = get_test_case(tbcs, product_id, str(test_case_execution['testCaseIds']['testCaseId']), session)
 
-    # For DDT both (abstract and concrete) Test Case will be hand over to the adapter
-    abstract_test_case = test_case_item
+        # For DDT both (abstract and concrete) Test Case will be hand over to the adapter
+        abstract_test_case = test_case_item
 
-    test_case_id = str(test_case_item['id'])
+        test_case_id = str(test_case_item['id'])
 
-    # Create a temporary directory, if test case has attachment(s)
-    temp_dir = get_test_case_attachment(test_case_item)
+        # Create a temporary directory, if test case has attachment(s)
+        temp_dir = get_test_case_attachment(test_case_item, session)
 
-    ddt_table_ids = test_case_execution['testCaseIds'].get("ddtTableIds", [])
+        ddt_table_ids = test_case_execution['testCaseIds'].get("ddtTableIds", [])
 
-    # Check if Test Case has DDT Table
-    ddt_row = None
-    if ddt_table_ids != None and ddt_table_ids != []:
-        # Test Case is a DDT Test Case row = a list of colName, colValue pairs:
-        # [{'column':<colName>, 'value':<colValue>}, ... ]
-        test_case_ddt_table_id, test_case_ddt_row_id = (
-            ddt_table_ids['tableId'],
-            ddt_table_ids['rowId'],
-        )
+        # Check if Test Case has DDT Table
+        ddt_row = None
+        if ddt_table_ids != None and ddt_table_ids != []:
+            # Test Case is a DDT Test Case row = a list of colName, colValue pairs:
+            # [{'column':<colName>, 'value':<colValue>}, ... ]
+            test_case_ddt_table_id, test_case_ddt_row_id = (
+                ddt_table_ids['tableId'],
+                ddt_table_ids['rowId'],
+            )
 
-        ddt_row = tbcs.get_ddt_row(product_id, test_case_id, test_case_ddt_table_id, test_case_ddt_row_id)
+            ddt_row = get_ddt_row(tbcs, product_id, test_case_id, test_case_ddt_table_id, test_case_ddt_row_id, session)
 
-        # Get concrete Test Case
-        concrete_test_case = json.dumps(
-            tbcs.get_concrete_test_case(product_id, test_case_id, test_case_ddt_table_id,
-                                        test_case_ddt_row_id)).replace("#*#", "")
+            # Get concrete Test Case
+            concrete_test_case = get_concrete_test_case(tbcs, product_id, test_case_item, test_case_ddt_table_id,
+                                                        test_case_ddt_row_id, ddt_row, session)
 
-        concrete_test_case = json.loads(concrete_test_case)
+        else:
+            concrete_test_case = test_case_item
+            # No DDT Test Case
 
-    else:
-        concrete_test_case = test_case_item
-        # No DDT Test Case
+        # Get adapter from Custom Field or config file
+        #global adapter_instance
+        adapter_instance = get_adapter_instance(tbcs, concrete_test_case, abstract_test_case,
+                                                str(test_case_execution['executionId']), temp_dir, session)
 
-    # Get adapter from Custom Field or config file
-    #global adapter_instance
-    adapter_instance = get_adapter_instance(tbcs, concrete_test_case, abstract_test_case,
-                                            str(test_case_execution['executionId']), temp_dir)
+        if not adapter_instance:
+            return
 
-    if not adapter_instance:
-        return
+        # Check if Test Case should run parallel
+        parallel = comparison_utils.stringToBoolean(
+            tbcs_utils.get_custom_field(logger, tbcs, concrete_test_case, "Parallel"))
+        if parallel == '':
+            # custom field 'Parallel' not defined in TestBench CS => config file
+            logger.info(f"Custom Field for 'Parallel' not set. Trying default from configuration: '{config.PARALLEL}'")
+            parallel = config.PARALLEL
 
-    # Check if Test Case should run parallel
-    parallel = comparison_utils.stringToBoolean(
-        tbcs_utils.get_custom_field(logger, tbcs, concrete_test_case, "Parallel"))
-    if parallel == '':
-        # custom field 'Parallel' not defined in TestBench CS => config file
-        logger.info(f"Custom Field for 'Parallel' not set. Trying default from configuration: '{config.PARALLEL}'")
-        parallel = config.PARALLEL
+    if parallel:
+        wait_for_parallel_slot(adapter_instance, running_cmds)
 
     # Execute Test Case with given Adapter
     logger.info(
         f"Starting execution of Test Case '{concrete_test_case['name']}' with Adapter '{adapter_instance.__class__.__name__}' ..."
     )
-    subprocess_instance = adapter_instance.execute_test_case(parallel, ddt_row)
+    # The run is traced until its result is collected, adapters pass the span to the tool (tracing_utils.get_env)
+    run_span = tracing_utils.get_tracer().start_span(
+        "run_test_case", {
+            'tbcs.execution_id': adapter_instance.execution_id,
+            'tbcs.adapter': adapter_instance.__class__.__name__,
+            'tbcs.parallel': bool(parallel)
+        })
+    start_time = time()
+    with tracing_utils.activate(run_span):
+        subprocess_instance = adapter_instance.execute_test_case(parallel, ddt_row)
 
     if not subprocess_instance:
+        run_span.set_error("Starting the execution failed")
+        run_span.end()
         logger.error(
             f"Something went wrong while starting the execution with Adapter '{adapter_instance.__class__.__name__}' for Test Case '{concrete_test_case['name']}'. Check previous logs"
         )
@@ -135,12 +253,21 @@ def execute_test_case(tbcs, product_id, test_case_execution):
         'adapter': adapter_instance,
         'subprocess_instance': subprocess_instance,
         'parallel': parallel,
-        'ddt_row': ddt_row
+        'ddt_row': ddt_row,
+        'start_time': start_time,
+        # end of a blocking execution; end of a parallel one is known when its result is collected
+        'end_time': None if parallel else time(),
+        'span': run_span
     }
 
     return running_cmd  # return command which has been started
 
 
+def get_adapter_names(running_cmds):
+    # Names of the adapters of the running commands (one entry per command)
+    return [cmd['adapter'].__class__.__name__ for cmd in running_cmds]
+
+
 def collect_test_results(tbcs, running_cmds):
     # Collect results from finished running_cmds
     # and upload them back into iTB
@@ -156,11 +283,16 @@ def collect_test_results(tbcs, running_cmds):
 
         # Remove finished command from list
         running_cmds.pop(0)
+        end_time = cmd['end_time'] or time()
+        cmd['span'].end(end_time)
 
-        if cmd['subprocess_instance']:
-            result = cmd['adapter'].check_result(cmd)
-        else:
-            result = "Failed"  # Subprocess failed
+        with tracing_utils.get_tracer().span("check_result",
+                                             {'tbcs.execution_id': cmd['adapter'].execution_id}) as span:
+            if cmd['subprocess_instance']:
+                result = cmd['adapter'].check_result(cmd)
+            else:
+                result = "Failed"  # Subprocess failed
+            span.set_attribute('tbcs.result', result)
 
         tbcs.patch_execution(
             cmd['adapter'].product_id,
@@ -196,6 +328,10 @@ def collect_test_results(tbcs, running_cmds):
                 }},
             )
 
+        metrics_utils.get_agent_metrics().observe_test(cmd['adapter'].__class__.__name__, result,
+                                                       end_time - cmd['start_time'])
+        metrics_utils.get_agent_metrics().set_running(get_adapter_names(running_cmds))
+
         result_string = "\033[1;32mPASSED\033[0m" if result == "Passed" else "\033[1;31mFAILED\033[0m"
         logger.info(f"{result_string} Test Case '{cmd['name']}'")
 
@@ -204,9 +340,19 @@ def collect_test_results(tbcs, running_cmds):
 
 
 def execute_test_session(tbcs, product_id, test_session_id):
+    # Each Test Session is a trace of its own, linked to the poll cycle which found it
+    poll_span = tracing_utils.get_current_span()
+    attributes = {'tbcs.product_id': str(product_id), 'tbcs.test_session_id': str(test_session_id)}
+    links = [poll_span.context] if poll_span != None else None
+    with tracing_utils.get_tracer().span("test_session", attributes, parent=None, links=links):
+        run_test_session(tbcs, product_id, test_session_id)
+
+
+def run_test_session(tbcs, product_id, test_session_id):
     # execute all Test Cases in test_case_list and update Test Session status
 
     logger.info(f"Starting Test Session with id: {test_session_id}")
+    metrics_at_start = metrics_utils.get_registry().snapshot()
     test_session = tbcs.get_session(
         product_id,
         test_session_id)
@@ -220,16 +366,30 @@ def execute_test_session(tbcs, product_id, test_session_id):
 
     test_case_executions = test_session['testCaseExecutions']
 
+    # Context shared by the adapters executing the Test Cases of this session
+    session = SessionContext(tbcs, product_id, str(test_session_id))
+
     running_cmds = []
-    for test_case_execution in test_case_executions:
-        running_cmd = execute_test_case(tbcs, product_id, test_case_execution)
+    for index, test_case_execution in enumerate(test_case_executions):
+        metrics_utils.get_agent_metrics().set_queue_depth(len(test_case_executions) - index)
+        running_cmd = execute_test_case(tbcs, product_id, test_case_execution, running_cmds, session)
 
         if running_cmd != None:
             running_cmds.append(running_cmd)
+            metrics_utils.get_agent_metrics().set_running(get_adapter_names(running_cmds))
+    metrics_utils.get_agent_metrics().set_queue_depth(0)
 
     # Collect results of executed tests
     collect_test_results(tbcs, running_cmds)
 
+    # Wait for the result files uploaded in the background
+    with tracing_utils.get_tracer().span("wait_for_uploads"):
+        artifact_utils.wait_for_uploads()
+
+    teardown_adapter_sessions(session)
+    if session.attachment_dir != None:
+        session.attachment_dir.cleanup()
+
     # Set start and end time of Test Session and set status to Completed
     stopTime = datetime.utcnow().isoformat().split(".")
     stopTime = stopTime[0] + "." + stopTime[1][:3] + "Z"
@@ -240,6 +400,10 @@ def execute_test_session(tbcs, product_id, test_session_id):
     logger.info(
         f"Finished Test Session with id: {test_session_id}. Elapsed time: {str(datetime.utcnow() - startTimeUTC)}")
 
+    # metrics of the requests to TestBench CS during the Test Session
+    metrics_utils.emit(logger, metrics_sinks,
+                       metrics_utils.subtract(metrics_utils.get_registry().snapshot(), metrics_at_start))
+
 
 # --------------------------------
 if __name__ == "__main__":
@@ -266,15 +430,34 @@ if __name__ == "__main__":
         logger.info("\033[0;32mimbus TestBench CS Test Automation Agent - started" +
                     (" in loop mode\033[0m" if plist.loop else " in none loop mode\033[0m"))
 
+        metrics_sinks = metrics_utils.get_sinks(logger, getattr(config, "METRICS_SINKS", ["log"]))
+        tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-agent")
+
+        # Adapters are loaded on first use, the default adapter is checked at startup
+        adapter_registry = adapter_utils.AdapterRegistry(logger)
+        logger.debug(f"Available adapters: {', '.join(adapter_registry.names())}")
+        if adapter_registry.get(config.ADAPTER_DEFAULT) == None:
+            logger.warning(f"Default adapter '{config.ADAPTER_DEFAULT}' is not available!")
+
         # connect to iTB and select product to monitor
         tbcs = tbcs_utils.connect_itb(logger, config.ACCOUNT)
 
         # only products existing during TA-Agent startup are captured
         product_ids = tbcs_utils.get_products(logger, tbcs, config.PRODUCT_FILTER)
 
+        # Serve the metrics of the agent while it is running in loop mode
+        metrics_port = getattr(config, "METRICS_PORT", 0)
+        metrics_host = getattr(config, "METRICS_HOST", "127.0.0.1")
+        if plist.loop and metrics_port:
+            metrics_server = metrics_utils.MetricsServer(metrics_host, metrics_port)
+            logger.info(f"Serving metrics at http://{metrics_host}:{metrics_server.port}/metrics")
+
         # Main loop: poll workspace for Test Sessions ready to run and then execute their Test Cases
         while True:
             try:
+                poll_start_time = time()
+                poll_span = tracing_utils.get_tracer().start_span("poll")
+                tracing_utils.set_current_span(poll_span)
                 # Process each product which is configured to be monitored
                 for product_id in product_ids:
                     # Process each Test Suite in product which is configured to be monitored
@@ -291,30 +474,33 @@ if __name__ == "__main__":
                             )
                             continue
 
-                        # Create Session
-                        logger.info(f"Creating Test Session for Test Suite '{test_suite['name']}' ...")
-                        test_session_id = tbcs_utils.create_test_session(logger, tbcs, product_id, test_suite['name'])
-
-                        test_case_ids = []
-                        for test_case in test_suite['testCases']:
-                            if comparison_utils.is_matching(test_case, config.TEST_CASE_FILTER):
-                                test_case_ids.append(test_case['testCaseIds'])
-
-                        # Create an execution for every Test Case and append it to the Test Session
-                        for test_case_id in test_case_ids:
-                            if test_case_id['ddtTableIds']:
-                                table_id = test_case_id['ddtTableIds']['tableId']
-                                row_id = test_case_id['ddtTableIds']['rowId']
-                                execution_id = tbcs.post_execution_ddt(product_id, test_case_id['testCaseId'], table_id,
-                                                                       row_id)
-                            else:
-                                execution_id = tbcs.post_execution(product_id, test_case_id['testCaseId'])
-
-                            tbcs.add_execution_to_session(product_id, test_session_id, test_case_id['testCaseId'],
-                                                          execution_id)
-
-                        tbcs.patch_session(product_id, test_session_id, {'status': 'Ready'})
-                        logger.info(f"Created Test Session with id: {test_session_id}")
+                        with tracing_utils.get_tracer().span("materialize_suite",
+                                                             {'tbcs.test_suite_id': str(test_suite_id)}):
+                            # Create Session
+                            logger.info(f"Creating Test Session for Test Suite '{test_suite['name']}' ...")
+                            test_session_id = tbcs_utils.create_test_session(logger, tbcs, product_id,
+                                                                             test_suite['name'])
+
+                            test_case_ids = []
+                            for test_case in test_suite['testCases']:
+                                if comparison_utils.is_matching(test_case, config.TEST_CASE_FILTER):
+                                    test_case_ids.append(test_case['testCaseIds'])
+
+                            # Create an execution for every Test Case and append it to the Test Session
+                            for test_case_id in test_case_ids:
+                                if test_case_id['ddtTableIds']:
+                                    table_id = test_case_id['ddtTableIds']['tableId']
+                                    row_id = test_case_id['ddtTableIds']['rowId']
+                                    execution_id = tbcs.post_execution_ddt(product_id, test_case_id['testCaseId'],
+                                                                           table_id, row_id)
+                                else:
+                                    execution_id = tbcs.post_execution(product_id, test_case_id['testCaseId'])
+
+                                tbcs.add_execution_to_session(product_id, test_session_id, test_case_id['testCaseId'],
+                                                              execution_id)
+
+                            tbcs.patch_session(product_id, test_session_id, {'status': 'Ready'})
+                            logger.info(f"Created Test Session with id: {test_session_id}")
 
                         # Execute session
                         execute_test_session(tbcs, product_id, test_session_id)
@@ -346,6 +532,9 @@ if __name__ == "__main__":
                         # Execute session
                         execute_test_session(tbcs, product_id, test_session_id)
 
+                metrics_utils.get_agent_metrics().observe_poll_cycle(time() - poll_start_time)
+                tracing_utils.set_current_span(None)
+                poll_span.end()
                 sleep(config.AGENT_LOOP_INTERVAL_SEC)
 
                 if plist.loop == False:
@@ -353,6 +542,9 @@ if __name__ == "__main__":
 
             except SSLError as ce:
                 logger.error(f"SSL connection exception occured:\n\t{ce.__str__()}")
+                poll_span.set_error(ce.__str__())
+                tracing_utils.set_current_span(None)
+                poll_span.end()
                 traceback.print_exc()
                 print("==============")
 
@@ -0,0 +1,271 @@
+#
+# End-to-end benchmark of the agent
+# Executes the Test Sessions of a fake TestBench CS (utils/fake_tbcs.py) with the dummy adapter and measures the
+# throughput of the agent: Test Sessions per minute, Test Cases per second, requests per Test Case, CPU and memory.
+#
+# Usage (from the root of the repository):
+#   python -m benchmarks.agent_benchmark [--workload NAME] [--scale 2] [--repeat 3] [--compare BASELINE.json]
+#
+
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+from benchmarks import benchmark_utils
+
+# Workloads: the synthetic workspace (see fake_tbcs.generate_workspace, each Test Session contains all Test Cases of
+# the product) and the simulated tool (see dummy_adapter.Dummy). 'test_cases' and 'ddt_tables' are multiplied by
+# --scale.
+WORKLOADS = {
+    # blocking executions, results of the Test Steps are reported
+    'sequential': {
+        'test_cases': 100,
+        'steps': 5,
+        'sessions': 3,
+        'parallel': False,
+        'duration': 0.0,
+        'step_results': True
+    },
+    # non blocking executions, the agent polls them in collect_test_results
+    'parallel': {
+        'test_cases': 100,
+        'steps': 5,
+        'sessions': 3,
+        'parallel': True,
+        'duration': 0.05,
+        'step_results': True
+    },
+    # each Test Case has a DDT table, i.e. one execution per row
+    'ddt_heavy': {
+        'test_cases': 10,
+        'ddt_tables': 10,
+        'ddt_rows': 20,
+        'steps': 5,
+        'sessions': 3,
+        'parallel': False,
+        'duration': 0.0,
+        'step_results': True
+    },
+    # attachments are downloaded and a result file is uploaded for each execution
+    'attachment_heavy': {
+        'test_cases': 50,
+        'steps': 5,
+        'attachments': 4,
+        'attachment_size': 256 * 1024,
+        'sessions': 3,
+        'parallel': False,
+        'duration': 0.0,
+        'step_results': False,
+        'result_file_size': 64 * 1024
+    },
+}
+
+# Configuration of the agent in the benchmarks (see config.py.template), ACCOUNT is set to the fake server.
+# The adapter and 'Parallel' are custom fields of the Test Cases.
+CONFIG = {
+    'LOGLEVEL': logging.WARNING,
+    'ADAPTER_CUSTOM_FIELD_NAME': "Automation Tool",
+    'ADAPTER_DEFAULT': "Dummy",
+    'CREATE_DEFECTS': False,
+    'METRICS_SINKS': [],
+    'TRACING_EXPORTER': "",
+}
+
+
+def run_worker(spec_file):
+    # Runs in a process of its own, so CPU time and memory of the fake server are not measured.
+    # Writes its measurements to the file 'result_file' of the spec (stdout is used by the loggers).
+    with open(spec_file) as file:
+        spec = json.load(file)
+
+    config = benchmark_utils.load_config(dict(CONFIG, ACCOUNT=spec['account']))
+
+    import agent
+    import utils.adapter_utils as adapter_utils
+    import utils.logger_utils as logger_utils
+    import utils.tbcs_utils as tbcs_utils
+    from benchmarks.dummy_adapter import Dummy
+
+    Dummy.duration = spec['duration']
+    Dummy.fail_rate = spec['fail_rate']
+    Dummy.step_results = spec['step_results']
+    Dummy.result_file_size = spec['result_file_size']
+
+    # globals of the agent, set by its main program otherwise
+    agent.logger = logger_utils.get_logger('Agent', config.LOGLEVEL)
+    agent.plist = argparse.Namespace(loop=False, screenshot=None)
+    agent.metrics_sinks = []
+    agent.adapter_registry = adapter_utils.AdapterRegistry(agent.logger)
+    agent.adapter_registry.register("Dummy", Dummy)
+    agent.tbcs = tbcs_utils.connect_itb(agent.logger, config.ACCOUNT)
+
+    session_seconds = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for product_id, session_ids in spec['sessions'].items():
+        agent.product_id = product_id
+        for session_id in session_ids:
+            session_start = time.perf_counter()
+            agent.execute_test_session(agent.tbcs, product_id, str(session_id))
+            session_seconds.append(time.perf_counter() - session_start)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    with open(spec['result_file'], 'w') as file:
+        json.dump(
+            {
+                'seconds': seconds,
+                'cpu_seconds': cpu_seconds,
+                'peak_rss_bytes': benchmark_utils.get_peak_rss(),
+                'session_seconds': session_seconds
+            }, file)
+
+
+def run_workload(logger, name, workload, plist):
+    # Runs the workload once with a fresh fake workspace and returns its measurements
+    from utils.fake_tbcs import FakeTbcs, FakeTbcsServer, generate_workspace
+
+    fake = FakeTbcs(latency=plist.latency, seed=plist.seed)
+    products = generate_workspace(fake,
+                                  test_cases=max(1, round(workload['test_cases'] * plist.scale)),
+                                  steps=workload['steps'],
+                                  ddt_tables=round(workload.get('ddt_tables', 0) * plist.scale),
+                                  ddt_rows=workload.get('ddt_rows', 0),
+                                  attachments=workload.get('attachments', 0),
+                                  attachment_size=workload.get('attachment_size', 0),
+                                  suites=0,
+                                  sessions=workload['sessions'],
+                                  custom_fields={
+                                      'Automation Tool': "Dummy",
+                                      'Parallel': str(workload['parallel'])
+                                  },
+                                  seed=plist.seed)
+    sessions = {
+        str(product_id): list(fake.products[product_id]['sessions'].keys())
+        for product_id in products
+    }
+    executions = sum(
+        len(session['testCaseExecutions'])
+        for product_id in products
+        for session in fake.products[product_id]['sessions'].values())
+
+    server = FakeTbcsServer(fake)
+    try:
+        with TemporaryDirectory() as temp_dir:
+            spec_file = temp_dir + "/spec.json"
+            result_file = temp_dir + "/result.json"
+            with open(spec_file, 'w') as file:
+                json.dump(
+                    {
+                        'account': server.get_account(),
+                        'sessions': sessions,
+                        'duration': workload['duration'],
+                        'fail_rate': plist.fail_rate,
+                        'step_results': workload['step_results'],
+                        'result_file_size': workload.get('result_file_size', 0),
+                        'result_file': result_file
+                    }, file)
+
+            fake.reset_request_counts()
+            subprocess.run([sys.executable, '-m', 'benchmarks.agent_benchmark', '--worker', spec_file],
+                           cwd=benchmark_utils.ROOT_DIR,
+                           check=True)
+            with open(result_file) as file:
+                measurements = json.load(file)
+    finally:
+        server.stop()
+
+    requests = fake.request_counts()
+    session_count = sum(len(ids) for ids in sessions.values())
+    seconds = measurements['seconds']
+    metrics = {
+        'sessions_per_min': session_count / seconds * 60,
+        'test_cases_per_sec': executions / seconds,
+        'requests_per_test_case': sum(requests.values()) / executions,
+        'seconds': seconds,
+        'session_seconds_max': max(measurements['session_seconds']),
+        'cpu_seconds': measurements['cpu_seconds'],
+        'cpu_seconds_per_test_case': measurements['cpu_seconds'] / executions,
+        'cpu_percent': measurements['cpu_seconds'] / seconds * 100,
+    }
+    if measurements['peak_rss_bytes'] != None:
+        metrics['peak_rss_mb'] = measurements['peak_rss_bytes'] / 1024 / 1024
+    logger.info(f"{name}: {session_count} Test Session(s), {executions} execution(s) in {seconds:.2f}s - " +
+                f"{metrics['test_cases_per_sec']:.1f} Test Cases/s, " +
+                f"{metrics['requests_per_test_case']:.1f} requests/Test Case, CPU {metrics['cpu_percent']:.0f}%")
+    return {'sessions': session_count, 'executions': executions, 'metrics': metrics, 'requests': requests}
+
+
+def run_benchmark(logger, plist):
+    # Runs each workload 'repeat' times; the metrics of a workload are the medians of its runs
+    results = {
+        'environment': benchmark_utils.get_environment(),
+        'parameters': {
+            'scale': plist.scale,
+            'repeat': plist.repeat,
+            'latency': plist.latency,
+            'fail_rate': plist.fail_rate,
+            'seed': plist.seed
+        },
+        'workloads': {}
+    }
+    for name in plist.workload or WORKLOADS.keys():
+        runs = [run_workload(logger, name, WORKLOADS[name], plist) for _ in range(plist.repeat)]
+        results['workloads'][name] = {
+            'workload': WORKLOADS[name],
+            'sessions': runs[0]['sessions'],
+            'executions': runs[0]['executions'],
+            'metrics': {metric: statistics.median(run['metrics'][metric] for run in runs)
+                        for metric in runs[0]['metrics']},
+            'requests': runs[0]['requests'],
+            'runs': [run['metrics'] for run in runs]
+        }
+    return results
+
+
+if __name__ == "__main__":
+    # Parse command line
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of the agent against a fake TestBench CS with a dummy adapter.")
+    parser.add_argument('--workload',
+                        action='append',
+                        choices=WORKLOADS.keys(),
+                        help='workload to run, can be repeated (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='factor of the number of Test Cases (default: 1)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each workload, the median is reported')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of each response of the fake server in s')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='probability (0 to 1) of a Test Case failing')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic workspace')
+    parser.add_argument('--output', help='JSON file of the results (default: benchmarks/results/agent-<time>.json)')
+    parser.add_argument('--compare', help='JSON file of former results, regressions are reported (exit code 1)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change of a regression (default: 0.1)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    plist = parser.parse_args()
+
+    if plist.worker:
+        run_worker(plist.worker)
+        sys.exit(0)
+
+    # Configure logging
+    import utils.logger_utils as logger_utils
+    logger = logger_utils.get_logger('Agent benchmark', logging.INFO)
+
+    results = run_benchmark(logger, plist)
+
+    output = plist.output or str(benchmark_utils.ROOT_DIR / "benchmarks" / "results" /
+                                 f"agent-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    benchmark_utils.write_results(output, results)
+    logger.info(f"Results written to '{output}'")
+
+    if plist.compare:
+        lines = benchmark_utils.compare(results, benchmark_utils.read_results(plist.compare), plist.threshold)
+        logger.info("Comparison with '" + plist.compare + "':\n\t" + "\n\t".join(lines))
+        if any(line.endswith("REGRESSION") for line in lines):
+            logger.error("Regressions found!")
+            sys.exit(1)
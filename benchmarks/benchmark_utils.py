@@ -0,0 +1,131 @@
+import json
+import platform
+import subprocess
+import sys
+import types
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Union
+
+# Repository root, the benchmarks are run from here (python -m benchmarks.<benchmark>)
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Metrics where a lower value is better; for all other metrics a higher value is better
+LOWER_IS_BETTER = ('seconds', 'cpu', 'rss', 'calls', 'requests')
+
+
+def load_config(overrides: dict) -> types.ModuleType:
+    """
+    Creates the module "config" from config.py.template and the given values, so the benchmarks neither depend on nor
+    change the config.py of the user. Must be called before the agent, the adapters or the importers are imported.
+
+    Parameters
+    ----------
+    overrides: dict
+        Configuration values replacing the ones of the template, e.g. {"PARALLEL": True}
+
+    Returns
+    -------
+    types.ModuleType
+        The module "config"
+    """
+    config = types.ModuleType("config")
+    config.__file__ = str(ROOT_DIR / "config.py.template")
+    exec(compile(Path(config.__file__).read_text(), config.__file__, 'exec'), config.__dict__)
+    config.__dict__.update(overrides)
+    sys.modules["config"] = config
+    return config
+
+
+def get_environment() -> Dict[str, Union[str, int, bool, None]]:
+    """
+    Returns the environment of a benchmark run (commit of the repository, Python version, platform, time), so results
+    of different commits or machines can be told apart.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=ROOT_DIR,
+                               capture_output=True,
+                               text=True,
+                               check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    }
+
+
+def get_peak_rss() -> Union[int, None]:
+    """
+    Returns the peak resident set size of the current process in bytes; None if it is unknown (e.g. on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def write_results(path: str, results: dict) -> None:
+    """
+    Writes the results of a benchmark run as JSON file, missing directories are created.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def read_results(path: str) -> dict:
+    """
+    Reads the results of a benchmark run written by write_results().
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.1) -> List[str]:
+    """
+    Compares the metrics of the workloads of two benchmark runs.
+
+    Parameters
+    ----------
+    results: dict
+        Results of the current run
+
+    baseline: dict
+        Results of the run to compare with, e.g. of the previous commit
+
+    threshold: float
+        Relative change (e.g. 0.1 = 10%) from which a worse value is a regression
+
+    Returns
+    -------
+    List[str]
+        Lines of the comparison, regressions are marked with "REGRESSION"
+    """
+    lines = [f"Baseline: {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')})"]
+    for workload, result in results['workloads'].items():
+        if workload not in baseline['workloads']:
+            lines.append(f"{workload}: no baseline")
+            continue
+        base_metrics = baseline['workloads'][workload]['metrics']
+        for metric, value in result['metrics'].items():
+            base_value = base_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)) or base_value == 0:
+                continue
+            change = (value - base_value) / base_value
+            worse = change > threshold if any(word in metric for word in LOWER_IS_BETTER) else change < -threshold
+            lines.append(f"{workload}.{metric}: {base_value:.4g} -> {value:.4g} ({change:+.1%})" +
+                         (" REGRESSION" if worse else ""))
+    return lines
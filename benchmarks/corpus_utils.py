@@ -0,0 +1,224 @@
+import random
+from pathlib import Path
+from typing import List
+
+# Each generated item (Test Case, Keyword, scenario) contains this token once, change_items() replaces it to change
+# the item without changing the structure of the sources
+ITEM_TOKEN = "rev0"
+
+
+def write_robot_test_files(directory: str, files: int, test_cases: int, steps: int, keywords: int,
+                           seed: int = 0) -> List[str]:
+    """
+    Writes Robot Framework test files ("suite<n>.robot") for import_tc_rf.py, the Test Steps call the Keywords
+    written by write_robot_resource().
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the files, created if missing
+
+    files: int
+        Number of files
+
+    test_cases: int
+        Number of Test Cases of each file
+
+    steps: int
+        Number of Test Steps of each Test Case (the last one logs the name of the Test Case)
+
+    keywords: int
+        Number of Keywords called by the Test Steps
+
+    seed: int
+        Seed of the random content
+
+    Returns
+    -------
+    List[str]
+        Paths of the files
+    """
+    generator = random.Random(seed)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for file in range(1, files + 1):
+        lines = [
+            "*** Settings ***", f"Documentation    Generated suite {file}", "Resource    keywords.resource",
+            f"Test Setup    Keyword 1    suite{file}", "Test Teardown    No Operation", "", "*** Test Cases ***"
+        ]
+        for test_case in range(1, test_cases + 1):
+            lines += [
+                f"Suite {file} Test {test_case}", f"    [Documentation]    Test Case {test_case} of suite {file}",
+                f"    [Tags]    ID:RF-{file}-{test_case}"
+            ]
+            for step in range(1, steps):
+                keyword = generator.randint(1, max(1, keywords))
+                arguments = [f"value{step}-{argument}" for argument in range(keyword % 3)]
+                lines.append("    ".join(["    Keyword " + str(keyword)] + arguments))
+            lines += [f"    Log    Suite {file} Test {test_case} {ITEM_TOKEN}", ""]
+        path = Path(directory) / f"suite{file}.robot"
+        path.write_text("\n".join(lines), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def write_robot_resource(path: str, keywords: int) -> str:
+    """
+    Writes a Robot Framework resource file with Keywords ("Keyword <n>" with n % 3 arguments) for import_kwd_rf.py.
+    """
+    lines = ["*** Settings ***", "Documentation    Generated Keywords", "", "*** Keywords ***"]
+    for keyword in range(1, keywords + 1):
+        arguments = ["${arg" + str(argument) + "}" for argument in range(keyword % 3)]
+        lines += [f"Keyword {keyword}", f"    [Documentation]    Keyword {keyword} {ITEM_TOKEN}"]
+        if arguments:
+            lines += ["    [Arguments]    " + "    ".join(arguments), "    Log Many    " + "    ".join(arguments)]
+        else:
+            lines.append("    No Operation")
+        lines.append("")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text("\n".join(lines), encoding='utf-8')
+    return path
+
+
+def write_cypress_specs(directory: str, files: int, test_cases: int, steps: int) -> List[str]:
+    """
+    Writes Cypress specification files ("spec<n>.cy.js") for import_cypress.py, each Test Case with description,
+    External ID and its Test Steps as cy.log() calls.
+
+    Returns
+    -------
+    List[str]
+        Paths of the files
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for file in range(1, files + 1):
+        lines = [f"describe('Spec {file}', () => {{"]
+        for test_case in range(1, test_cases + 1):
+            lines += [
+                f"  it('Test {test_case}', () => {{",
+                f"    TBCS_DESCRIPTION('Test Case {test_case} of spec {file}')",
+                f"    TBCS_AUTID('CY-{file}-{test_case}')",
+                f"    cy.log('Open spec {file} test {test_case} {ITEM_TOKEN}')"
+            ]
+            lines += [f"    cy.log('Step {step}')" for step in range(2, steps + 1)]
+            lines.append("  })")
+        lines.append("})")
+        path = Path(directory) / f"spec{file}.cy.js"
+        path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def write_behave_features(directory: str, files: int, scenarios: int, steps: int, step_definitions: int,
+                          seed: int = 0) -> List[str]:
+    """
+    Writes feature files ("features/feature<n>.feature") and their step definitions ("features/steps/steps.py") for
+    import_tc_bdt.py and import_steps_bdt.py.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the folder "features", created if missing
+
+    files: int
+        Number of feature files
+
+    scenarios: int
+        Number of scenarios of each feature file
+
+    steps: int
+        Number of steps of each scenario (Given, When ..., Then)
+
+    step_definitions: int
+        Number of step definitions ('step <n> is done with "{value}"') used by the steps
+
+    seed: int
+        Seed of the random content
+
+    Returns
+    -------
+    List[str]
+        Paths of the feature files
+    """
+    generator = random.Random(seed)
+    features = Path(directory) / "features"
+    (features / "steps").mkdir(parents=True, exist_ok=True)
+
+    definitions = [
+        "from behave import given, then, when", "", "", "@given('the user \"{name}\" is logged in')",
+        "def step_impl(context, name):", "    pass", "", "", "@then('the result is \"{result}\"')",
+        "def step_impl(context, result):", "    pass", ""
+    ]
+    for definition in range(1, step_definitions + 1):
+        definitions += ["", f"@when('step {definition} is done with \"{{value}}\"')", "def step_impl(context, value):",
+                        "    pass", ""]
+    (features / "steps" / "steps.py").write_text("\n".join(definitions), encoding='utf-8')
+
+    paths = []
+    for file in range(1, files + 1):
+        lines = [f"Feature: Feature {file}", f"  Generated feature {file}", ""]
+        for scenario in range(1, scenarios + 1):
+            lines += [
+                f"  Scenario: Feature {file} scenario {scenario}",
+                f"    Given the user \"user{scenario}\" is logged in"
+            ]
+            for step in range(max(1, steps - 2)):
+                value = ITEM_TOKEN if step == 0 else f"value{step}"
+                lines.append(f"    When step {generator.randint(1, max(1, step_definitions))} is done with \"{value}\"")
+            lines += ["    Then the result is \"ok\"", ""]
+        path = features / f"feature{file}.feature"
+        path.write_text("\n".join(lines), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def add_step_definitions(directory: str, step_definitions: int, prefix: str = "new") -> None:
+    """
+    Appends step definitions ('<prefix> step <n> is done with "{value}"') to the step definitions written by
+    write_behave_features().
+    """
+    path = Path(directory) / "features" / "steps" / "steps.py"
+    lines = []
+    for definition in range(1, step_definitions + 1):
+        lines += [
+            "", f"@when('{prefix} step {definition} is done with \"{{value}}\"')", "def step_impl(context, value):",
+            "    pass", ""
+        ]
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write("\n".join(lines))
+
+
+def change_items(paths: List[str], fraction: float, seed: int = 0) -> int:
+    """
+    Changes a random part of the items of generated sources (see ITEM_TOKEN), e.g. for a re-import.
+
+    Parameters
+    ----------
+    paths: List[str]
+        Paths of the sources
+
+    fraction: float
+        Part of the items to change (0 to 1)
+
+    seed: int
+        Seed of the selection
+
+    Returns
+    -------
+    int
+        Number of changed items
+    """
+    generator = random.Random(seed)
+    changed = 0
+    for path in paths:
+        parts = Path(path).read_text(encoding='utf-8').split(ITEM_TOKEN)
+        content = parts[0]
+        for part in parts[1:]:
+            if generator.random() < fraction:
+                content += "rev1" + part
+                changed += 1
+            else:
+                content += ITEM_TOKEN + part
+        Path(path).write_text(content, encoding='utf-8')
+    return changed
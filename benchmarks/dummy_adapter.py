@@ -0,0 +1,98 @@
+#
+# Dummy adapter of the benchmarks
+# Simulates a Test Tool without starting one, so the benchmarks measure the agent instead of the tool
+#
+
+import os
+import random
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import config
+import utils.artifact_utils as artifact_utils
+import utils.logger_utils as logger_utils
+import utils.tbcs_utils as tbcs_utils
+from utils.tbcs_api import TbcsApi
+
+from adapters.AdapterTemplate import AdapterTemplate
+
+
+class _DummyRun():
+    # Handle of a simulated run (like subprocess.Popen), the run is finished 'duration' seconds after its start
+
+    def __init__(self, duration, returncode):
+        self.__end = time.monotonic() + duration
+        self.__returncode = returncode
+
+    @property
+    def returncode(self):
+        return self.poll()
+
+    def poll(self):
+        if time.monotonic() < self.__end:
+            return None
+        return self.__returncode
+
+    def wait(self):
+        time.sleep(max(0.0, self.__end - time.monotonic()))
+        return self.__returncode
+
+
+class Dummy(AdapterTemplate):
+
+    # Behaviour of the simulated tool, set by the benchmark before the Test Session is executed:
+    # - duration: seconds each run takes
+    # - fail_rate: probability (0 to 1) of a run failing, decided by the execution id (same results in each run)
+    # - step_results: the result of each Test Step is reported
+    # - result_file_size: size in bytes of a result file uploaded for each execution (0: none)
+    duration = 0.0
+    fail_rate = 0.0
+    step_results = False
+    result_file_size = 0
+
+    def __init__(self, tbcs: TbcsApi, concrete_test_case: dict, abstract_test_case: dict, execution_id: str,
+                 temp_dir: TemporaryDirectory):
+        self.product_id = str(concrete_test_case['productId'])
+        self.test_case_id = str(concrete_test_case['id'])
+        self.execution_id = execution_id
+
+        self.__tbcs = tbcs
+        self.__concrete_test_case = concrete_test_case
+        self.__temp_dir = temp_dir
+        self.__logger = logger_utils.get_logger(self.__class__.__name__ + "_" + self.execution_id, config.LOGLEVEL)
+
+    def execute_test_case(self, parallel, ddt_row):
+        failed = random.Random(self.execution_id).random() < Dummy.fail_rate
+        run = _DummyRun(Dummy.duration, 1 if failed else 0)
+        if not parallel:
+            run.wait()
+        return run
+
+    def check_result(self, executed_cmd):
+        result = "Passed" if executed_cmd['subprocess_instance'].returncode == 0 else "Failed"
+
+        if Dummy.step_results:
+            step_results = [(str(step['id']), {"result": result})
+                            for block in self.__concrete_test_case['testSequence']['testStepBlocks']
+                            for step in block['steps']]
+            failed = tbcs_utils.report_step_results(self.__logger, self.__tbcs, self.product_id, self.test_case_id,
+                                                    self.execution_id, step_results, config.RESULT_UPLOAD_WORKERS)
+            if failed > 0:
+                self.__logger.error(f"{failed} step result(s) could not be reported")
+
+        if Dummy.result_file_size > 0:
+            with TemporaryDirectory() as result_dir:
+                path = Path(result_dir) / f"dummy-{self.execution_id}.log"
+                path.write_bytes(os.urandom(Dummy.result_file_size))
+                # the uploader copies the file, so the directory can be removed right away
+                artifact_utils.get_uploader().upload(self.__tbcs, self.product_id, self.test_case_id,
+                                                     self.execution_id, [str(path)], path.name)
+
+        return result
+
+    def final_cleanup(self):
+        # remove the attachments and the logger instance (save memory)
+        if self.__temp_dir != None:
+            self.__temp_dir.cleanup()
+        logger_utils.remove_logger(self.__logger.name)
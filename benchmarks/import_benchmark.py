@@ -0,0 +1,362 @@
+#
+# Benchmark of the importers
+# Imports generated sources (benchmarks/corpus_utils.py) into a fake TestBench CS (utils/fake_tbcs.py) and measures
+# parse time, requests and total time of each importer for three runs:
+# - cold: empty product, no import manifest
+# - warm: all items exist already, the manifest is ignored (--full)
+# - reimport: a part of the items has changed (--change), the manifest of the previous run is used
+#
+# Usage (from the root of the repository, POSIX only as the importers need a terminal):
+#   python -m benchmarks.import_benchmark [--importer NAME] [--scale 20] [--compare BASELINE.json]
+#
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from benchmarks import benchmark_utils, corpus_utils
+
+RUNS = ('cold', 'warm', 'reimport')
+
+# Sources of each importer at --scale 1 (multiplied by --scale)
+SIZES = {
+    'import_tc_rf': {
+        'files': 50,
+        'test_cases': 4,
+        'steps': 5,
+        'keywords': 50
+    },
+    'import_kwd_rf': {
+        'keywords': 500
+    },
+    'import_cypress': {
+        'files': 50,
+        'test_cases': 4,
+        'steps': 5
+    },
+    'import_tc_bdt': {
+        'files': 25,
+        'scenarios': 4,
+        'steps': 5,
+        'step_definitions': 50
+    },
+    'import_steps_bdt': {
+        'files': 10,
+        'scenarios': 4,
+        'steps': 5,
+        'step_definitions': 500
+    },
+}
+
+# Configuration of the importers in the benchmarks (see config.py.template), ACCOUNT is set to the fake server
+CONFIG = {
+    'LOGLEVEL': logging.WARNING,
+    'ADAPTER_CUSTOM_FIELD_NAME': "Automation Tool",
+    'METRICS_SINKS': [],
+}
+
+# Query of the cursor position (by the progress bars of the importers) and its answer: row 1, column 1
+_CURSOR_QUERY = b"\x1b[6n"
+_CURSOR_POSITION = b"\x1b[1;1R"
+
+
+def scaled(value, scale):
+    return max(1, round(value * scale))
+
+
+def write_sources(importer, directory, scale, seed):
+    # Writes the sources of an importer, returns its arguments, the files with changeable items and the number of items
+    sizes = {name: scaled(value, scale) for name, value in SIZES[importer].items()}
+    if importer == 'import_tc_rf':
+        files = corpus_utils.write_robot_test_files(directory + "/robot", sizes['files'], sizes['test_cases'],
+                                                    sizes['steps'], sizes['keywords'], seed)
+        return [directory + "/robot"], files, sizes['files'] * sizes['test_cases']
+    if importer == 'import_kwd_rf':
+        file = corpus_utils.write_robot_resource(directory + "/keywords.resource", sizes['keywords'])
+        return [file], [file], sizes['keywords']
+    if importer == 'import_cypress':
+        files = corpus_utils.write_cypress_specs(directory + "/cypress", sizes['files'], sizes['test_cases'],
+                                                 sizes['steps'])
+        return [directory + "/cypress"], files, sizes['files'] * sizes['test_cases']
+    files = corpus_utils.write_behave_features(directory, sizes['files'], sizes['scenarios'], sizes['steps'],
+                                               sizes['step_definitions'], seed)
+    if importer == 'import_tc_bdt':
+        return [directory + "/features", '-t', 'keyword'], files, sizes['files'] * sizes['scenarios']
+    # the given, then and when steps
+    return [directory + "/features"], [], sizes['step_definitions'] + 2
+
+
+def change_sources(importer, directory, files, items, fraction, seed):
+    # Changes a part of the items for the re-import, returns the number of changed items
+    if importer == 'import_steps_bdt':
+        # step definitions are only added or removed, changing one is adding a new one
+        added = round(items * fraction)
+        corpus_utils.add_step_definitions(directory, added)
+        return added
+    return corpus_utils.change_items(files, fraction, seed)
+
+
+def run_in_terminal(command, cwd, env, answers):
+    # Runs a command in a pseudo terminal, as the progress bars of the importers need one: their queries of the cursor
+    # position are answered, each prompt in 'answers' (prompt => answer) is answered once.
+    # Returns the exit code and the end of the output.
+    import fcntl
+    import pty
+    import select
+    import struct
+    import termios
+
+    master, slave = pty.openpty()
+    fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', 50, 200, 0, 0))
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdin=slave, stdout=slave, stderr=slave)
+    os.close(slave)
+
+    output = b""
+    pending = dict(answers)
+    try:
+        while True:
+            ready, _, _ = select.select([master], [], [], 0.1)
+            if not ready:
+                if process.poll() != None:
+                    break
+                continue
+            try:
+                data = os.read(master, 65536)
+            except OSError:
+                # the terminal is closed when the command and its subprocesses have finished
+                break
+            if data == b"":
+                break
+
+            # a query may be split into two reads, but there is only one at a time
+            window = output[-(len(_CURSOR_QUERY) - 1):] + data
+            output = (output + data)[-20000:]
+            for _ in range(window.count(_CURSOR_QUERY)):
+                os.write(master, _CURSOR_POSITION)
+            for prompt in [prompt for prompt in pending if prompt in output]:
+                os.write(master, pending.pop(prompt))
+    finally:
+        os.close(master)
+    return process.wait(), output.decode('utf-8', 'replace')
+
+
+def run_worker(spec_file):
+    # Runs an importer in this process with the configuration of the benchmark and writes the measurements to the file
+    # 'result_file' of the spec
+    import runpy
+
+    with open(spec_file) as file:
+        spec = json.load(file)
+
+    config = benchmark_utils.load_config(
+        dict(CONFIG,
+             ACCOUNT=spec['account'],
+             IMPORT_MANIFEST=spec['work_dir'] + "/manifest.json",
+             TRACING_EXPORTER="file:" + spec['span_file']))
+    if spec['import_workers'] > 0:
+        config.IMPORT_WORKERS = spec['import_workers']
+    # out.txt of libdoc and behave is written to the working directory
+    config.ROBOT_KDT = dict(config.ROBOT_KDT, base_dir=spec['work_dir'] + "/", script_dir=".", cleanup=True)
+    config.BEHAVE = dict(config.BEHAVE, base_dir=spec['work_dir'] + "/", scenario_dir=".", cleanup=True)
+
+    import utils.metrics_utils as metrics_utils
+
+    script = str(benchmark_utils.ROOT_DIR / (spec['importer'] + ".py"))
+    sys.argv = [script] + spec['args']
+    times = os.times()
+    start = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code == None else 1)
+    seconds = time.perf_counter() - start
+    end_times = os.times()
+
+    with open(spec['result_file'], 'w') as file:
+        json.dump(
+            {
+                'exit_code': exit_code,
+                'seconds': seconds,
+                # the importers and their subprocesses (parser processes, libdoc, behave)
+                'cpu_seconds': sum(end_times[:4]) - sum(times[:4]),
+                'peak_rss_bytes': benchmark_utils.get_peak_rss(),
+                'request_seconds': sum(metrics.duration for metrics in metrics_utils.get_registry().snapshot().values())
+            }, file)
+
+
+def read_parse_spans(span_file):
+    # Number and total duration of the spans "parse" of the importers
+    count = 0
+    seconds = 0.0
+    if not os.path.exists(span_file):
+        return count, seconds
+    with open(span_file) as file:
+        for line in file:
+            for resource_spans in json.loads(line)['resourceSpans']:
+                for scope_spans in resource_spans['scopeSpans']:
+                    for span in scope_spans['spans']:
+                        if span['name'] == "parse":
+                            count += 1
+                            seconds += (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e9
+    return count, seconds
+
+
+def run_import(logger, fake, server, product_id, importer, run, args, items, work_dir, plist):
+    # Runs an importer once in a worker process and returns its measurements
+    span_file = work_dir + f"/spans-{run}.jsonl"
+    spec_file = work_dir + f"/spec-{run}.json"
+    result_file = work_dir + f"/result-{run}.json"
+    with open(spec_file, 'w') as file:
+        json.dump(
+            {
+                'account': server.get_account(),
+                'importer': importer,
+                'args': args + (['--full'] if run == 'warm' else []) + (['-j', str(plist.jobs)] if plist.jobs and
+                                                                         importer in ('import_tc_rf', 'import_cypress')
+                                                                         else []),
+                'import_workers': plist.workers,
+                'work_dir': work_dir,
+                'span_file': span_file,
+                'result_file': result_file
+            }, file)
+
+    # the importers are run in the working directory, as they write temporary files (out.txt) to it
+    python_path = [str(benchmark_utils.ROOT_DIR)] + ([os.environ['PYTHONPATH']] if 'PYTHONPATH' in os.environ else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+    fake.reset_request_counts()
+    exit_code, output = run_in_terminal([sys.executable, '-m', 'benchmarks.import_benchmark', '--worker', spec_file],
+                                        work_dir, env, {b"Product ID: ": str(product_id).encode() + b"\n"})
+    if exit_code != 0 or not os.path.exists(result_file):
+        raise RuntimeError(f"{importer} ({run}) failed with exit code {exit_code}:\n{output[-3000:]}")
+    with open(result_file) as file:
+        measurements = json.load(file)
+    if measurements['exit_code'] != 0:
+        raise RuntimeError(f"{importer} ({run}) exited with code {measurements['exit_code']}:\n{output[-3000:]}")
+
+    requests = fake.request_counts()
+    parsed, parse_seconds = read_parse_spans(span_file)
+    metrics = {
+        'seconds': measurements['seconds'],
+        'parse_seconds': parse_seconds,
+        'requests': sum(requests.values()),
+        'requests_per_item': sum(requests.values()) / items,
+        'request_seconds': measurements['request_seconds'],
+        'cpu_seconds': measurements['cpu_seconds'],
+    }
+    if measurements['peak_rss_bytes'] != None:
+        metrics['peak_rss_mb'] = measurements['peak_rss_bytes'] / 1024 / 1024
+    logger.info(f"{importer} ({run}): {measurements['seconds']:.2f}s, " +
+                f"parsing {parse_seconds:.2f}s ({parsed} span(s)), {metrics['requests']} request(s)")
+    return {'parsed': parsed, 'metrics': metrics, 'requests': requests}
+
+
+def run_importer(logger, importer, plist):
+    # Runs the cold, warm and re-import run of an importer with new sources and a new fake workspace
+    from utils.fake_tbcs import FakeTbcs, FakeTbcsServer
+
+    with TemporaryDirectory() as work_dir:
+        source_dir = work_dir + "/sources"
+        args, files, items = write_sources(importer, source_dir, plist.scale, plist.seed)
+
+        fake = FakeTbcs(latency=plist.latency, seed=plist.seed)
+        product_id = fake.add_product("Product 1")
+        server = FakeTbcsServer(fake)
+        results = {}
+        try:
+            for run in RUNS:
+                changed = None
+                if run == 'reimport':
+                    changed = change_sources(importer, source_dir, files, items, plist.change, plist.seed)
+                results[run] = run_import(logger, fake, server, product_id, importer, run, args, items, work_dir, plist)
+                results[run]['items'] = items
+                results[run]['changed'] = changed
+        finally:
+            server.stop()
+            if plist.keep:
+                shutil.copytree(work_dir, plist.keep + "/" + importer, dirs_exist_ok=True)
+    return results
+
+
+def run_benchmark(logger, plist):
+    # Runs each importer 'repeat' times; the metrics of a run are the medians of its repetitions
+    results = {
+        'environment': benchmark_utils.get_environment(),
+        'parameters': {
+            'scale': plist.scale,
+            'change': plist.change,
+            'repeat': plist.repeat,
+            'latency': plist.latency,
+            'import_workers': plist.workers,
+            'jobs': plist.jobs,
+            'seed': plist.seed
+        },
+        'workloads': {}
+    }
+    for importer in plist.importer or SIZES.keys():
+        repetitions = [run_importer(logger, importer, plist) for _ in range(plist.repeat)]
+        for run in RUNS:
+            runs = [repetition[run] for repetition in repetitions]
+            results['workloads'][f"{importer}.{run}"] = {
+                'items': runs[0]['items'],
+                'changed': runs[0]['changed'],
+                'parsed': runs[0]['parsed'],
+                'metrics': {metric: statistics.median(run['metrics'][metric] for run in runs)
+                            for metric in runs[0]['metrics']},
+                'requests': runs[0]['requests'],
+                'runs': [run['metrics'] for run in runs]
+            }
+    return results
+
+
+if __name__ == "__main__":
+    # Parse command line
+    parser = argparse.ArgumentParser(description="Measure the importers against a fake TestBench CS.")
+    parser.add_argument('--importer',
+                        action='append',
+                        choices=SIZES.keys(),
+                        help='importer to run, can be repeated (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='factor of the size of the sources (default: 1)')
+    parser.add_argument('--change', type=float, default=0.1, help='part of the items changed for the re-import')
+    parser.add_argument('--repeat', type=int, default=1, help='repetitions of each importer, the median is reported')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of each response of the fake server in s')
+    parser.add_argument('--workers', type=int, default=0, help='IMPORT_WORKERS (default: from config.py.template)')
+    parser.add_argument('--jobs', type=int, default=0, help='parser processes of import_tc_rf and import_cypress')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated sources')
+    parser.add_argument('--keep', help='copy sources, spans and manifests of the runs to this directory')
+    parser.add_argument('--output', help='JSON file of the results (default: benchmarks/results/import-<time>.json)')
+    parser.add_argument('--compare', help='JSON file of former results, regressions are reported (exit code 1)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change of a regression (default: 0.1)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    plist = parser.parse_args()
+
+    if plist.worker:
+        run_worker(plist.worker)
+        sys.exit(0)
+
+    # Configure logging
+    import utils.logger_utils as logger_utils
+    logger = logger_utils.get_logger('Import benchmark', logging.INFO)
+
+    results = run_benchmark(logger, plist)
+
+    output = plist.output or str(benchmark_utils.ROOT_DIR / "benchmarks" / "results" /
+                                 f"import-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    benchmark_utils.write_results(output, results)
+    logger.info(f"Results written to '{output}'")
+
+    if plist.compare:
+        lines = benchmark_utils.compare(results, benchmark_utils.read_results(plist.compare), plist.threshold)
+        logger.info("Comparison with '" + plist.compare + "':\n\t" + "\n\t".join(lines))
+        if any(line.endswith("REGRESSION") for line in lines):
+            logger.error("Regressions found!")
+            sys.exit(1)
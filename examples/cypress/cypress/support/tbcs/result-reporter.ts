@@ -104,8 +104,6 @@ function afterEachTest() {
   }
   this.currentTest.state === 'pending' ? (reportTest.skipped = true) : (reportTest.skipped = false);
 
-  // publish to tbcs
-  if (reporterOptions.skipResultImport) return;
   var eid = '';
   loggedMetaCommands.forEach(cmd => {
     var regcat = /(TBCS_AUTID\()(.+)(\).*)/;
@@ -113,6 +111,15 @@ function afterEachTest() {
       eid = cmd.content.match(regcat)[2];
     }
   });
+
+  // batched runs of the agent: one result line per test, read by the agent to set the result of each execution
+  if (Cypress.env('resultfile')) {
+    const line = { externalId: eid, executionId: TestBenchAutomation.GetBatchExecutionId(eid), failed: reportTest.failed };
+    cy.writeFile(Cypress.env('resultfile'), JSON.stringify(line) + '\n', { flag: 'a+' });
+  }
+
+  // publish to tbcs
+  if (reporterOptions.skipResultImport) return;
   var descr = '';
   loggedMetaCommands.forEach(cmd => {
     var regcat = /(TBCS_DESCRIPTION\()(.+)(\).*)/;
@@ -235,7 +242,7 @@ function afterAllTests() {
   }
   if (reporterOptions.skipResultImport) return;
   // externally called with execution ID?
-  if (Cypress.env('extid')) return;
+  if (Cypress.env('extid') || Cypress.env('executions')) return;
   cy.wrap('Closing TBCS test session.')
     .then(async () => {
       await tbcsAutomation.End();
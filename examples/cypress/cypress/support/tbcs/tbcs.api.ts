@@ -25,7 +25,10 @@ export class TestBenchApi {
   }
 
   private apiTokenHeaders() {
-    return { 'Content-Type': 'application/json', Authorization: `Bearer ${this.apiSession.accessToken}` };
+    const headers = { 'Content-Type': 'application/json', Authorization: `Bearer ${this.apiSession.accessToken}` };
+    // runs started by the agent pass its trace context (W3C Trace Context), the requests become part of its trace
+    if (Cypress.env('traceparent')) headers['traceparent'] = Cypress.env('traceparent');
+    return headers;
   }
 
   public login() {
@@ -65,6 +65,15 @@ export class TestBenchAutomation {
     }
   }
 
+  // Batched runs of the agent pass the executions as "<external id>:<execution id>|..." instead of a single "extid"
+  public static GetBatchExecutionId(externalId: string): string {
+    for (let entry of String(Cypress.env('executions') || '').split('|')) {
+      const separator = entry.lastIndexOf(':');
+      if (separator > 0 && entry.substring(0, separator) === externalId) return entry.substring(separator + 1);
+    }
+    return '';
+  }
+
   public async PublishAutomatedTest(testCase: TestBenchTestCase, result?: Result) {
     ReportLogger.info(`TestBenchAutomation.runAutomatedTest(testCase: ${JSON.stringify(testCase)}), status: ${JSON.stringify(result)}`);
     try {
@@ -158,9 +167,12 @@ export class TestBenchAutomation {
 
       // add execution
       let executionId = '';
-      if (Cypress.env('extid')) {
+      if (Cypress.env('executions')) {
+        executionId = TestBenchAutomation.GetBatchExecutionId(testCase.externalId);
+      } else if (Cypress.env('extid')) {
         executionId = Cypress.env('extid');
-      } else {
+      }
+      if (!executionId) {
         executionId = await this.tbcsApi.createTestCaseExecution(testCaseId);
       }
       if (Cypress.env('sessiontoken')) {
@@ -0,0 +1,82 @@
+import argparse
+import logging
+import signal
+import time
+
+import utils.logger_utils as logger_utils
+from utils.fake_tbcs import FakeTbcs, FakeTbcsServer, generate_workspace
+
+# Parse command line
+parser = argparse.ArgumentParser(
+    description="Run a local fake TestBench CS with a synthetic workspace (for tests and benchmarks of the agent "
+    "and the importers).")
+parser.add_argument('--host', default="127.0.0.1", help='address to listen on (default: 127.0.0.1)')
+parser.add_argument('--port', type=int, default=8181, help='port to listen on (default: 8181, 0: any free port)')
+parser.add_argument('-w', '--workspace', default="fake", help='name of the workspace (default: fake)')
+parser.add_argument('-u', '--user', default="agent", help='login of the user (default: agent)')
+parser.add_argument('-p', '--password', default="agent", help='password of the user (default: agent)')
+parser.add_argument('--products', type=int, default=1, help='number of products')
+parser.add_argument('--test-cases', type=int, default=100, help='number of Test Cases of all products')
+parser.add_argument('--steps', type=int, default=5, help='number of Test Steps of each Test Case')
+parser.add_argument('--keywords', type=int, default=0, help='number of Keywords of all products')
+parser.add_argument('--ddt-tables', type=int, default=0, help='number of Test Cases with a DDT table')
+parser.add_argument('--ddt-rows', type=int, default=5, help='number of rows of each DDT table')
+parser.add_argument('--attachments', type=int, default=0, help='number of attachments of each Test Case')
+parser.add_argument('--attachment-size', type=int, default=1024, help='size of each attachment in bytes')
+parser.add_argument('--suites', type=int, default=1, help='number of active Test Suites of each product')
+parser.add_argument('--sessions', type=int, default=0, help='number of ready Test Sessions of each product')
+parser.add_argument('--suite-size', type=int, default=0, help='Test Cases per Test Suite/Session (0: all)')
+parser.add_argument('--custom-field',
+                    nargs=2,
+                    action='append',
+                    default=[],
+                    metavar=('NAME', 'VALUE'),
+                    help='custom field of all Test Cases, e.g. --custom-field "Automation Tool" RobotFramework')
+parser.add_argument('--latency', type=float, default=0.0, help='delay of each response in seconds')
+parser.add_argument('--jitter', type=float, default=0.0, help='random additional delay of each response in seconds')
+parser.add_argument('--error-rate', type=float, default=0.0, help='probability (0 to 1) of a request failing')
+parser.add_argument('--error-status', type=int, default=503, help='status code of failing requests (default: 503)')
+parser.add_argument('--error-operation',
+                    action='append',
+                    default=[],
+                    help='operation of TbcsApi which may fail, e.g. post_execution (default: all)')
+parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic content, latency and failures')
+plist = parser.parse_args()
+
+# Configure logging
+logger = logger_utils.get_logger('Fake TestBench CS', logging.INFO)
+
+fake = FakeTbcs(plist.workspace, plist.user, plist.password, plist.latency, plist.jitter, plist.error_rate,
+                plist.error_status, plist.error_operation, plist.seed)
+
+start = time.perf_counter()
+products = generate_workspace(fake,
+                              products=plist.products,
+                              test_cases=plist.test_cases,
+                              steps=plist.steps,
+                              keywords=plist.keywords,
+                              ddt_tables=plist.ddt_tables,
+                              ddt_rows=plist.ddt_rows,
+                              attachments=plist.attachments,
+                              attachment_size=plist.attachment_size,
+                              suites=plist.suites,
+                              sessions=plist.sessions,
+                              suite_size=plist.suite_size,
+                              custom_fields=dict(plist.custom_field),
+                              seed=plist.seed)
+logger.info(f"Generated {len(products)} product(s) with {sum(len(ids) for ids in products.values())} Test Case(s) " +
+            f"in {time.perf_counter() - start:.1f}s")
+
+server = FakeTbcsServer(fake, plist.host, plist.port)
+logger.info(f"Serving workspace '{fake.workspace}' at {server.url} (login: '{fake.login}', " +
+            f"password: '{fake.password}')")
+
+# stop with Ctrl+C or SIGTERM
+signal.signal(signal.SIGTERM, signal.default_int_handler)
+try:
+    while True:
+        time.sleep(3600)
+except KeyboardInterrupt:
+    server.stop()
+    logger.info("Requests by operation: " +
+                ", ".join(f"{operation}: {count}" for operation, count in sorted(fake.request_counts().items())))
@@ -1,10 +1,13 @@
 import argparse
-import re
-from typing import List
+import os
+from typing import Dict, List, Union
 
 import config
+import utils.cypress_utils as cypress_utils
 import utils.logger_utils as logger_utils
+import utils.manifest_utils as manifest_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.terminal_utils import ProgressIndicator
 
 
@@ -54,196 +57,254 @@ class Cy_Epic(object):
         self.Stories = []
 
 
-# Configure logging
-logger = logger_utils.get_logger('CypressImport', config.LOGLEVEL)
-
-# Parse command line
-parser = argparse.ArgumentParser(description="Import Test Cases from Cypress specification files.")
-parser.add_argument('-d',
-                    '--dry-run',
-                    dest='dryrun',
-                    action='store_const',
-                    const=True,
-                    default=False,
-                    help='only print scanned results')
-parser.add_argument('-e', '--epic', nargs='?', default='Cypress', help='epic name to generate')
-parser.add_argument("source", nargs="+", default=[''], help='name of one or more files or folders to be scanned')
-plist = tbcs_utils.handle_default_args(config.ACCOUNT, parser)
-
-logger.info('\033[0;32mCypress specification import started.\033[0m')
-logger.info(f'Using source(s) "{plist.source}"{" with option --dry-run" if plist.dryrun else ""}')
-logger.info(f'Using Epic name: "{plist.epic}"')
-
-logger.info('Scanning specifications ...')
-
-files = tbcs_utils.get_files(logger, plist.source)
-if len(files) == 0:
-    logger.error('No files found for scanning. Skipping ...')
-    exit(1)
-
-
-def __getStoryFromFile(file: str) -> Cy_User_Story:
-    story: Cy_User_Story = None  # type: ignore
-    try:
-        with open(file, 'r') as f:
-            for line in f:
-                describe_line = re.search('^\s*describe\(\'(.*)\'.*', line)  # type: ignore
-                if describe_line:
-                    logger.debug(f'describe line found: {line}')
-                    story = Cy_User_Story(epic, describe_line.group(1))
-                    continue
-                it_line = re.search('^\s*it\(\'(.*)\'.*', line)  # type: ignore
-                if it_line:
-                    logger.debug(f'it line found: {line}')
-                    testcase = Cy_Test_Case(story, f'{story.Name} {it_line.group(1)}')
-                    story.Test_Cases.append(testcase)
-                    continue
-                # >>> meta data lines
-                descr_line = re.search('^\s*TBCS_DESCRIPTION\(\'(.*)\'.*', line)  # type: ignore
-                if descr_line:
-                    logger.debug(f'TBCS_DESCRIPTION line found: {line}')
-                    testcase.Description = descr_line.group(1)  # type: ignore
-                    continue
-                extid_line = re.search('^\s*TBCS_AUTID\(\'(.*)\'.*', line)  # type: ignore
-                if extid_line:
-                    logger.debug(f'TBCS_AUTID line found: {line}')
-                    testcase.ExternalId = extid_line.group(1)  # type: ignore
-                    continue
-                # <<< meta data lines
-                log_line = re.search('^\s*cy\.log\(\'(.*)\'.*', line)  # type: ignore
-                if log_line:
-                    logger.debug(f'log line found: {line}')
-                    teststep = Cy_TestStep(testcase, log_line.group(1))  # type: ignore
-                    testcase.Test_Steps.append(teststep)  # type: ignore
-                    continue
-    except Exception as e:
-        logger.error(f'Failed to extract Test Cases from file "{file}"\n\t{e.__str__()}')
-
+def get_story(epic: Cy_Epic, file: str, result: Union[dict, None]) -> Union[Cy_User_Story, None]:
+    # Build the User Story of one spec file from the scan result (see cypress_utils.scan_spec)
+    if result == None or (result['story'] == None and result['test_cases'] == []):
+        return None
+
+    story_name = result['story'] if result['story'] != None else os.path.splitext(os.path.basename(file))[0]
+    story = Cy_User_Story(epic, story_name)
+    story.FileName = file
+    for scanned in result['test_cases']:
+        testcase = Cy_Test_Case(story, scanned['name'])
+        testcase.Description = scanned['description']
+        testcase.ExternalId = scanned['external_id']
+        for step in scanned['steps']:
+            testcase.Test_Steps.append(Cy_TestStep(testcase, step))
+        story.Test_Cases.append(testcase)
     return story
 
 
-progress_bar_files = ProgressIndicator(len(files), 'Scanning', 'Files')
-epic = Cy_Epic(plist.epic)
-for file in files:
-    progress_bar_files.update_progress(file)
-
-    us = __getStoryFromFile(file)
-    if us != None:
-        us.FileName = file
-        epic.Stories.append(us)
-ProgressIndicator.clear_indicators()
-logger.info('Scanning specifications finished')
-
-tc_found_count = 0
-for us in epic.Stories:
-    for tc in us.Test_Cases:
-        tc_found_count += 1
-if tc_found_count == 0:
-    logger.warning('No test cases found. Skipping ...')
-    exit(1)
-
-logger.info(f'Found {tc_found_count} Test Cases')
-
-if plist.dryrun:
-    print('Scan result:\n\n')
-    print(f'Epic: {epic.Name}')
+def __import_epic(name: str) -> str:
+    eid = tbcs.post_epic(pid, {"name": name})
+    manifest.update('', '', f'Epic {name}', {'epicId': eid})
+    return eid
+
+
+def __import_user_story(eid: str, us: Cy_User_Story) -> str:
+    logger.debug(f'Importing User Story: \'{us.Name}\' ...')
+    uid = manifest.get_ids(us.FileName).get('userStoryId', '')
+    if uid == '':
+        uid = tbcs.post_user_story(pid, {"epicId": eid, "name": us.Name})
+        # remember the User Story even if not all Test Cases of the file can be imported
+        manifest.update(us.FileName, '', ids={'userStoryId': uid})
+    return uid
+
+
+def __import_test_case(uid: str, tc: Cy_Test_Case, tc_key: str, tc_hash: str) -> str:
+    tcfound = tbcs.get_test_case_by_filter(pid, 'externalId', 'equals', tc.ExternalId)
+    if tcfound != []:
+        logger.debug(f'Test Case with externalID "{tc.ExternalId}" already exists. Updating ...')
+        tcid = str(tcfound[0]['id'])
+        tcPatchJson = {
+            "name": tc.Name,
+            "description": {
+                "text": tc.Description
+            },
+            "isAutomated": True,
+            "toBeReviewed": True,
+            "externalId": {
+                "value": tc.ExternalId
+            },
+        }
+        tbcs.patch_test_case(pid, tcid, tcPatchJson)
+        if cfId >= 0:
+            tcPatchJson = {"customFields": [{"customFieldId": cfId, "value": "Cypress"}]}
+            tbcs.patch_test_case(pid, tcid, tcPatchJson)
+        tcitemfound = tbcs.get_test_case(pid, tcid)
+        block = tbcs_utils.get_test_step_block(logger, tbcs, tcitemfound, "Test Steps")
+        if block != None:
+            blockid = block['id']
+            for step in block['steps']:
+                tbcs.remove_test_step(pid, tcid, step['id'])
+            for ts in tc.Test_Steps:
+                tbcs.add_test_step(pid, tcid, ts.Name, blockid, "TestStep")
+        manifest.update(tc.Parent.FileName, tc_hash, tc_key, {'testCaseId': tcid})
+        return tcid
+
+    logger.debug(f'Importing Test Case "{tc.Name}" with externalID "{tc.ExternalId}" ...')
+    tcJson = {"userStoryId": uid, "name": tc.Name, "testCaseType": "StructuredTestCase", "customTestSequenceTitles": []}
+    tcid = tbcs.post_test_case(pid, tcJson)
+
+    tcPatchJson = {
+        "description": {
+            "text": tc.Description
+        },
+        "isAutomated": True,
+        "toBeReviewed": True,
+        "externalId": {
+            "value": tc.ExternalId
+        },
+    }
+    tbcs.patch_test_case(pid, tcid, tcPatchJson)
+    if cfId >= 0:
+        tcPatchJson = {"customFields": [{"customFieldId": cfId, "value": "Cypress"}]}
+        tbcs.patch_test_case(pid, tcid, tcPatchJson)
+    # Test Steps are appended, so they have to be added one after the other
+    tsbid = tbcs.add_test_step_block(pid, tcid, "Test Steps")
+    for ts in tc.Test_Steps:
+        tbcs.add_test_step(pid, tcid, ts.Name, tsbid, "TestStep")
+    manifest.update(tc.Parent.FileName, tc_hash, tc_key, {'testCaseId': tcid})
+    return tcid
+
+
+def __complete_spec(uid: str, us: Cy_User_Story, file_hash: str) -> None:
+    manifest.update(us.FileName, file_hash, ids={'userStoryId': uid})
+
+
+# The guard is required for the worker processes scanning the spec files
+if __name__ == "__main__":
+    # Configure logging
+    logger = logger_utils.get_logger('CypressImport', config.LOGLEVEL)
+
+    # Parse command line
+    parser = argparse.ArgumentParser(description="Import Test Cases from Cypress specification files.")
+    parser.add_argument('-d',
+                        '--dry-run',
+                        dest='dryrun',
+                        action='store_const',
+                        const=True,
+                        default=False,
+                        help='only print scanned results')
+    parser.add_argument('-e', '--epic', nargs='?', default='Cypress', help='epic name to generate')
+    parser.add_argument("source", nargs="+", default=[''], help='name of one or more files or folders to be scanned')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help='number of processes used for scanning spec files (default: number of CPUs)')
+    manifest_utils.add_manifest_args(parser)
+    plist = tbcs_utils.handle_default_args(config.ACCOUNT, parser)
+    tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-import-cypress")
+
+    logger.info('\033[0;32mCypress specification import started.\033[0m')
+    logger.info(f'Using source(s) "{plist.source}"{" with option --dry-run" if plist.dryrun else ""}')
+    logger.info(f'Using Epic name: "{plist.epic}"')
+
+    logger.info('Scanning specifications ...')
+
+    files = tbcs_utils.get_files(logger, plist.source)
+    if len(files) == 0:
+        logger.error('No files found for scanning. Skipping ...')
+        exit(1)
+
+    progress_bar_files = ProgressIndicator(len(files), 'Scanning', 'Files')
+    epic = Cy_Epic(plist.epic)
+    for file, result in cypress_utils.scan_spec_files(logger, files, plist.jobs):
+        progress_bar_files.update_progress(file)
+
+        us = get_story(epic, file, result)
+        if us != None:
+            epic.Stories.append(us)
+    ProgressIndicator.clear_indicators()
+    logger.info('Scanning specifications finished')
+
+    tc_found_count = 0
     for us in epic.Stories:
-        print(f'  User Story: {us.Name} (from file: {us.FileName})')
         for tc in us.Test_Cases:
-            print(f'    Test Case: {tc.Name}')
-            print(f'     Description: {tc.Description}')
-            print(f'     ExternalID: {tc.ExternalId}')
-            for ts in tc.Test_Steps:
-                print(f'      Test Step: {ts.Name}')
-    exit(0)
+            tc_found_count += 1
+    if tc_found_count == 0:
+        logger.warning('No test cases found. Skipping ...')
+        exit(1)
+
+    logger.info(f'Found {tc_found_count} Test Cases')
+
+    if plist.dryrun:
+        print('Scan result:\n\n')
+        print(f'Epic: {epic.Name}')
+        for us in epic.Stories:
+            print(f'  User Story: {us.Name} (from file: {us.FileName})')
+            for tc in us.Test_Cases:
+                print(f'    Test Case: {tc.Name}')
+                print(f'     Description: {tc.Description}')
+                print(f'     ExternalID: {tc.ExternalId}')
+                for ts in tc.Test_Steps:
+                    print(f'      Test Step: {ts.Name}')
+        exit(0)
+
+    logger.info(f'Starting import to "{config.ACCOUNT["TBCS_BASE"]}" ...')
+    tbcs = tbcs_utils.connect_itb(logger, config.ACCOUNT)
+    pid = tbcs_utils.ask_for_product(logger, tbcs)
+    if (pid == ""):
+        exit(1)
+
+    manifest_file = getattr(config, "IMPORT_MANIFEST", ".tbcs_import_manifest.json")
+    manifest = manifest_utils.get_manifest(logger, manifest_file, config.ACCOUNT, pid, "import_cypress", plist.full)
 
-logger.info(f'Starting import to "{config.ACCOUNT["TBCS_BASE"]}" ...')
-tbcs = tbcs_utils.connect_itb(logger, config.ACCOUNT)
-pid = tbcs_utils.ask_for_product(logger, tbcs)
-if (pid == ""):
-    exit(1)
-
-try:
-    epicJson = {"name": epic.Name}
-    eid = tbcs.post_epic(pid, epicJson)
-
-    cfId = -1
-    cfList = tbcs.get_custom_field_list()
-    if cfList:
-        for cf in cfList:
-            if cf["name"] == config.ADAPTER_CUSTOM_FIELD_NAME:
-                cfId = cf["id"]
-
-    progress_bar_us = ProgressIndicator(len(epic.Stories), 'Importing', 'User Stories', 60)
-    progress_bar_tc = ProgressIndicator(0, 'Importing', 'Test Cases', 60)
-    for us in epic.Stories:
-        progress_bar_us.update_progress(us.Name)
-        logger.debug(f'Importing User Story: \'{us.Name}\' ...')
-        usJson = {"epicId": eid, "name": us.Name}
-        try:
-            uid = tbcs.post_user_story(pid, usJson)
+    try:
+        cfId = -1
+        cfList = tbcs.get_custom_field_list()
+        if cfList:
+            for cf in cfList:
+                if cf["name"] == config.ADAPTER_CUSTOM_FIELD_NAME:
+                    cfId = cf["id"]
+
+        # Uploads run as a dependency graph: Epic -> User Stories -> Test Cases; Test Cases are imported concurrently
+        executor = tbcs_utils.ImportExecutor(logger, getattr(config, "IMPORT_WORKERS", 4))
+
+        # The Epic is only created if at least one spec file needs to be imported
+        epic_task = manifest.get_ids('', f'Epic {epic.Name}').get('epicId', None)
+
+        # Test Cases are matched by external ID: Test Cases with the same external ID (in different spec files) are
+        # imported one after the other, so the first one creates the Test Case and the next ones update it (each one
+        # is imported, even if an earlier one failed)
+        last_test_case_task: Dict[str, tbcs_utils.ImportTask] = {}
+
+        progress_bar_us = ProgressIndicator(len(epic.Stories), 'Importing', 'User Stories', 60)
+        progress_bar_tc = ProgressIndicator(0, 'Importing', 'Test Cases', 60)
+        for us in epic.Stories:
+            progress_bar_us.update_progress(us.Name)
+
+            file_hash = manifest_utils.hash_file(us.FileName)
+            if manifest.is_unchanged(us.FileName, file_hash):
+                logger.debug(f'Spec file "{us.FileName}" is unchanged since the last import. Skipping ...')
+                continue
+
+            if epic_task is None:
+                epic_task = executor.submit(f'Epic "{epic.Name}"', __import_epic, epic.Name)
+
+            us_task = executor.submit(f'User Story "{us.Name}"', __import_user_story, epic_task, us)
             progress_bar_tc.reset_total(len(us.Test_Cases))
 
+            tc_tasks = []
             for tc in us.Test_Cases:
                 progress_bar_tc.update_progress(f'{tc.ExternalId} - {tc.Name}')
-                try:
-                    tcfound = tbcs.get_test_case_by_filter(pid, 'externalId', 'equals', tc.ExternalId)
-                    if tcfound != []:
-                        logger.debug(f'Test Case with externalID "{tc.ExternalId}" already exists. Updating ...')
-                        tcid = str(tcfound[0]['id'])
-                        tcPatchJson = {
-                            "name": tc.Name,
-                            "description": {
-                                "text": tc.Description
-                            },
-                            "isAutomated": True,
-                            "toBeReviewed": True,
-                            "externalId": {
-                                "value": tc.ExternalId
-                            },
-                        }
-                        tbcs.patch_test_case(pid, tcid, tcPatchJson)
-                        if cfId >= 0:
-                            tcPatchJson = {"customFields": [{"customFieldId": cfId, "value": "Cypress"}]}
-                            tbcs.patch_test_case(pid, tcid, tcPatchJson)
-                        tcitemfound = tbcs.get_test_case(pid, tcid)
-                        block = tbcs_utils.get_test_step_block(logger, tbcs, tcitemfound, "Test Steps")
-                        if block != None:
-                            blockid = block['id']
-                            for step in block['steps']:
-                                tbcs.remove_test_step(pid, tcid, step['id'])
-                            for ts in tc.Test_Steps:
-                                tbcs.add_test_step(pid, tcid, ts.Name, blockid, "TestStep")
-                        continue
-                    logger.debug(f'Importing Test Case "{tc.Name}" with externalID "{tc.ExternalId}" ...')
-                    tcJson = {"userStoryId": uid, "name": tc.Name, "testCaseType": "StructuredTestCase", "customTestSequenceTitles": []}
-                    tcid = tbcs.post_test_case(pid, tcJson)
-
-                    tcPatchJson = {
-                        "description": {
-                            "text": tc.Description
-                        },
-                        "isAutomated": True,
-                        "toBeReviewed": True,
-                        "externalId": {
-                            "value": tc.ExternalId
-                        },
-                    }
-                    tbcs.patch_test_case(pid, tcid, tcPatchJson)
-                    if cfId >= 0:
-                        tcPatchJson = {"customFields": [{"customFieldId": cfId, "value": "Cypress"}]}
-                        tbcs.patch_test_case(pid, tcid, tcPatchJson)
-                    tsbid = tbcs.add_test_step_block(pid, tcid, "Test Steps")
-                    for ts in tc.Test_Steps:
-                        tbcs.add_test_step(pid, tcid, ts.Name, tsbid, "TestStep")
-                except Exception as e:
-                    logger.error(
-                        f'Failed to import Test Case "{tc.Name}" with externalID "{tc.ExternalId}"\n\t{e.__str__()}')
-        except Exception as e:
-            logger.error(f'Failed to import User Story "{us.Name}"\n\t{e.__str__()}')
-except Exception as e:
-    logger.error(f'Unexpected error occured:\n\t{e.__str__()}')
-    exit(1)
-ProgressIndicator.clear_indicators()
-logger.info('Done')
-exit(0)
+                tc_key = tc.ExternalId if tc.ExternalId else tc.Name
+                tc_hash = manifest_utils.hash_content({
+                    'name': tc.Name,
+                    'description': tc.Description,
+                    'externalId': tc.ExternalId,
+                    'steps': [ts.Name for ts in tc.Test_Steps],
+                })
+                if manifest.is_unchanged(us.FileName, tc_hash, tc_key):
+                    logger.debug(f'Test Case "{tc.Name}" is unchanged since the last import. Skipping ...')
+                    continue
+
+                previous_task = last_test_case_task.get(tc.ExternalId) if tc.ExternalId else None
+                tc_task = executor.submit(f'Test Case "{tc.Name}" with externalID "{tc.ExternalId}"',
+                                          __import_test_case,
+                                          us_task,
+                                          tc,
+                                          tc_key,
+                                          tc_hash,
+                                          after=[previous_task] if previous_task else None)
+                if tc.ExternalId:
+                    last_test_case_task[tc.ExternalId] = tc_task
+                tc_tasks.append(tc_task)
+
+            # Only a completely imported file is skipped next time
+            executor.submit(f'Spec file "{us.FileName}"', __complete_spec, us_task, us, file_hash, depends_on=tc_tasks)
+
+        failed_tasks = executor.wait()
+        executor.shutdown()
+    except Exception as e:
+        logger.error(f'Unexpected error occured:\n\t{e.__str__()}')
+        manifest.save()
+        exit(1)
+    manifest.save()
+    ProgressIndicator.clear_indicators()
+    if failed_tasks:
+        logger.error(f'Import finished with {len(failed_tasks)} failed or skipped upload(s)')
+        exit(1)
+    logger.info('Done')
+    exit(0)
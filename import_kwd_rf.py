@@ -6,7 +6,9 @@ import argparse
 
 import config
 import utils.logger_utils as logger_utils
+import utils.manifest_utils as manifest_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.terminal_utils import ProgressIndicator
 
 # Configure logging
@@ -23,7 +25,9 @@ parser.add_argument('-d',
                     const=True,
                     default=False,
                     help='upDate existing Keywords')
+manifest_utils.add_manifest_args(parser)
 plist = tbcs_utils.handle_default_args(config.ACCOUNT, parser)
+tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-import-kwd-rf")
 
 filename = plist.source[0]
 outFile = config.ROBOT_KDT['base_dir'] + \
@@ -40,7 +44,8 @@ else:
 
 call = ["libdoc", "-f", "json", filename, outFile]
 try:
-    subprocess.run(call, check=True)
+    with tracing_utils.get_tracer().span("parse", {'tbcs.file': filename}):
+        subprocess.run(call, check=True)
 except:
     logger.error("Calling 'libdoc' failed - is it set up correctly? Name of file correct? Terminating ...")
     exit(1)
@@ -65,9 +70,19 @@ pid = tbcs_utils.ask_for_product(logger, tbcs)
 if (pid == ""):
     exit()
 
+manifest_file = getattr(config, "IMPORT_MANIFEST", ".tbcs_import_manifest.json")
+manifest = manifest_utils.get_manifest(logger, manifest_file, config.ACCOUNT, pid, "import_kwd_rf", plist.full)
+
 count = 0
 reuse_count = 0
 update_count = 0
+skip_count = 0
+
+source_hash = manifest_utils.hash_content({'keywords': obj["keywords"], 'prefix': prefix, 'update': updateFlag})
+if manifest.is_unchanged(filename, source_hash):
+    logger.info(f'Source "{filename}" is unchanged since the last import. Nothing to import.')
+    skip_count = len(obj["keywords"])
+    obj["keywords"] = []
 
 progress_bar = ProgressIndicator(len(obj["keywords"]), 'Importing', 'Keywords', 50)
 
@@ -75,6 +90,12 @@ for keyword in obj["keywords"]:
     progress_bar.update_progress()
 
     name = keyword["name"]
+
+    keyword_hash = manifest_utils.hash_content({'keyword': keyword, 'prefix': prefix, 'update': updateFlag})
+    if manifest.is_unchanged(filename, keyword_hash, name):
+        skip_count = skip_count + 1
+        logger.debug(f'Keyword unchanged since the last import: {prefix + name}')
+        continue
     lib = keyword["source"]
     description = keyword["doc"]
 
@@ -162,8 +183,12 @@ for keyword in obj["keywords"]:
             reuse_count = reuse_count + 1
             logger.debug(f'Keyword not imported: {prefix + name} - reason: {result["action"]}')
 
+    manifest.update(filename, keyword_hash, name, {'keywordId': kwd_id})
     logger.debug("Creation/Update id: " + kwd_id)
 
+manifest.update(filename, source_hash)
+manifest.save()
+
 ProgressIndicator.clear_indicators()
 
 logger.info(f'Sucessfully imported {str(count)} Keywords.')
@@ -171,6 +196,8 @@ if (update_count > 0):
     logger.info(f'Updated {str(update_count)} existing Keywords.')
 if (reuse_count > 0):
     logger.info(f'Found {str(reuse_count)} existing Keywords - not importing them.')
+if (skip_count > 0):
+    logger.info(f'Skipped {str(skip_count)} Keywords unchanged since the last import.')
 
 if config.ROBOT_KDT["cleanup"]:
     os.remove(outFile)
@@ -5,17 +5,21 @@ import argparse
 
 import config
 import utils.logger_utils as logger_utils
+import utils.manifest_utils as manifest_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.terminal_utils import ProgressIndicator
 
 # Parse command line
 parser = argparse.ArgumentParser(description="Import BDT steps via behave.")
 parser.add_argument('source', nargs=1, help='name of feature file (*.feature) or folder to be scanned')
 parser.add_argument('-x', '--prefix', nargs=1, help='prefix added to each Keyword name')
+manifest_utils.add_manifest_args(parser)
 plist = tbcs_utils.handle_default_args(config.ACCOUNT, parser)
 
 # Configure logging
 logger = logger_utils.get_logger('import BDT Steps', config.LOGLEVEL)
+tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-import-steps-bdt")
 
 filename = plist.source[0].replace("\\", "/")
 outFile = config.BEHAVE['base_dir'] + config.BEHAVE['scenario_dir'].replace("\\", "/") + "/out.txt"
@@ -27,7 +31,8 @@ if plist.prefix != None:  # each Keyword will get this prefix
 call = ["behave", "-d", "-f", "steps.doc", "-o", outFile]
 call.append(filename)
 try:
-    res = subprocess.run(call)
+    with tracing_utils.get_tracer().span("parse", {'tbcs.file': filename}):
+        res = subprocess.run(call)
 except:
     logger.error("Calling 'Behave' failed - is it set up correctly? Terminating ...")
     exit()
@@ -43,16 +48,25 @@ pid = tbcs_utils.ask_for_product(logger, tbcs)
 if (pid == ""):
     exit()
 
+manifest_file = getattr(config, "IMPORT_MANIFEST", ".tbcs_import_manifest.json")
+manifest = manifest_utils.get_manifest(logger, manifest_file, config.ACCOUNT, pid, "import_steps_bdt", plist.full)
+
 file = open(outFile, 'r')
 lines = file.readlines()
 file.close()
 
+source_hash = manifest_utils.hash_content({'lines': lines, 'prefix': prefix})
+if manifest.is_unchanged(filename, source_hash):
+    logger.info(f"Step definitions of '{filename}' are unchanged since the last import. Nothing to import.")
+    lines = []
+
 re_line = re.compile(r"@(.*)\(\'(.*?)\'\)")
 re_par = re.compile(r"\"\{(.*?)\}\"")
 #re_par = re.compile(r"\{(.*?)\}")
 
 count_created = 0
 count_reused = 0
+count_skipped = 0
 
 progress_bar = ProgressIndicator(len(lines), 'Reading', 'lines', 50)
 
@@ -67,6 +81,12 @@ for current in lines:
             match = re_line.search(current)
             if not match:
                 continue
+
+            step_hash = manifest_utils.hash_content({'line': current, 'prefix': prefix})
+            if manifest.is_unchanged(filename, step_hash, current):
+                count_skipped = count_skipped + 1
+                continue
+
             lib = match.group(1)
             name = match.group(2)
             par_match = re_par.search(name)
@@ -100,11 +120,17 @@ for current in lines:
             else:
                 count_reused = count_reused + 1
 
+            manifest.update(filename, step_hash, current, {'keywordId': kwd_id})
             logger.debug("Creation/Match id: " + kwd_id)
 
+manifest.update(filename, source_hash)
+manifest.save()
+
 logger.info(f"{str(count_created)} Keywords imported.")
 if count_reused > 0:
     logger.info(f"{str(count_reused)} more Keywords not imported since they existed already.")
+if count_skipped > 0:
+    logger.info(f"{str(count_skipped)} Keywords skipped since they are unchanged since the last import.")
 
 if config.BEHAVE["cleanup"]:
     os.remove(outFile)
@@ -5,17 +5,21 @@ import argparse
 
 import config
 import utils.logger_utils as logger_utils
+import utils.manifest_utils as manifest_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.terminal_utils import ProgressIndicator
 
 # Parse command line
 parser = argparse.ArgumentParser(description="Import test cases from BDT/Behave.")
 parser.add_argument('source', nargs=1, help='name of file or folder to be scanned')
 parser.add_argument('-t', '--type', choices=['text', 'keyword'], help='type of test steps to be created')
+manifest_utils.add_manifest_args(parser)
 plist = tbcs_utils.handle_default_args(config.ACCOUNT, parser)
 
 # Configure logging
 logger = logger_utils.get_logger('import BDT', config.LOGLEVEL)
+tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-import-tc-bdt")
 
 if plist.type == "keyword":
     use_KDT = True
@@ -29,7 +33,8 @@ call = ["behave", "-d", "-f"
         "json.pretty", "-o", outFile]
 call.append(filename)
 try:
-    res = subprocess.run(call)
+    with tracing_utils.get_tracer().span("parse", {'tbcs.file': filename}):
+        res = subprocess.run(call)
 except:
     logger.error("Calling 'Behave' failed - is it set up correctly? Terminating ...")
     exit()
@@ -45,6 +50,9 @@ pid = tbcs_utils.ask_for_product(logger, tbcs)
 if (pid == ""):
     exit()
 
+manifest_file = getattr(config, "IMPORT_MANIFEST", ".tbcs_import_manifest.json")
+manifest = manifest_utils.get_manifest(logger, manifest_file, config.ACCOUNT, pid, "import_tc_bdt", plist.full)
+
 # check for CF "Test Tool"
 cfId = -1
 try:
@@ -57,9 +65,7 @@ except:
 with open(outFile, 'r') as file:
     obj = json.load(file)
 
-count_created = 0
-
-for feature in obj:
+def import_user_story(feature_file: str, feature: dict) -> str:
     usName = feature["name"]
     if "description" in feature:
         usDescription = feature["description"]
@@ -68,7 +74,9 @@ for feature in obj:
 
     usJson = {"name": usName}
     logger.info("Adding User Story (Feature): " + usName)
-    usId = tbcs.post_user_story(pid, usJson)
+    usId = manifest.get_ids(feature_file).get('userStoryId', '')
+    if usId == '':
+        usId = tbcs.post_user_story(pid, usJson)
     usDescText = ""
     for txt in usDescription:
         if usDescText != "":
@@ -78,74 +86,120 @@ for feature in obj:
     usJson['description'] = usDescText
 
     tbcs.patch_user_story(pid, usId, usJson)
+    return usId
+
+
+def import_scenario(usId: str, feature_file: str, scenario: dict, scenario_hash: str) -> str:
+    description = scenario['name']
+    tcJson = {
+        "name": description,
+        "testCaseType": "StructuredTestCase",
+        "userStoryId": usId,
+        "customTestSequenceTitles": ['Given', 'When', 'Then']
+    }
+    test_case_id = tbcs.post_test_case(pid, tcJson)
+
+    step_List: dict = tbcs_utils.get_sections(logger, tbcs, pid, test_case_id)
+
+    tcJson = {}
+    if cfId >= 0:
+        tcJson["customFields"] = [{"customFieldId": cfId, "value": "Behave"}]
+    tcJson['toBeReviewed'] = True
+    tcJson['isAutomated'] = True
+    tbcs.patch_test_case(pid, test_case_id, tcJson)
+
+    # the steps of one scenario are appended to their sections, so they are added one after the other
+    for steps in scenario["steps"]:
+        dest_block = step_List['Given']  # ID of section for GIVEN
+        if steps["step_type"] == "when":
+            dest_block = step_List['When']  # ID of section for WHEN
+        if steps["step_type"] == "then":
+            dest_block = step_List['Then']  # ID of section for THEN
+
+        if use_KDT:
+            parlist = []
+            for par in steps['match']['arguments']:
+                parlist.append({"name": par['name']})
+
+            keywordId = tbcs_utils.get_or_create_kwd(logger, tbcs, pid, {
+                "name": steps["name"],
+                "description": "from BDT",
+                "parlist": parlist
+            })['id']
+
+            test_step_Id = tbcs.add_test_step(pid,
+                                              test_case_id,
+                                              steps["name"],
+                                              dest_block,
+                                              "Keyword",
+                                              kwdId=keywordId)
+            kwd = tbcs.get_keyword(pid, keywordId)
+            for par in steps['match']['arguments']:
+                kwdId = ""
+                for kwdPars in kwd['parameters']:
+                    if kwdPars['name'] == par['name']:
+                        kwdId = kwdPars['id']
+                        continue
+                if kwdId != "":
+                    tbcs.update_kwd_par_value(pid, test_case_id, test_step_Id, kwdId, par['value'])
+
+        else:
+            tbcs.add_test_step(pid, test_case_id, steps["name"], dest_block)
+
+    manifest.update(feature_file, scenario_hash, description, {'testCaseId': test_case_id})
+    logger.debug("Adding Test Case (Scenario): " + description)
+    return test_case_id
+
+
+def complete_feature(usId: str, feature_file: str, feature_hash: str) -> None:
+    manifest.update(feature_file, feature_hash, ids={'userStoryId': usId})
+
+
+# Features and their scenarios are uploaded concurrently; a scenario waits for its User Story only
+executor = tbcs_utils.ImportExecutor(logger, getattr(config, "IMPORT_WORKERS", 4))
+scenario_tasks = []
 
-    progress_bar = ProgressIndicator(len(feature['elements']), usName + ' - Importing', 'scenarios', 50)
-
-    for scenario in feature['elements']:
+for feature in obj:
+    feature_file = feature["location"].rsplit(":", 1)[0]
+    feature_hash = manifest_utils.hash_content({'feature': feature, 'kdt': use_KDT})
+    if manifest.is_unchanged(feature_file, feature_hash):
+        logger.info(f"Feature file '{feature_file}' is unchanged since the last import. Skipping ...")
+        continue
 
-        progress_bar.update_progress()
+    us_task = executor.submit(f"User Story '{feature['name']}'", import_user_story, feature_file, feature)
 
+    feature_tasks = []
+    for scenario in feature['elements']:
         description = scenario['name']
-        tcJson = {
-            "name": description,
-            "testCaseType": "StructuredTestCase",
-            "userStoryId": usId,
-            "customTestSequenceTitles": ['Given', 'When', 'Then']
-        }
-        test_case_id = tbcs.post_test_case(pid, tcJson)
-
-        step_List: dict = tbcs_utils.get_sections(logger, tbcs, pid, test_case_id)
-
-        count_created = count_created + 1
-
-        tcJson = {}
-        if cfId >= 0:
-            tcJson["customFields"] = [{"customFieldId": cfId, "value": "Behave"}]
-        tcJson['toBeReviewed'] = True
-        tcJson['isAutomated'] = True
-        tbcs.patch_test_case(pid, test_case_id, tcJson)
-
-        for steps in scenario["steps"]:
-            dest_block = step_List['Given']  # ID of section for GIVEN
-            if steps["step_type"] == "when":
-                dest_block = step_List['When']  # ID of section for WHEN
-            if steps["step_type"] == "then":
-                dest_block = step_List['Then']  # ID of section for THEN
-
-            if use_KDT:
-                parlist = []
-                for par in steps['match']['arguments']:
-                    parlist.append({"name": par['name']})
-
-                keywordId = tbcs_utils.get_or_create_kwd(logger, tbcs, pid, {
-                    "name": steps["name"],
-                    "description": "from BDT",
-                    "parlist": parlist
-                })['id']
-
-                test_step_Id = tbcs.add_test_step(pid,
-                                                  test_case_id,
-                                                  steps["name"],
-                                                  dest_block,
-                                                  "Keyword",
-                                                  kwdId=keywordId)
-                kwd = tbcs.get_keyword(pid, keywordId)
-                for par in steps['match']['arguments']:
-                    kwdId = ""
-                    for kwdPars in kwd['parameters']:
-                        if kwdPars['name'] == par['name']:
-                            kwdId = kwdPars['id']
-                            continue
-                    if kwdId != "":
-                        tbcs.update_kwd_par_value(pid, test_case_id, test_step_Id, kwdId, par['value'])
-
-            else:
-                tbcs.add_test_step(pid, test_case_id, steps["name"], dest_block)
-
-        logger.debug("Adding Test Case (Scenario): " + description)
-    print()
+        scenario_hash = manifest_utils.hash_content({'scenario': scenario, 'kdt': use_KDT})
+        if manifest.is_unchanged(feature_file, scenario_hash, description):
+            logger.debug("Scenario is unchanged since the last import: " + description)
+            continue
+
+        feature_tasks.append(
+            executor.submit(f"Test Case '{description}'", import_scenario, us_task, feature_file, scenario,
+                            scenario_hash))
+
+    executor.submit(f"Feature file '{feature_file}'", complete_feature, us_task, feature_file, feature_hash,
+                    depends_on=feature_tasks)
+    scenario_tasks.extend(feature_tasks)
+
+progress_bar = ProgressIndicator(len(scenario_tasks), 'Importing', 'scenarios', 50)
+for task in scenario_tasks:
+    task.future.exception()
+    progress_bar.update_progress(task.name)
+
+failed_tasks = executor.wait()
+executor.shutdown()
+manifest.save()
+count_created = len([task for task in scenario_tasks if not task.failed()])
+print()
 
 print("\n" + str(count_created) + " Test Cases have been imported.\n")
 
 if config.BEHAVE["cleanup"]:
     os.remove(outFile)
+
+if failed_tasks:
+    logger.error(f"{len(failed_tasks)} upload(s) failed or were skipped, see log for details.")
+    exit(1)
@@ -2,25 +2,32 @@ import argparse
 import ast
 import os
 import re
-from typing import Dict, Union
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Union
 
 from robot.api import get_model
 
 import config
+import utils.comparison_utils as comparison_utils
 import utils.logger_utils as logger_utils
+import utils.manifest_utils as manifest_utils
 import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
 from utils.terminal_utils import ProgressIndicator
 
 
 class TestSuiteParser(ast.NodeVisitor):
 
-    test_cases = []
-    keywords = []
-    test_setup = []
-    test_teardown = []
-    tc_counter = -1
-    kwd_counter = -1
-    test_case = True
+    def __init__(self):
+        # State is kept per instance, so parsing one file never leaks into the next
+        self.test_cases = []
+        self.keywords = []
+        self.test_setup = []
+        self.test_teardown = []
+        self.tc_counter = -1
+        self.kwd_counter = -1
+        self.test_case = True
 
     def visit_TestCaseName(self, node):
         self.test_cases.append({'TestCaseName': node.name, 'TestSteps': [], 'Tags': [], 'Description': []})
@@ -55,6 +62,8 @@ class TestSuiteParser(ast.NodeVisitor):
         self.test_teardown.append(node.name + '    ' + args)
 
     def visit_Tags(self, node):
+        if not self.test_case or self.tc_counter < 0:
+            return
         for value in node.values:
             if value[0:3] == 'ID:':
                 self.test_cases[self.tc_counter]['Tags'].append(value[3:])
@@ -66,44 +75,147 @@ class TestSuiteParser(ast.NodeVisitor):
 
     def visit_Documentation(self, node):
         if self.test_case:
-            self.test_cases[self.tc_counter]['Description'].append(node.value)
+            # Suite documentation (settings section) does not belong to any Test Case
+            if self.tc_counter >= 0:
+                self.test_cases[self.tc_counter]['Description'].append(node.value)
         else:
             self.keywords[self.kwd_counter]['Description'].append(node.value)
 
 
-def add_test_steps(test_block_steps, test_block_id, keyword_ids):
-    if test_block_steps:
-        for count, test_step in enumerate(test_block_steps):
-            if config.TEST_STEP_TYPE == "Keyword":
-                test_step_id = tbcs.add_test_step(product_id, test_case_id, test_step, test_block_id, "keyword", count,
-                                                  keyword_ids[count]['id'])
-
-                for parameter in keyword_ids[count]['par_list']:
-                    tbcs.update_kwd_par_value(product_id, test_case_id, test_step_id, parameter['id'],
-                                              parameter['value'])
-            else:
-                tbcs.add_test_step(product_id, test_case_id, test_step, test_block_id, "TestStep", count)
+def can_update_test_step(tbcs_test_step, keyword_id):
+    # An existing Test Step can be updated in place if it is of the same kind (and calls the same Keyword)
+    if config.TEST_STEP_TYPE == "Keyword":
+        return tbcs_test_step['testStepType'] == "Keyword" and str(tbcs_test_step['keywordId']) == str(keyword_id)
 
+    return tbcs_test_step['testStepType'] == "TestStep"
 
-def check_for_update(robot_test_block, tbcs_test_case_item, tbcs_test_block, test_block_name):
-    test_case_id = str(tbcs_test_case_item['id'])
 
+def sync_test_step_block(robot_test_block, test_case_id, tbcs_test_block, test_block_name, robot_suite):
+    # Apply the minimal set of insert, update and delete operations to turn the Test Step Block
+    # in TestBench CS into the block read from the robot file. Returns True if anything changed.
     if not tbcs_test_block:
-        tbcs.add_test_step_block(product_id, test_case_id, test_block_name, -1)
-        return True
-
-    if len(robot_test_block) != len(tbcs_test_block['steps']):
-        return True
-
-    for count, item1 in enumerate(robot_test_block):
-        item2 = tbcs_test_block['steps'][count]
-        if item1 != item2['description']:
-            return True
-
-    return False
-
+        tbcs_test_block = {'id': tbcs.add_test_step_block(product_id, test_case_id, test_block_name, -1), 'steps': []}
+
+    test_block_id = str(tbcs_test_block['id'])
+    tbcs_test_steps = tbcs_test_block.get('steps') or []
+
+    opcodes = comparison_utils.get_sequence_diff([step['description'] for step in tbcs_test_steps],
+                                                 robot_test_block)
+    if all(opcode[0] == 'equal' for opcode in opcodes):
+        return False
+
+    # Keywords are only resolved for those steps which are (re-)written
+    changed_steps = [j for tag, _, _, j1, j2 in opcodes if tag != 'equal' for j in range(j1, j2)]
+    keyword_ids = {}
+    if config.TEST_STEP_TYPE == "Keyword":
+        keyword_ids = dict(zip(changed_steps,
+                               create_and_update_keywords([robot_test_block[j] for j in changed_steps], robot_suite)))
+
+    deletions = []
+    updates = []
+    insertions = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            continue
 
-def create_and_update_keywords(test_step_block):
+        # Pair replaced steps one by one, everything left over is deleted or inserted
+        for offset in range(max(i2 - i1, j2 - j1)):
+            i, j = i1 + offset, j1 + offset
+            if i < i2 and j < j2 and can_update_test_step(tbcs_test_steps[i], keyword_ids.get(j, {}).get('id')):
+                updates.append((i, j))
+                continue
+            if i < i2:
+                deletions.append(i)
+            if j < j2:
+                insertions.append(j)
+
+    logger.debug(f"Syncing Test Step Block '{test_block_name}': {len(insertions)} insert(s), "
+                 f"{len(updates)} update(s), {len(deletions)} delete(s)")
+
+    for i in deletions:
+        tbcs.remove_test_step(product_id, test_case_id, str(tbcs_test_steps[i]['id']))
+
+    for i, j in updates:
+        test_step_id = str(tbcs_test_steps[i]['id'])
+        tbcs.patch_test_step(product_id, test_case_id, test_step_id, robot_test_block[j])
+
+        if config.TEST_STEP_TYPE == "Keyword":
+            # Only upsert those parameter values which differ from the previous step; parameters the step no
+            # longer passes (e.g. "Kw  a  b" became "Kw  a") are cleared
+            par_list = keyword_ids[j]['par_list']
+            old_values = re.split(r"\s{2,}", tbcs_test_steps[i]['description'])[1:]
+            old_values += [""] * (len(par_list) - len(old_values))
+            values = keyword_ids[j]['values'] + [""] * (len(par_list) - len(keyword_ids[j]['values']))
+            for parameter, old_value, value in zip(par_list, old_values, values):
+                if old_value != value:
+                    tbcs.update_kwd_par_value(product_id, test_case_id, test_step_id, parameter['id'], value)
+
+    # Insert in ascending target order, so each position refers to the already synced part of the block
+    for j in insertions:
+        if config.TEST_STEP_TYPE == "Keyword":
+            test_step_id = tbcs.add_test_step(product_id, test_case_id, robot_test_block[j], test_block_id,
+                                              "keyword", j, keyword_ids[j]['id'])
+
+            # A new step has no values yet, so only the parameters it passes are set
+            for parameter, value in zip(keyword_ids[j]['par_list'], keyword_ids[j]['values']):
+                tbcs.update_kwd_par_value(product_id, test_case_id, test_step_id, parameter['id'], value)
+        else:
+            tbcs.add_test_step(product_id, test_case_id, robot_test_block[j], test_block_id, "TestStep", j)
+
+    return True
+
+
+def parse_robot_file(file):
+    # Parse a single robot file and return only what the upload stage needs.
+    # Runs in a worker process, so the result has to be picklable (and should be small).
+    start_time = time.time()
+    robot_parser = TestSuiteParser()
+    robot_parser.visit(get_model(file))
+
+    keyword_descriptions = {}
+    for keyword in robot_parser.keywords:
+        if keyword['Description']:
+            keyword_descriptions[keyword['KeywordName']] = keyword['Description'][0][:3998]
+
+    return {
+        'file': file,
+        'test_cases': robot_parser.test_cases,
+        'test_setup': robot_parser.test_setup,
+        'test_teardown': robot_parser.test_teardown,
+        'keyword_descriptions': keyword_descriptions,
+        'parse_time': (start_time, time.time()),
+    }
+
+
+def trace_parse(robot_suite):
+    # Parsing is traced here, as the worker processes are not traced
+    tracing_utils.add_span("parse", *robot_suite['parse_time'], {'tbcs.file': robot_suite['file']})
+    return robot_suite
+
+
+def parse_robot_files(files: List[str], jobs: int) -> Iterator[Tuple[str, Union[dict, None]]]:
+    # Parsing stage: parse all files in a process pool and yield (file, result) in the order of the given files,
+    # so the upload stage can already start while later files are still being parsed. Result is None on errors.
+    if jobs <= 1 or len(files) <= 1:
+        for file in files:
+            try:
+                yield file, trace_parse(parse_robot_file(file))
+            except Exception as e:
+                logger.error(f"Failed to parse robot file '{file}'\n\t{e.__str__()}")
+                yield file, None
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(parse_robot_file, file) for file in files]
+        for file, future in zip(files, futures):
+            try:
+                yield file, trace_parse(future.result())
+            except Exception as e:
+                logger.error(f"Failed to parse robot file '{file}'\n\t{e.__str__()}")
+                yield file, None
+
+
+def create_and_update_keywords(test_step_block, robot_suite):
     test_step_ids = []
     for test_step in test_step_block:
         parameters = re.split(r"\s{2,}", test_step)
@@ -119,9 +231,8 @@ def create_and_update_keywords(test_step_block):
             'description': "",
         }
 
-        for keyword in robotParser.keywords:
-            if keyword_name == keyword['KeywordName']:
-                keyword_params['description'] = keyword['Description'][0][:3998]
+        if keyword_name in robot_suite['keyword_descriptions']:
+            keyword_params['description'] = robot_suite['keyword_descriptions'][keyword_name]
 
         keyword_ids = tbcs_utils.get_or_create_kwd(
             logger,
@@ -130,14 +241,13 @@ def create_and_update_keywords(test_step_block):
             keyword_params,
         )
 
-        # Update parameter values
-        for count, parameter in enumerate(parameters):
-            keyword_ids['par_list'][count]['value'] = parameter
+        # Values of the parameters the step passes, in the order of 'par_list'
+        keyword_ids['values'] = parameters
 
         # After creation, update Keyword with those details we cannot provide while creating
         keyword_params = {}
 
-        keyword_params["library"] = "resource:" + os.path.basename(file)
+        keyword_params["library"] = "resource:" + os.path.basename(robot_suite['file'])
         keyword_params["isImplemented"] = True
 
         tbcs.update_keyword(product_id, keyword_ids['id'], keyword_params)
@@ -146,6 +256,78 @@ def create_and_update_keywords(test_step_block):
     return test_step_ids
 
 
+def import_test_case(robot_suite, test_case, test_case_hash):
+    # Create or update a single Test Case (runs as a task of the ImportExecutor, concurrently to other Test Cases)
+    test_case_name = test_case['TestCaseName']
+
+    logger.info(f"Check Test Case '{test_case_name}'")
+    tbcs_test_case = tbcs.get_test_case_by_filter(product_id, 'title', 'equals', test_case_name)
+
+    if not tbcs_test_case:  # Test Case doesn't exist
+        logger.info(f"Test Case '{test_case_name}' doesn't exist")
+        test_case_id = tbcs.post_test_case(product_id, {
+            'name': test_case_name,
+            'testCaseType': 'StructuredTestCase',
+            "customTestSequenceTitles": []
+        })
+
+        test_block_setup = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Setup"), 'steps': []}
+        test_block_test_steps = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Test Steps"), 'steps': []}
+        test_block_teardown = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Teardown"), 'steps': []}
+
+    else:
+        logger.info(f"Test Case '{test_case_name}' already exists")
+        if len(tbcs_test_case) > 1:  # Found more than 1 Test Case
+            logger.warning(
+                "2 or more Test Cases share the same name in TestBench CS. Updates only the first one found.")
+
+        test_case_id = str(tbcs_test_case[0]['id'])
+        tbcs_test_case_item = tbcs.get_test_case(product_id, test_case_id)
+
+        test_block_setup = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Setup")
+        test_block_test_steps = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Test Steps")
+        test_block_teardown = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Teardown")
+
+    # Sync Test Step Blocks: only the differing steps are inserted, updated or deleted
+    updated = sync_test_step_block(robot_suite['test_setup'], test_case_id, test_block_setup, "Setup", robot_suite)
+    updated = sync_test_step_block(test_case['TestSteps'], test_case_id, test_block_test_steps, "Test Steps",
+                                   robot_suite) or updated
+    updated = sync_test_step_block(robot_suite['test_teardown'], test_case_id, test_block_teardown, "Teardown",
+                                   robot_suite) or updated
+
+    if updated:
+        logger.info(f"Test Case '{test_case_name}' has been updated")
+    else:
+        logger.info(f"Test Case '{test_case_name}' doesn't need an update")
+
+    # Patch TBCS Test Case
+    patchBody: Dict[str, Union[bool, dict, list]] = {
+        "isAutomated": True,
+        "toBeReviewed": True,
+    }
+
+    if test_case['Tags']:
+        patchBody['externalId'] = {"value": test_case['Tags'][0]}
+        logger.info("Updating external ID in TBCS")
+
+    # Update description
+    if test_case['Description']:
+        patchBody['description'] = {"text": test_case['Description'][0]}
+        logger.info("Updating description in TBCS")
+
+    # Set Test Tool custom field
+    if custom_field:
+        patchBody['customFields'] = [{
+            "customFieldId": custom_field[config.ADAPTER_CUSTOM_FIELD_NAME.upper()],
+            "value": "RobotFramework"
+        }]
+
+    tbcs.patch_test_case(product_id, test_case_id, patchBody)
+    manifest.update(robot_suite['file'], test_case_hash, test_case_name, {'testCaseId': str(test_case_id)})
+
+    return test_case_id
+
+
 if __name__ == "__main__":
     # Configure logging
     logger = logger_utils.get_logger("Import_tc_rf", config.LOGLEVEL)
@@ -161,8 +343,15 @@ if __name__ == "__main__":
                             nargs="+",
                             default=[''],
                             help='name of one or more Test Cases to be imported')
+    argsParser.add_argument('-j',
+                            '--jobs',
+                            type=int,
+                            default=os.cpu_count() or 1,
+                            help='number of processes used for parsing robot files (default: number of CPUs)')
+    manifest_utils.add_manifest_args(argsParser)
 
     plist = tbcs_utils.handle_default_args(config.ACCOUNT, argsParser)
+    tracing_utils.configure(logger, getattr(config, "TRACING_EXPORTER", ""), "tbcs-import-tc-rf")
 
     files = tbcs_utils.get_files(logger, plist.source)
     if len(files) == 0:
@@ -189,143 +378,92 @@ if __name__ == "__main__":
         "BeforeAutomation",
     )
 
-    progress_bar_files = ProgressIndicator(len(files), 'Scanning', 'Files')
+    manifest_file = getattr(config, "IMPORT_MANIFEST", ".tbcs_import_manifest.json")
+    manifest = manifest_utils.get_manifest(logger, manifest_file, config.ACCOUNT, product_id, "import_tc_rf",
+                                           plist.full)
 
+    # Only files changed since the last import need to be parsed at all
+    file_hashes = {}
     for file in files:
         if not file.endswith(".robot"):
             continue
 
+        file_hash = manifest_utils.hash_file(file)
+        if manifest.is_unchanged(file, file_hash):
+            logger.info(f"Robot file '{file}' is unchanged since the last import. Skipping ...")
+            continue
+
+        file_hashes[file] = file_hash
+
+    progress_bar_files = ProgressIndicator(len(file_hashes), 'Scanning', 'Files')
+
+    executor = tbcs_utils.ImportExecutor(logger, getattr(config, "IMPORT_WORKERS", 4))
+    # Test Cases are matched by title: Test Cases of the same name (in different files) are imported one after the
+    # other, so the first one creates the Test Case in TestBench CS and the next ones update it (each one is imported,
+    # even if an earlier one failed)
+    last_test_case_task: Dict[str, tbcs_utils.ImportTask] = {}
+
+    # Upload stage: consumes the results of the parsing stage file by file
+    for file, robot_suite in parse_robot_files(list(file_hashes), plist.jobs):
+        if robot_suite is None:
+            progress_bar_files.update_progress(file)
+            continue
+
         logger.info(f"Visit the following robot file: {file}")
-        # Parse Test Suite and retrieve information
-        model = get_model(file)
-        robotParser = TestSuiteParser()
-        robotParser.visit(model)
-        logger.info(f"Test Setup: {robotParser.test_setup}")
-        logger.info(f"Test Teardown: {robotParser.test_teardown}")
+        logger.info(f"Test Setup: {robot_suite['test_setup']}")
+        logger.info(f"Test Teardown: {robot_suite['test_teardown']}")
 
         if plist.testcase != ['']:
             progress_bar_tests = ProgressIndicator(len(plist.testcase), 'Scanning', 'Test Cases')
         else:
-            progress_bar_tests = ProgressIndicator(len(robotParser.test_cases), 'Scanning', 'Test Cases')
+            progress_bar_tests = ProgressIndicator(len(robot_suite['test_cases']), 'Scanning', 'Test Cases')
 
-        for test_case in robotParser.test_cases:
+        test_case_tasks = []
+        for test_case in robot_suite['test_cases']:
             test_case_name = test_case['TestCaseName']
             if plist.testcase != None and plist.testcase != ['']:
                 if not test_case_name in plist.testcase:
                     logger.debug(f"Skipped Test Case: {test_case_name}")
                     continue
 
-            logger.info(f"Check Test Case '{test_case_name}'")
-            tbcs_test_case = tbcs.get_test_case_by_filter(product_id, 'title', 'equals', test_case_name)
-
-            needs_update = {'Setup': True, 'TestSteps': True, 'Teardown': True}
-
-            if not tbcs_test_case:  # Test Case doesn't exist
-                logger.info(f"Test Case '{test_case_name}' doesn't exist")
-                test_case_id = tbcs.post_test_case(product_id, {
-                    'name': test_case_name,
-                    'testCaseType': 'StructuredTestCase',
-                    "customTestSequenceTitles": []
-                })
-
-                test_block_setup = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Setup")}
-                test_block_test_steps = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Test Steps")}
-                test_block_teardown = {'id': tbcs.add_test_step_block(product_id, test_case_id, "Teardown")}
-
-                tbcs_test_case_item = tbcs.get_test_case(product_id, test_case_id)
-
-            else:
-                logger.info(f"Test Case '{test_case_name}' already exists")
-                if len(tbcs_test_case) > 1:  # Found more than 1 Test Case
-                    logger.warning(
-                        "2 or more Test Cases share the same name in TestBench CS. Updates only the first one found.")
-
-                test_case_id = str(tbcs_test_case[0]['id'])
-                tbcs_test_case_item = tbcs.get_test_case(product_id, test_case_id)
-
-                test_block_setup = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Setup")
-                test_block_test_steps = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Test Steps")
-                test_block_teardown = tbcs_utils.get_test_step_block(logger, tbcs, tbcs_test_case_item, "Teardown")
-
-                # Check if Test Case needs update
-                needs_update['Setup'] = check_for_update(robotParser.test_setup, tbcs_test_case_item, test_block_setup,
-                                                         "Setup")
-
-                needs_update['TestSteps'] = check_for_update(test_case['TestSteps'], tbcs_test_case_item,
-                                                             test_block_test_steps, "Test Steps")
-
-                needs_update['Teardown'] = check_for_update(robotParser.test_teardown, tbcs_test_case_item,
-                                                            test_block_teardown, "Teardown")
-
-            # Update Test Step Blocks
-            if needs_update['Setup'] or needs_update['TestSteps'] or needs_update['Teardown']:
-                logger.info(f"Test Case '{test_case_name}' needs an update")
-            else:
-                logger.info(f"Test Case '{test_case_name}' doesn't need an update")
-
-            if needs_update['Setup']:
-                if test_block_setup:
-                    tbcs.remove_test_step_block(product_id, test_case_id, str(test_block_setup['id']))
-
-                test_block_id = tbcs.add_test_step_block(product_id, test_case_id, "Setup", -1)
-
-                if config.TEST_STEP_TYPE == "Keyword":
-                    setup_keyword_ids = create_and_update_keywords(robotParser.test_setup)
-                else:
-                    setup_keyword_ids = []
-
-                add_test_steps(robotParser.test_setup, test_block_id, setup_keyword_ids)
-
-            if needs_update['TestSteps']:
-                if test_block_test_steps:
-                    tbcs.remove_test_step_block(product_id, test_case_id, str(test_block_test_steps['id']))
-
-                test_block_id = tbcs.add_test_step_block(product_id, test_case_id, "Test Steps", -1)
-
-                if config.TEST_STEP_TYPE == "Keyword":
-                    test_steps_keyword_ids = create_and_update_keywords(test_case['TestSteps'])
-
-                else:
-                    test_steps_keyword_ids = []
-
-                add_test_steps(test_case['TestSteps'], test_block_id, test_steps_keyword_ids)
-
-            if needs_update['Teardown']:
-                if test_block_teardown:
-                    tbcs.remove_test_step_block(product_id, test_case_id, str(test_block_teardown['id']))
-
-                test_block_id = tbcs.add_test_step_block(product_id, test_case_id, "Teardown", -1)
-
-                if config.TEST_STEP_TYPE == "Keyword":
-                    teardown_keyword_ids = create_and_update_keywords(robotParser.test_teardown)
-                else:
-                    teardown_keyword_ids = []
-
-                add_test_steps(robotParser.test_teardown, test_block_id, teardown_keyword_ids)
-
-            # Patch TBCS Test Case
-            patchBody: Dict[str, Union[bool, dict, list]] = {
-                "isAutomated": True,
-                "toBeReviewed": True,
-            }
-
-            if test_case['Tags']:
-                patchBody['externalId'] = {"value": test_case['Tags'][0]}
-                logger.info("Updating external ID in TBCS")
+            test_case_hash = manifest_utils.hash_content({
+                'test_case': test_case,
+                'setup': robot_suite['test_setup'],
+                'teardown': robot_suite['test_teardown'],
+                'step_type': config.TEST_STEP_TYPE,
+            })
+            if manifest.is_unchanged(file, test_case_hash, test_case_name):
+                logger.info(f"Test Case '{test_case_name}' is unchanged since the last import. Skipping ...")
+                progress_bar_tests.update_progress(test_case_name)
+                continue
+
+            previous_task = last_test_case_task.get(test_case_name)
+            last_test_case_task[test_case_name] = executor.submit(f"Test Case '{test_case_name}'",
+                                                                  import_test_case,
+                                                                  robot_suite,
+                                                                  test_case,
+                                                                  test_case_hash,
+                                                                  after=[previous_task] if previous_task else None)
+            test_case_tasks.append(last_test_case_task[test_case_name])
+            progress_bar_tests.update_progress(test_case_name)
 
-            # Update description
-            if test_case['Description']:
-                patchBody['description'] = {"text": test_case['Description'][0]}
-                logger.info("Updating description in TBCS")
+        # The file is only complete if no Test Case filter was given and all of its Test Cases were imported
+        if plist.testcase == ['']:
+            executor.submit(f"Robot file '{file}'",
+                            manifest.update,
+                            file,
+                            file_hashes[file],
+                            depends_on=test_case_tasks)
 
-            # Set Test Tool custom field
-            if custom_field:
-                patchBody['customFields'] = [{
-                    "customFieldId": custom_field[config.ADAPTER_CUSTOM_FIELD_NAME.upper()],
-                    "value": "RobotFramework"
-                }]
+        progress_bar_files.update_progress(file)
 
-            tbcs.patch_test_case(product_id, test_case_id, patchBody)
-            progress_bar_tests.update_progress(test_case_name)
+    failed_tasks = executor.wait()
+    executor.shutdown()
+    manifest.save()
+    ProgressIndicator.clear_indicators()
 
-        progress_bar_files.update_progress(file)
+    if failed_tasks:
+        logger.error(f"{len(failed_tasks)} import task(s) failed or were skipped:")
+        for task in failed_tasks:
+            logger.error(f"  {task.name}: {task.future.exception()}")
+        exit(1)
@@ -0,0 +1,83 @@
+import unittest
+
+from utils.cypress_utils import scan_spec
+
+# Braces and slashes in regular expression literals must not change the nesting of describe() and it()
+SPEC_WITH_REGEX = """describe('Login', () => {
+  it('finds a brace', () => {
+    TBCS_AUTID('CY-1')
+    cy.contains(/}/)
+    const found = /\\{/.test(text)
+    const patterns = [/[/}]+/g, width / 2 / scale]
+    cy.log('Check the page')
+  })
+  it('logs out', () => {
+    cy.log('Log out')
+  })
+})
+"""
+
+# The context of describe() and it() starts at the body of the callback, not at an options object
+SPEC_WITH_OPTIONS = """describe('A', { retries: 2 }, () => {
+  it('b', { retries: 1 }, () => {
+    TBCS_AUTID('X1')
+    cy.log('Step 1')
+  })
+  it('c', function () {
+    cy.log('Step 2')
+  })
+})
+"""
+
+# A regular expression after "return" (or another keyword) is no division
+SPEC_WITH_RETURN_REGEX = """describe('A', () => {
+  it('b', () => {
+    const check = (y) => { return /}/.test(y) }
+    TBCS_AUTID('X2')
+    cy.log('Step 1')
+  })
+  it('c', () => {
+    cy.log('Step 2')
+  })
+})
+"""
+
+
+class ScanSpecTest(unittest.TestCase):
+
+    def test_regex_literals(self):
+        result = scan_spec(SPEC_WITH_REGEX)
+
+        self.assertEqual(result['story'], "Login")
+        self.assertEqual([test_case['name'] for test_case in result['test_cases']],
+                         ["Login finds a brace", "Login logs out"])
+        self.assertEqual(result['test_cases'][0]['external_id'], "CY-1")
+        self.assertEqual(result['test_cases'][0]['steps'], ["Check the page"])
+        self.assertEqual(result['test_cases'][1]['steps'], ["Log out"])
+
+    def test_division_is_no_regex(self):
+        result = scan_spec("describe('Math', () => {\n  it('divides', () => {\n    const x = a / b + c / d\n" +
+                           "    cy.log('Step {1}')\n  })\n})\n")
+
+        self.assertEqual(result['test_cases'][0]['name'], "Math divides")
+        self.assertEqual(result['test_cases'][0]['steps'], ["Step {1}"])
+
+    def test_options_object(self):
+        result = scan_spec(SPEC_WITH_OPTIONS)
+
+        self.assertEqual([test_case['name'] for test_case in result['test_cases']], ["A b", "A c"])
+        self.assertEqual(result['test_cases'][0]['external_id'], "X1")
+        self.assertEqual(result['test_cases'][0]['steps'], ["Step 1"])
+        self.assertEqual(result['test_cases'][1]['steps'], ["Step 2"])
+
+    def test_regex_after_keyword(self):
+        result = scan_spec(SPEC_WITH_RETURN_REGEX)
+
+        self.assertEqual([test_case['name'] for test_case in result['test_cases']], ["A b", "A c"])
+        self.assertEqual(result['test_cases'][0]['external_id'], "X2")
+        self.assertEqual(result['test_cases'][0]['steps'], ["Step 1"])
+        self.assertEqual(result['test_cases'][1]['steps'], ["Step 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
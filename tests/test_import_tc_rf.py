@@ -0,0 +1,74 @@
+import logging
+import unittest
+
+from benchmarks.benchmark_utils import load_config
+
+# The importer reads the module "config" on import
+load_config({'TEST_STEP_TYPE': "Keyword"})
+
+import import_tc_rf  # noqa: E402
+
+ROBOT_SUITE = {'file': "suite.robot", 'keyword_descriptions': {}}
+
+
+class StubTbcs:
+    # Answers the requests of the importer with a Keyword "Kw" with two parameters and records the parameter values
+    # written to Test Steps
+
+    def __init__(self):
+        self.keyword_list = [{
+            'id': "kw",
+            'name': "Kw",
+            'description': "",
+            'originalText': "Kw",
+            'parameters': [{
+                'id': "p0",
+                'name': "param0",
+                'description': ""
+            }, {
+                'id': "p1",
+                'name': "param1",
+                'description': ""
+            }]
+        }]
+        self.values = []
+
+    def update_keyword(self, product_id, keyword_id, variables):
+        return keyword_id
+
+    def patch_test_step(self, product_id, test_case_id, test_step_id, description):
+        pass
+
+    def update_kwd_par_value(self, product_id, test_case_id, test_step_id, parameter_id, value):
+        self.values.append((test_case_id, test_step_id, parameter_id, value))
+        return value
+
+
+class KeywordStepTest(unittest.TestCase):
+
+    def setUp(self):
+        import_tc_rf.logger = logging.getLogger(__name__)
+        import_tc_rf.product_id = "1"
+        import_tc_rf.tbcs = self.tbcs = StubTbcs()
+
+    def test_test_cases_with_the_same_keyword(self):
+        # Test Cases are imported concurrently: the steps of one must not change the values of the other
+        first = import_tc_rf.create_and_update_keywords(["Kw    a    b"], ROBOT_SUITE)[0]
+        second = import_tc_rf.create_and_update_keywords(["Kw    x"], ROBOT_SUITE)[0]
+
+        self.assertEqual(first['values'], ["a", "b"])
+        self.assertEqual(second['values'], ["x"])
+        self.assertEqual(self.tbcs.keyword_list[0]['parameters'][0], {'id': "p0", 'name': "param0", 'description': ""})
+
+    def test_shortened_call(self):
+        # A parameter the step no longer passes is cleared, even if an earlier step passed a value for it
+        import_tc_rf.create_and_update_keywords(["Kw    a    b"], ROBOT_SUITE)
+        test_block = {'id': "block", 'steps': [{'id': "step", 'testStepType': "Keyword", 'keywordId': "kw",
+                                                 'description': "Kw    a    b"}]}
+
+        self.assertTrue(import_tc_rf.sync_test_step_block(["Kw    a"], "tc", test_block, "Test Steps", ROBOT_SUITE))
+        self.assertEqual(self.tbcs.values, [("tc", "step", "p1", "")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import logging
+import threading
+import unittest
+
+from benchmarks.benchmark_utils import load_config
+
+# tbcs_utils reads the module "config" on import
+load_config({})
+
+from utils.tbcs_utils import DependencyFailedError, ImportExecutor  # noqa: E402
+
+
+def fail():
+    raise ValueError("failed")
+
+
+class ImportExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ImportExecutor(logging.getLogger(__name__), 2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_after_orders_without_failure_propagation(self):
+        started = threading.Event()
+        order = []
+
+        def first():
+            started.wait(5)
+            order.append("first")
+            raise ValueError("failed")
+
+        first_task = self.executor.submit("first", first)
+        second_task = self.executor.submit("second", order.append, "second", after=[first_task])
+        started.set()
+        self.executor.wait()
+
+        self.assertTrue(first_task.failed())
+        self.assertFalse(second_task.failed())
+        self.assertEqual(order, ["first", "second"])
+
+    def test_depends_on_skips_after_failure(self):
+        first_task = self.executor.submit("first", fail)
+        second_task = self.executor.submit("second", print, depends_on=[first_task])
+
+        self.assertEqual(self.executor.wait(), [first_task, second_task])
+        self.assertIsInstance(second_task.future.exception(), DependencyFailedError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import logging
+import os
+import tempfile
+import unittest
+
+import utils.tracing_utils as tracing_utils
+
+
+class TraceContextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = tracing_utils.get_tracer()
+        self.spans = []
+        tracing_utils.add_span_listener(self.spans.append)
+
+    def tearDown(self):
+        tracing_utils._span_listeners.remove(self.spans.append)
+        tracing_utils._tracer = self.tracer
+
+    def test_listener_spans_stay_local(self):
+        tracing_utils.configure(logging.getLogger(__name__), "", "test")
+
+        with tracing_utils.get_tracer().span("phase"):
+            span = tracing_utils.start_child_span("tbcs.get_test_case")
+            self.assertIsNotNone(span)
+            self.assertEqual(tracing_utils.get_traceparent(span), "")
+            self.assertIsNone(tracing_utils.get_env())
+            span.end()
+
+        self.assertEqual([span.name for span in self.spans], ["tbcs.get_test_case", "phase"])
+
+    def test_exported_spans_propagate_context(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tracing_utils.configure(logging.getLogger(__name__), "file:" + os.path.join(directory, "spans.jsonl"),
+                                    "test")
+
+            with tracing_utils.get_tracer().span("phase") as span:
+                traceparent = tracing_utils.get_traceparent()
+                self.assertEqual(traceparent, span.context.to_traceparent())
+                self.assertEqual(tracing_utils.get_env()[tracing_utils.TRACEPARENT_ENV], traceparent)
+
+
+if __name__ == "__main__":
+    unittest.main()
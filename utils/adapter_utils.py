@@ -0,0 +1,153 @@
+import importlib
+import importlib.metadata
+import inspect
+from logging import Logger
+from typing import Dict, List, Type, Union
+
+import adapters
+from adapters.AdapterTemplate import AdapterTemplate
+
+# Entry point group of adapters installed as packages, e.g. in setup.cfg:
+#   [options.entry_points]
+#   tbcs_agent.adapters =
+#       MyTool = my_package.my_adapter:MyTool
+ENTRY_POINT_GROUP = "tbcs_agent.adapters"
+
+
+def _get_entry_points(group: str) -> list:
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, []))  # type: ignore  # Python < 3.10
+
+
+class AdapterRegistry:
+    """
+    Finds the adapters available to the agent and loads them on first use.
+
+    Adapters are the modules of the package "adapters" (class name = module name) and classes registered by installed
+    packages under the entry point group ENTRY_POINT_GROUP. Nothing is imported when the adapters are discovered. An
+    adapter is imported and validated when it is needed for the first time; the result (the class or the failure) is
+    cached, so each adapter is imported and validated only once.
+    """
+
+    def __init__(self, logger: Logger, entry_point_group: str = ENTRY_POINT_GROUP):
+        """
+        Initializes the registry and discovers the adapters.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger instance
+
+        entry_point_group: str
+            Entry point group of adapters installed as packages
+        """
+        self.__logger = logger
+        self.__sources: Dict[str, Union[str, importlib.metadata.EntryPoint]] = {}
+        self.__classes: Dict[str, Union[Type[AdapterTemplate], None]] = {}
+
+        for name in adapters.__all__:
+            if name != "AdapterTemplate":
+                self.__sources[name] = "adapters." + name
+
+        try:
+            entry_points = _get_entry_points(entry_point_group)
+        except Exception as e:
+            logger.warning(f"Reading entry points of group '{entry_point_group}' failed!\n\t{e.__str__()}")
+            entry_points = []
+        for entry_point in entry_points:
+            if entry_point.name in self.__sources:
+                logger.warning(f"Adapter '{entry_point.name}' of entry point '{entry_point.value}' is ignored, " +
+                               "an adapter with this name already exists")
+                continue
+            self.__sources[entry_point.name] = entry_point
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of all discovered adapters.
+        """
+        return list(self.__sources.keys())
+
+    def register(self, name: str, adapter_class: Type[AdapterTemplate]) -> None:
+        """
+        Registers an adapter class which is neither a module of the package "adapters" nor installed as entry point
+        (e.g. the dummy adapter of the benchmarks). An adapter with the same name is replaced.
+
+        Parameters
+        ----------
+        name: str
+            Name of the adapter
+
+        adapter_class: Type[AdapterTemplate]
+            Class of the adapter
+        """
+        self.__sources[name] = adapter_class.__module__
+        self.__classes[name] = adapter_class
+
+    def get(self, name: str) -> Union[Type[AdapterTemplate], None]:
+        """
+        Returns the class of an adapter, the adapter is imported and validated on first use.
+
+        Parameters
+        ----------
+        name: str
+            Name of the adapter
+
+        Returns
+        -------
+        Type[AdapterTemplate] | None
+            Class of the adapter; None if there is no such adapter or if it cannot be loaded
+        """
+        if name in self.__classes:
+            return self.__classes[name]
+        if name not in self.__sources:
+            return None
+
+        _class = None
+        source = self.__sources[name]
+        try:
+            if isinstance(source, str):
+                _class = getattr(importlib.import_module(source), name)
+            else:
+                _class = source.load()
+
+            if not inspect.isclass(_class) or not issubclass(_class, AdapterTemplate):
+                self.__logger.error(f"Adapter '{name}' is not derived from AdapterTemplate!")
+                _class = None
+            elif inspect.isabstract(_class):
+                self.__logger.error(f"Adapter '{name}' does not implement all methods of AdapterTemplate!")
+                _class = None
+        except Exception as e:
+            self.__logger.error(f"Loading adapter '{name}' failed!\n\t{e.__str__()}")
+            _class = None
+
+        self.__classes[name] = _class
+        return _class
+
+    def get_capabilities(self, name: str) -> dict:
+        """
+        Returns the capabilities of an adapter (see AdapterTemplate.capabilities).
+
+        Parameters
+        ----------
+        name: str
+            Name of the adapter
+
+        Returns
+        -------
+        dict
+            Capabilities of the adapter, see get_capabilities()
+        """
+        _class = self.get(name)
+        if _class == None:
+            return dict(AdapterTemplate.capabilities)
+        return get_capabilities(_class)
+
+
+def get_capabilities(adapter_class: Type[AdapterTemplate]) -> dict:
+    """
+    Returns the capabilities of an adapter class (see AdapterTemplate.capabilities), values not declared by the
+    adapter are the defaults of AdapterTemplate.
+    """
+    return dict(AdapterTemplate.capabilities, **adapter_class.capabilities)
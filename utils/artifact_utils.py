@@ -0,0 +1,245 @@
+import hashlib
+import os
+import shutil
+import tarfile
+import threading
+import zipfile
+from logging import Logger
+from tempfile import mkdtemp
+from typing import List, Set, Tuple, Union
+
+import requests
+
+import config
+import utils.logger_utils as logger_utils
+import utils.tbcs_utils as tbcs_utils
+import utils.tracing_utils as tracing_utils
+from utils.tbcs_api import TbcsApi
+
+# file extension of the archive for each compression
+_ARCHIVE_EXTENSIONS = {'zip': '.zip', 'zstd': '.tar.zst'}
+
+# Retries of an upload failing without a response of TestBench CS (connection errors): the staged copy is uploaded
+# again, which cannot attach a file twice as long as the server did not answer
+UPLOAD_RETRIES = 2
+
+
+class _HashingReader:
+    # Reads a file and updates a hash with the data read
+    def __init__(self, file, hash):
+        self.__file = file
+        self.__hash = hash
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.__file.read(size)
+        self.__hash.update(data)
+        return data
+
+
+class ArtifactUploader:
+    """
+    Uploads the result files (artifacts) of executions in the background.
+
+    The files of an execution are copied or packed into one archive at once, so adapters may delete or rewrite their
+    result files right after handing them over. Uploads run concurrently; an upload failing with a connection error is
+    retried (see UPLOAD_RETRIES), other failures are logged as errors and the file is not uploaded. Files or archives
+    whose content has already been uploaded to the same execution are skipped.
+    """
+
+    def __init__(self, logger: Logger, compression: str = '', max_workers: int = 2):
+        """
+        Initializes the uploader.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger instance
+
+        compression: str
+            "": upload each file as it is, "zip": one zip archive per upload, "zstd": one tar archive compressed with
+            Zstandard per upload (requires the package "zstandard", "zip" is used otherwise)
+
+        max_workers: int
+            Maximum number of uploads running at the same time
+        """
+        if compression == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                logger.warning('Package "zstandard" is not installed, result files are compressed with zip instead')
+                compression = 'zip'
+        elif compression not in ('', 'zip'):
+            logger.warning(f'Unknown compression "{compression}", result files are uploaded uncompressed')
+            compression = ''
+
+        self.__logger = logger
+        self.__compression = compression
+        self.__max_workers = max_workers
+        self.__lock = threading.Lock()
+        self.__executor: Union[tbcs_utils.ImportExecutor, None] = None
+        self.__staging_dir: Union[str, None] = None
+        self.__count = 0
+        self.__uploaded: Set[Tuple[str, str, str, str]] = set()
+
+    def upload(self, tbcs: TbcsApi, product_id: str, test_case_id: str, execution_id: str, files: List[str],
+               name: str) -> None:
+        """
+        Hands over the result files of an execution, they are uploaded in the background.
+
+        Parameters
+        ----------
+        tbcs: TbcsApi
+            TbcsApi instance
+
+        product_id: str
+            Id of the product
+
+        test_case_id: str
+            Id of the Test Case
+
+        execution_id: str
+            Id of the Execution
+
+        files: List[str]
+            Paths of the result files, files which do not exist are ignored
+
+        name: str
+            Name of the archive (without extension), if the files are compressed
+        """
+        files = [file for file in files if os.path.isfile(file)]
+        if files == []:
+            return
+
+        with self.__lock:
+            if self.__staging_dir == None:
+                self.__staging_dir = mkdtemp(prefix="tbcs-artifacts-")
+            if self.__executor == None:
+                self.__executor = tbcs_utils.ImportExecutor(self.__logger,
+                                                            self.__max_workers,
+                                                            retries=UPLOAD_RETRIES,
+                                                            retry_on=(requests.exceptions.ConnectionError, ))
+            self.__count += 1
+            staging_dir = os.path.join(self.__staging_dir, str(self.__count))
+        os.mkdir(staging_dir)
+
+        if self.__compression == '':
+            staged = [self.__stage_file(file, staging_dir) for file in files]
+        else:
+            archive = os.path.join(staging_dir, name + _ARCHIVE_EXTENSIONS[self.__compression])
+            staged = [self.__stage_archive(files, archive)]
+
+        # uploads run in other threads, their spans are children of the current span of the caller
+        parent = tracing_utils.get_current_span()
+        for path, digest in staged:
+            key = (product_id, test_case_id, execution_id, digest)
+            with self.__lock:
+                skip = key in self.__uploaded
+                self.__uploaded.add(key)
+            if skip:
+                self.__logger.debug(f"'{os.path.basename(path)}' was already uploaded to execution {execution_id}")
+                os.remove(path)
+                continue
+            self.__executor.submit(f"Upload '{os.path.basename(path)}' to execution {execution_id}",  # type: ignore
+                                   self.__upload, tbcs, product_id, test_case_id, execution_id, path, key, parent)
+
+    def wait(self) -> int:
+        """
+        Waits until all uploads handed over so far are finished and removes the staged files.
+
+        Returns
+        -------
+        int
+            Number of files which could not be uploaded
+        """
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+            staging_dir, self.__staging_dir = self.__staging_dir, None
+        if executor == None:
+            return 0
+
+        failed = executor.wait()
+        executor.shutdown()
+        if staging_dir != None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        if failed:
+            self.__logger.error(f"{len(failed)} result file(s) could not be uploaded")
+        return len(failed)
+
+    def __upload(self, tbcs: TbcsApi, product_id: str, test_case_id: str, execution_id: str, path: str,
+                 key: Tuple[str, str, str, str], parent: Union[tracing_utils.Span, None]) -> None:
+        attributes = {'tbcs.execution_id': execution_id, 'file.name': os.path.basename(path)}
+        try:
+            with tracing_utils.get_tracer().span("upload", attributes, parent.context if parent != None else None):
+                tbcs.upload_file_to_execution(product_id, test_case_id, execution_id, path)
+        except BaseException:
+            # uploaded again by the next try on connection errors (see UPLOAD_RETRIES), otherwise the failed task is
+            # logged as error by the executor and the file is lost
+            with self.__lock:
+                self.__uploaded.discard(key)
+            raise
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __stage_file(self, file: str, staging_dir: str) -> Tuple[str, str]:
+        # Copies the file into the staging directory and returns its path and content hash
+        # (no hard link: adapters may rewrite their result files in place)
+        path = os.path.join(staging_dir, os.path.basename(file))
+        hash = hashlib.sha256()
+        with open(file, 'rb') as source, open(path, 'wb') as target:
+            shutil.copyfileobj(_HashingReader(source, hash), target, 1024 * 1024)
+        return (path, hash.hexdigest())
+
+    def __stage_archive(self, files: List[str], path: str) -> Tuple[str, str]:
+        # Packs the files into an archive and returns its path and a hash of the packed names and contents
+        # (archives themselves differ by timestamps)
+        hash = hashlib.sha256()
+        if self.__compression == 'zip':
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for file in files:
+                    hash.update(os.path.basename(file).encode('utf-8') + b'\0')
+                    info = zipfile.ZipInfo.from_file(file, os.path.basename(file))
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(file, 'rb') as source, archive.open(info, 'w', force_zip64=True) as target:
+                        shutil.copyfileobj(_HashingReader(source, hash), target, 1024 * 1024)
+        else:
+            import zstandard
+            with open(path, 'wb') as raw, zstandard.ZstdCompressor().stream_writer(raw) as compressed, \
+                    tarfile.open(fileobj=compressed, mode='w|') as archive:
+                for file in files:
+                    hash.update(os.path.basename(file).encode('utf-8') + b'\0')
+                    with open(file, 'rb') as source:
+                        archive.addfile(archive.gettarinfo(file, os.path.basename(file)), _HashingReader(source, hash))
+        return (path, hash.hexdigest())
+
+
+# Uploader shared by all adapters, see get_uploader()
+_uploader: Union[ArtifactUploader, None] = None
+
+
+def get_uploader() -> ArtifactUploader:
+    """
+    Returns the uploader shared by all adapters (created with ARTIFACT_COMPRESSION and ARTIFACT_UPLOAD_WORKERS of the
+    config on first use).
+    """
+    global _uploader
+    if _uploader == None:
+        _uploader = ArtifactUploader(logger_utils.get_logger('ArtifactUploader', config.LOGLEVEL),
+                                     getattr(config, "ARTIFACT_COMPRESSION", ""),
+                                     getattr(config, "ARTIFACT_UPLOAD_WORKERS", 2))
+    return _uploader
+
+
+def wait_for_uploads() -> int:
+    """
+    Waits until all result files handed over to the shared uploader are uploaded.
+
+    Returns
+    -------
+    int
+        Number of files which could not be uploaded
+    """
+    if _uploader == None:
+        return 0
+    return _uploader.wait()
@@ -0,0 +1,239 @@
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Tuple, Union
+
+from behave.configuration import Configuration
+from behave.formatter.base import Formatter
+from behave.runner import Runner
+
+# Called by the formatter for each finished scenario of the currently running behave run (one run per process at a time)
+_scenario_listener: Union[Callable[[dict, dict], None], None] = None
+
+
+class TbcsFormatter(Formatter):
+    """
+    Behave formatter pushing the result of each finished scenario to a listener.
+
+    Results have the same structure as the ones of behave's json formatter (features with their 'elements'), so they
+    can be processed without writing and reading a result file.
+    """
+
+    name = "tbcs"
+    description = "Pushes scenario and step results to the TestBench CS agent"
+
+    def __init__(self, stream_opener, config):
+        super().__init__(stream_opener, config)
+        self.__feature: Union[dict, None] = None
+        self.__scenario = None
+        self.__scenario_result: Union[dict, None] = None
+
+    def feature(self, feature):
+        self.__feature = {'keyword': feature.keyword, 'name': feature.name, 'location': str(feature.location)}
+
+    def scenario(self, scenario):
+        self.__finish_scenario()
+        self.__scenario = scenario
+        self.__scenario_result = {
+            'keyword': scenario.keyword,
+            'name': scenario.name,
+            'location': f"{scenario.location.filename}:{scenario.location.line}",
+            'steps': [],
+        }
+
+    def result(self, step):
+        if self.__scenario_result is not None:
+            self.__scenario_result['steps'].append({
+                'keyword': step.keyword,
+                'name': step.name,
+                'result': {
+                    'status': step.status.name,
+                    'duration': step.duration
+                },
+            })
+
+    def eof(self):
+        self.__finish_scenario()
+
+    def __finish_scenario(self):
+        if self.__scenario is None or self.__scenario_result is None or self.__feature is None:
+            return
+        self.__scenario_result['status'] = self.__scenario.status.name
+        if _scenario_listener is not None:
+            _scenario_listener(self.__feature, self.__scenario_result)
+        self.__scenario = None
+        self.__scenario_result = None
+
+
+def run_features(feature_files: List[str], listener: Callable[[dict, dict], None]) -> int:
+    """
+    Runs feature files with behave's runner in the current process.
+
+    Parameters
+    ----------
+    feature_files: List[str]
+        Paths of the feature files
+
+    listener: Callable[[dict, dict], None]
+        Called with (feature, scenario) for each finished scenario, see TbcsFormatter
+
+    Returns
+    -------
+    int
+        0 if all scenarios passed, 1 otherwise (like the exit code of behave)
+    """
+    global _scenario_listener
+
+    config = Configuration(command_args=["-f", f"{__name__}:TbcsFormatter", "-o", os.devnull] + feature_files,
+                           load_config=False)
+    _scenario_listener = listener
+    try:
+        failed = Runner(config).run()
+    finally:
+        _scenario_listener = None
+    return 1 if failed else 0
+
+
+class BehaveRun():
+    """
+    Handle of a behave run started by start_run(); can be used by the agent like a subprocess.
+    """
+
+    def __init__(self):
+        self.__done = threading.Event()
+        self.__returncode: Union[int, None] = None
+        self.__scenarios: Dict[Tuple[str, int], Tuple[dict, dict]] = {}
+
+    def add_scenario(self, feature: dict, scenario: dict) -> None:
+        file_name, line = scenario['location'].rsplit(":", 1)
+        self.__scenarios[(os.path.basename(file_name), int(line))] = (feature, scenario)
+
+    def finish(self, returncode: int) -> None:
+        self.__returncode = returncode
+        self.__done.set()
+
+    def poll(self) -> Union[int, None]:
+        _receive_worker_messages(block=False)
+        return self.__returncode
+
+    @property
+    def returncode(self) -> int:
+        # waits for the run to finish
+        while not self.__done.is_set():
+            if not _receive_worker_messages(block=True):
+                break
+        return self.__returncode if self.__returncode is not None else 1
+
+    def wait(self) -> int:
+        return self.returncode
+
+    def get_scenario(self, file_name: str, line: int) -> Tuple[Union[dict, None], Union[dict, None]]:
+        """
+        Returns (feature, scenario) of the scenario at a location, (None, None) if it was not run.
+        """
+        self.returncode
+        return self.__scenarios.get((os.path.basename(file_name), line), (None, None))
+
+
+# pre-forked worker process running behave, started on first use
+_worker: Union[multiprocessing.Process, None] = None
+_worker_requests = None
+_worker_responses = None
+_worker_runs: Dict[int, BehaveRun] = {}
+_worker_lock = threading.Lock()
+_run_count = 0
+
+
+def _worker_main(requests, responses) -> None:
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        run_id, feature_files = request
+        try:
+            returncode = run_features(
+                feature_files, lambda feature, scenario: responses.put((run_id, 'scenario', (feature, scenario))))
+        except BaseException as e:
+            responses.put((run_id, 'error', str(e)))
+            returncode = 1
+        responses.put((run_id, 'done', returncode))
+
+
+def _receive_worker_messages(block: bool) -> bool:
+    # Dispatches the messages of the worker process to their runs; returns False if the worker is gone
+    if _worker is None or _worker_responses is None:
+        return False
+
+    with _worker_lock:
+        while True:
+            try:
+                run_id, kind, payload = _worker_responses.get(block=block, timeout=1 if block else None)
+            except queue.Empty:
+                return _worker.is_alive()
+
+            run = _worker_runs.get(run_id)
+            if run is not None:
+                if kind == 'scenario':
+                    run.add_scenario(*payload)
+                elif kind == 'done':
+                    run.finish(payload)
+                    del _worker_runs[run_id]
+            block = False
+
+
+def start_run(feature_files: List[str], mode: str) -> BehaveRun:
+    """
+    Runs feature files with behave's runner API instead of a behave subprocess.
+
+    Parameters
+    ----------
+    feature_files: List[str]
+        Paths of the feature files
+
+    mode: str
+        "inprocess": run within this process (returns after the run has finished);
+        "worker": run in a pre-forked worker process, which imports behave and the step modules only once
+
+    Returns
+    -------
+    BehaveRun
+        Handle of the run
+    """
+    global _worker, _worker_requests, _worker_responses, _run_count
+
+    run = BehaveRun()
+    if mode != "worker":
+        run.finish(run_features(feature_files, run.add_scenario))
+        return run
+
+    if _worker is None or not _worker.is_alive():
+        import atexit
+
+        context = multiprocessing.get_context("spawn")
+        _worker_requests = context.Queue()
+        _worker_responses = context.Queue()
+        _worker = context.Process(target=_worker_main,
+                                  args=(_worker_requests, _worker_responses),
+                                  name="behave-worker",
+                                  daemon=True)
+        _worker.start()
+        # the worker is reused for all runs of the process and stopped at its end
+        atexit.unregister(stop_worker)
+        atexit.register(stop_worker)
+
+    _run_count += 1
+    _worker_runs[_run_count] = run
+    _worker_requests.put((_run_count, feature_files))  # type: ignore
+    return run
+
+
+def stop_worker() -> None:
+    """
+    Stops the pre-forked behave worker process (if running).
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive() and _worker_requests is not None:
+        _worker_requests.put(None)
+        _worker.join(10)
+    _worker = None
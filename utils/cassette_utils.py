@@ -0,0 +1,294 @@
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from typing import IO, Deque, Dict, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Version of the file format, written to the first line of a cassette
+CASSETTE_VERSION = 1
+
+# Headers of the responses that are recorded, all others (e.g. cookies) are dropped
+RECORDED_HEADERS = ('Content-Type', 'Content-Disposition')
+
+# Operations with credentials: their request bodies are not identified in a cassette, the session token of the response
+# is replaced
+_SECRET_OPERATIONS = ('setup', )
+
+
+class CassetteMissError(requests.exceptions.RequestException):
+    """
+    Raised on replay if a cassette contains no response for a request.
+    """
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    # Cassettes ending with ".gz" are compressed
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + 't', encoding='utf-8')  # type: ignore
+    return open(path, mode, encoding='utf-8')
+
+
+def _route(url: str) -> str:
+    # Path and query of a request, so a cassette can be replayed with any server address
+    if "/api/" in url:
+        return url[url.index("/api/"):]
+    parts = urlsplit(url)
+    return parts.path + ("?" + parts.query if parts.query else "")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def _request_digest(operation: str, kwargs: dict) -> Union[str, None]:
+    # Identifies the body of a request (JSON or bytes), None if there is none or it is streamed from a file
+    if operation in _SECRET_OPERATIONS:
+        return None
+    if kwargs.get('json') is not None:
+        return _digest(json.dumps(kwargs['json'], sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    data = kwargs.get('data')
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return _digest(data) if isinstance(data, bytes) else None
+
+
+class Cassette:
+    """
+    Requests to TestBench CS and their responses in a file ("cassette"), for runs of the agent and the importers
+    without a server that give the same responses as a recorded run.
+
+    A cassette contains one JSON object per line: the version of the format, the bodies of the responses (each
+    distinct body once) and the interactions in the order of the responses. Request headers and the bodies of the
+    requests are not recorded, the latter are only identified by a hash.
+    """
+
+    def __init__(self, path: str, mode: str, latency: float = 0.0):
+        """
+        Opens a cassette.
+
+        Parameters
+        ----------
+        path: str
+            Path of the cassette, compressed if it ends with ".gz"
+
+        mode: str
+            "record" (a new cassette is written, an existing one is overwritten) or "replay"
+
+        latency: float
+            On replay, each response is delayed by its recorded duration multiplied by this factor (0 = no delay)
+        """
+        assert mode in ("record", "replay"), f"Unknown cassette mode '{mode}'"
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.__lock = threading.Lock()
+        self.__file: Union[IO[str], None] = None
+        # record: hashes of the bodies already written
+        self.__written: set = set()
+        # replay: the interactions by route and request body, by route only and the last one of each route
+        self.__bodies: Dict[str, bytes] = {}
+        self.__by_request: Dict[Tuple[str, str, Union[str, None]], Deque[dict]] = {}
+        self.__by_route: Dict[Tuple[str, str], Deque[dict]] = {}
+        self.__last: Dict[Tuple[str, str], dict] = {}
+        self.interactions = 0
+
+        if mode == "record":
+            self.__file = _open(path, 'w')
+            self.__write({'cassette': CASSETTE_VERSION, 'recorded': time.strftime('%Y-%m-%dT%H:%M:%S%z')})
+        else:
+            self.__load()
+
+    def __write(self, entry: dict) -> None:
+        self.__file.write(json.dumps(entry, separators=(',', ':')) + "\n")  # type: ignore
+
+    def __load(self) -> None:
+        with _open(self.path, 'r') as file:
+            for line in file:
+                entry = json.loads(line)
+                if 'cassette' in entry:
+                    assert entry['cassette'] == CASSETTE_VERSION, \
+                        f"Cassette '{self.path}' has the unsupported version {entry['cassette']}"
+                elif 'body' in entry:
+                    self.__bodies[entry['body']] = base64.b64decode(entry['base64']) if 'base64' in entry \
+                        else entry['text'].encode('utf-8')
+                else:
+                    route = (entry['method'], entry['route'])
+                    self.__by_request.setdefault(route + (entry.get('request'), ), deque()).append(entry)
+                    self.__by_route.setdefault(route, deque()).append(entry)
+                    self.interactions += 1
+
+    def close(self) -> None:
+        """
+        Closes the file of a recorded cassette.
+        """
+        with self.__lock:
+            if self.__file != None:
+                self.__file.close()
+                self.__file = None
+
+    def record(self, operation: str, method: str, url: str, kwargs: dict, response: requests.Response,
+               seconds: float) -> None:
+        """
+        Adds a response to the cassette.
+
+        Parameters
+        ----------
+        operation: str
+            Name of the operation of TbcsApi, e.g. "get_test_case"
+
+        method: str
+            HTTP method of the request
+
+        url: str
+            URL of the request
+
+        kwargs: dict
+            Arguments of the request (see requests.request)
+
+        response: requests.Response
+            Response of the server, its content is read
+
+        seconds: float
+            Duration of the request
+        """
+        content = response.content
+        if operation in _SECRET_OPERATIONS and response.status_code < 300:
+            content = json.dumps(dict(response.json(), sessionToken="recorded")).encode('utf-8')
+        body = _digest(content) if content else None
+        entry = {
+            'operation': operation,
+            'method': method.upper(),
+            'route': _route(url),
+            'request': _request_digest(operation, kwargs),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            'response': body,
+            'seconds': round(seconds, 6)
+        }
+        with self.__lock:
+            if self.__file == None:
+                return
+            if body != None and body not in self.__written:
+                try:
+                    self.__write({'body': body, 'text': content.decode('utf-8')})
+                except UnicodeDecodeError:
+                    self.__write({'body': body, 'base64': base64.b64encode(content).decode('ascii')})
+                self.__written.add(body)
+            self.__write(entry)
+            self.__file.flush()
+
+    def __next(self, method: str, route: str, request: Union[str, None]) -> Union[dict, None]:
+        # The next unused interaction with the same route and request body, otherwise with the same route; if all of
+        # them are used, the last one is repeated
+        for queue in (self.__by_request.get((method, route, request)), self.__by_route.get((method, route))):
+            while queue:
+                entry = queue.popleft()
+                if not entry.get('used'):
+                    entry['used'] = True
+                    self.__last[(method, route)] = entry
+                    return entry
+        return self.__last.get((method, route))
+
+    def replay(self, operation: str, method: str, url: str, kwargs: dict) -> requests.Response:
+        """
+        Returns the recorded response of a request.
+
+        Parameters
+        ----------
+        operation: str
+            Name of the operation of TbcsApi, e.g. "get_test_case"
+
+        method: str
+            HTTP method of the request
+
+        url: str
+            URL of the request, only its path and query are matched
+
+        kwargs: dict
+            Arguments of the request (see requests.request)
+
+        Returns
+        -------
+        requests.Response
+            The recorded response
+
+        Raises
+        ------
+        CassetteMissError
+            If the cassette contains no response for the method and route of the request
+        """
+        method = method.upper()
+        route = _route(url)
+        with self.__lock:
+            entry = self.__next(method, route, _request_digest(operation, kwargs))
+        if entry == None:
+            raise CassetteMissError(f"No recorded response for {method} {route} in cassette '{self.path}'")
+        if self.latency > 0:
+            time.sleep(entry['seconds'] * self.latency)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = self.__bodies[entry['response']] if entry['response'] != None else b""
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.url = url
+        response.request = requests.PreparedRequest()
+        response.request.prepare(method=method, url=url, data=kwargs.get('data'), json=kwargs.get('json'))
+        return response
+
+
+_cassette: Union[Cassette, None] = None
+
+
+def record(path: str) -> Cassette:
+    """
+    Records all requests of TbcsApi and their responses to a cassette, until the end of the process.
+    """
+    import atexit
+
+    global _cassette
+    _cassette = Cassette(path, "record")
+    atexit.register(_cassette.close)
+    return _cassette
+
+
+def replay(path: str, latency: float = 0.0) -> Cassette:
+    """
+    Answers all requests of TbcsApi from a cassette instead of TestBench CS. Each response is delayed by its recorded
+    duration multiplied by 'latency' (0 = no delay).
+    """
+    global _cassette
+    _cassette = Cassette(path, "replay", latency)
+    return _cassette
+
+
+def get_cassette() -> Union[Cassette, None]:
+    """
+    Returns the cassette that is recorded or replayed, None if requests are sent to TestBench CS.
+    """
+    return _cassette
+
+
+def send(operation: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Sends a request of TbcsApi (see requests.request): to TestBench CS, recording the response if a cassette is
+    recorded, or replays its response from a cassette.
+    """
+    cassette = _cassette
+    if cassette == None:
+        return requests.request(method, url, **kwargs)
+    if cassette.mode == "replay":
+        return cassette.replay(operation, method, url, kwargs)
+
+    start = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+    cassette.record(operation, method, url, kwargs, response, time.perf_counter() - start)
+    return response
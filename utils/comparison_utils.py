@@ -1,5 +1,5 @@
 import re
-from typing import Union
+from typing import List, Tuple, Union
 
 
 def is_matching(item_dict: dict, filter_dict: dict) -> bool:
@@ -113,3 +113,82 @@ def stringToBoolean(boolean: str) -> Union[bool, None]:
         return False
     else:
         return None
+
+
+def get_sequence_diff(old: List[str], new: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Computes the minimal edit script turning one sequence into another, based on the longest common subsequence.
+
+    Parameters
+    ----------
+    old : List[str]
+        Current sequence (e.g. the Test Step descriptions of a Test Step Block in TestBench CS)
+    new : List[str]
+        Target sequence (e.g. the Test Steps read from a source file)
+
+    Returns
+    -------
+    List[Tuple[str, int, int, int, int]]
+        List of opcodes (tag, i1, i2, j1, j2) describing how to turn old[i1:i2] into new[j1:j2]
+        - tag is one of 'equal', 'replace', 'delete' or 'insert'
+
+    Notes
+    -----
+    The opcodes use the same format as difflib.SequenceMatcher.get_opcodes(), but unlike difflib the
+    result is a true minimal diff (no junk heuristics), so the number of non-equal items is as small as possible.
+    Common prefixes and suffixes are stripped before the O(n*m) LCS table is built.
+    """
+    prefix = 0
+    while prefix < len(old) and prefix < len(new) and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < len(old) - prefix and suffix < len(new) - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+
+    # lcs[i][j] = length of the LCS of old_mid[i:] and new_mid[j:]
+    lcs = [[0] * (len(new_mid) + 1) for _ in range(len(old_mid) + 1)]
+    for i in range(len(old_mid) - 1, -1, -1):
+        for j in range(len(new_mid) - 1, -1, -1):
+            if old_mid[i] == new_mid[j]:
+                lcs[i][j] = lcs[i + 1][j + 1] + 1
+            else:
+                lcs[i][j] = max(lcs[i + 1][j], lcs[i][j + 1])
+
+    # Walk the table to collect matching index pairs
+    matches = [(k, k) for k in range(prefix)]
+    i, j = 0, 0
+    while i < len(old_mid) and j < len(new_mid):
+        if old_mid[i] == new_mid[j]:
+            matches.append((prefix + i, prefix + j))
+            i += 1
+            j += 1
+        elif lcs[i + 1][j] >= lcs[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    matches.extend((len(old) - suffix + k, len(new) - suffix + k) for k in range(suffix))
+
+    # Turn matching pairs into opcodes
+    opcodes: List[Tuple[str, int, int, int, int]] = []
+    i, j = 0, 0
+    for match_i, match_j in matches + [(len(old), len(new))]:
+        if i < match_i and j < match_j:
+            opcodes.append(('replace', i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(('delete', i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(('insert', i, i, j, match_j))
+
+        if match_i < len(old):
+            if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == match_i:
+                tag, i1, _, j1, _ = opcodes[-1]
+                opcodes[-1] = (tag, i1, match_i + 1, j1, match_j + 1)
+            else:
+                opcodes.append(('equal', match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+
+    return opcodes
@@ -0,0 +1,461 @@
+import glob
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from logging import Logger
+from typing import Dict, Iterator, List, Tuple, Union
+
+import utils.tracing_utils as tracing_utils
+
+# string literal in single or double quotes or a template literal
+_STRING = r"'(?:[^'\\\n]|\\.)*'|\"(?:[^\"\\\n]|\\.)*\"|`(?:[^`\\]|\\.)*`"
+
+# regular expression literal with flags: a "/" where an expression starts (at the start of a line, after one of
+# ( , = : [ ! & | ? { } ; or after a keyword like "return"), otherwise "/" is a division; "/" within a character class
+# does not end the literal
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'in', 'of', 'void', 'delete', 'throw')
+_REGEX = (r"(?:(?<=[(,=:\[!&|?{};\n])|" + "".join(r"(?<=\b" + keyword + r")|" for keyword in _REGEX_KEYWORDS) +
+          r"\A)[ \t]*/(?![/*])(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-zA-Z]*")
+
+# All tokens the scanner is interested in, compiled once. Comments, plain strings and regular expressions are matched
+# as well, so braces and calls inside of them are skipped. Parentheses and functions ("=>", "function") tell the body
+# of a describe() / it() callback from other arguments, e.g. an options object.
+_TOKEN_RE = re.compile(
+    r"(?P<comment>//[^\n]*|/\*.*?\*/)"
+    r"|(?P<regex>" + _REGEX + r")"
+    r"|(?P<call>\b(?P<fn>describe|context|it|specify|TBCS_DESCRIPTION|TBCS_AUTID|cy\.log)(?:\.only)?"
+    r"\s*\(\s*(?P<arg>" + _STRING + r"))"
+    r"|(?P<string>" + _STRING + r")"
+    r"|(?P<function>=>|\bfunction\b)"
+    r"|(?P<open>\{)|(?P<close>\})|(?P<open_paren>\()|(?P<close_paren>\))", re.DOTALL)
+
+_ESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+
+# External ID in a report: comment "TBCS_AUTID(<id>)" written by the TBCS reporter or the call in the test code
+_REPORT_AUTID_RE = re.compile(r"TBCS_AUTID\((?!\s*['\"`])(.*)\)")
+_CODE_CALL_RE = re.compile(r"\b(?P<fn>TBCS_AUTID|cy\.log)\s*\(\s*(?P<arg>" + _STRING + r")")
+
+
+def _unquote(literal: str) -> str:
+    return _ESCAPE_RE.sub(r"\1", literal[1:-1])
+
+
+def scan_spec(content: str) -> dict:
+    """
+    Scans the content of a Cypress specification in a single pass.
+
+    Handles single, double and back quoted titles, comments, regular expression literals, options objects (e.g.
+    it('title', { retries: 1 }, () => {...})) and nested describe() / context() blocks. The meta data calls
+    TBCS_DESCRIPTION() and TBCS_AUTID() as well as cy.log() are assigned to the enclosing it().
+
+    Parameters
+    ----------
+    content: str
+        Content of the specification file
+
+    Returns
+    -------
+    dict
+        {'story': name of the first top level describe() (None if there is none),
+         'test_cases': [{'name': describe titles and it() title, 'title': it() title, 'line': line of the it() call
+                         (starting with 1), 'description': str, 'external_id': str, 'steps': List[str]}, ...]}
+    """
+    story = None
+    test_cases: List[dict] = []
+    describes: List[Tuple[str, int]] = []  # (title, brace depth of the callback body)
+    test_case: Union[dict, None] = None
+    test_case_depth = -1  # brace depth of the callback body of the current it(); -1 until the body is found
+    # describe() / it() whose callback body is not found yet: (function, title, parenthesis depth of its arguments,
+    # function seen)
+    pending: Union[Tuple[str, str, int, bool], None] = None
+    depth = 0
+    paren_depth = 0
+    line = 1
+    pos = 0
+
+    for match in _TOKEN_RE.finditer(content):
+        kind = match.lastgroup
+        if kind == 'open':
+            # the context of a describe() / it() starts at the body of its callback, not at other arguments
+            if pending is not None and pending[3] and paren_depth == pending[2]:
+                if pending[0] in ('describe', 'context'):
+                    describes.append((pending[1], depth))
+                else:
+                    test_case_depth = depth
+                pending = None
+            depth += 1
+        elif kind == 'close':
+            depth -= 1
+            while describes and depth <= describes[-1][1]:
+                describes.pop()
+            if test_case is not None and depth <= test_case_depth:
+                test_case = None
+        elif kind == 'function':
+            if pending is not None and paren_depth == pending[2]:
+                pending = pending[:3] + (True, )
+        elif kind == 'open_paren':
+            paren_depth += 1
+        elif kind == 'close_paren':
+            paren_depth -= 1
+            if pending is not None and paren_depth < pending[2]:
+                # the call ends without a callback body (e.g. an expression body or a pending test)
+                if pending[0] in ('it', 'specify'):
+                    test_case = None
+                pending = None
+        elif match.group('call'):
+            fn = match.group('fn')
+            arg = _unquote(match.group('arg'))
+            # the "(" of the call is part of the token
+            paren_depth += 1
+            if fn in ('describe', 'context'):
+                if story is None:
+                    story = arg
+                pending = (fn, arg, paren_depth, False)
+            elif fn in ('it', 'specify'):
+                line += content.count('\n', pos, match.start())
+                pos = match.start()
+                test_case = {
+                    'name': ' '.join([title for title, _ in describes] + [arg]),
+                    'title': arg,
+                    'line': line,
+                    'description': '',
+                    'external_id': '',
+                    'steps': [],
+                }
+                test_case_depth = -1
+                test_cases.append(test_case)
+                pending = (fn, arg, paren_depth, False)
+            elif test_case is not None:
+                if fn == 'TBCS_DESCRIPTION':
+                    test_case['description'] = arg
+                elif fn == 'TBCS_AUTID':
+                    test_case['external_id'] = arg
+                else:
+                    test_case['steps'].append(arg)
+
+    return {'story': story, 'test_cases': test_cases}
+
+
+def scan_spec_file(file: str) -> dict:
+    """
+    Scans a Cypress specification file, see scan_spec().
+
+    Parameters
+    ----------
+    file: str
+        Path of the specification file
+
+    Returns
+    -------
+    dict
+        Result of scan_spec() with the additional keys 'file' and 'scan_time' (start and end of the scan in seconds
+        since the epoch)
+    """
+    start_time = time.time()
+    with open(file, 'r', encoding='utf-8') as f:
+        result = scan_spec(f.read())
+    result['file'] = file
+    result['scan_time'] = (start_time, time.time())
+    return result
+
+
+def _trace_scan(result: dict) -> dict:
+    # The scan is traced by the calling process, as worker processes are not traced
+    tracing_utils.add_span("parse", *result['scan_time'], {'tbcs.file': result['file']})
+    return result
+
+
+def scan_spec_files(logger: Logger, files: List[str], jobs: int = 1) -> Iterator[Tuple[str, Union[dict, None]]]:
+    """
+    Scans Cypress specification files in a process pool.
+
+    Results are yielded in the order of the given files as soon as they are available, so callers can already
+    process the first files while later ones are still being scanned.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    files: List[str]
+        Paths of the specification files
+
+    jobs: int
+        Number of worker processes; with 1 all files are scanned in the calling process
+
+    Returns
+    -------
+    Iterator[Tuple[str, dict]]
+        (file, result of scan_spec_file()) for each file; the result is None if the file could not be scanned
+    """
+    if jobs <= 1 or len(files) <= 1:
+        for file in files:
+            try:
+                yield file, _trace_scan(scan_spec_file(file))
+            except Exception as e:
+                logger.error(f'Failed to extract Test Cases from file "{file}"\n\t{e.__str__()}')
+                yield file, None
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(scan_spec_file, file) for file in files]
+        for file, future in zip(files, futures):
+            try:
+                yield file, _trace_scan(future.result())
+            except Exception as e:
+                logger.error(f'Failed to extract Test Cases from file "{file}"\n\t{e.__str__()}')
+                yield file, None
+
+
+class SpecIndex():
+    """
+    Index of the External IDs (TBCS_AUTID) of all Cypress Test Cases below a spec folder.
+
+    Maps each External ID to the spec file and the line of its it() call, so a lookup costs no file access. The
+    index can be persisted; on refresh() only new or modified files (by modification time and size) are scanned again.
+    """
+
+    VERSION = 1
+
+    def __init__(self, logger: Logger, root: str, path: str = "", exclude_suffix: str = ""):
+        """
+        Initializes the index and loads a persisted index from disk.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger instance
+
+        root: str
+            Folder containing the spec files
+
+        path: str
+            (optional) Path of the file the index is persisted in
+
+        exclude_suffix: str
+            (optional) Files ending with this suffix are ignored, e.g. temporary spec files
+        """
+        self.__logger = logger
+        self.__root = os.path.abspath(root)
+        self.__path = path
+        self.__exclude_suffix = exclude_suffix
+        self.__files: Dict[str, dict] = {}
+        self.__ids: Dict[str, Tuple[str, int]] = {}
+
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == self.VERSION and data.get('root') == self.__root:
+                    self.__files = data['files']
+                    self.__build_ids()
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug(f"Could not read Cypress spec index '{path}' - rebuilding it\n\t{e.__str__()}")
+
+    def __build_ids(self) -> None:
+        self.__ids = {}
+        for file in sorted(self.__files):
+            for external_id, line in self.__files[file]['ids'].items():
+                if external_id in self.__ids:
+                    self.__logger.warning(f"External ID '{external_id}' is used in '{self.__ids[external_id][0]}' and "
+                                          f"'{file}' - using the first one")
+                    continue
+                self.__ids[external_id] = (file, line)
+
+    def refresh(self) -> None:
+        """
+        Brings the index up to date: new and modified spec files are scanned, deleted ones are removed.
+        """
+        files: Dict[str, dict] = {}
+        changed = False
+        for folder, _, names in os.walk(self.__root):
+            for name in names:
+                if self.__exclude_suffix and name.endswith(self.__exclude_suffix):
+                    continue
+                file = os.path.join(folder, name)
+                try:
+                    stat = os.stat(file)
+                except OSError:
+                    continue
+                entry = self.__files.get(file)
+                if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    ids = {}
+                    try:
+                        for test_case in scan_spec_file(file)['test_cases']:
+                            if test_case['external_id']:
+                                ids.setdefault(test_case['external_id'], test_case['line'])
+                    except (OSError, ValueError) as e:
+                        self.__logger.debug(f"Skipping file '{file}' in Cypress spec index\n\t{e.__str__()}")
+                    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'ids': ids}
+                    changed = True
+                files[file] = entry
+
+        changed = changed or len(files) != len(self.__files)
+        self.__files = files
+        if changed:
+            self.__build_ids()
+            self.save()
+
+    def find(self, external_id: str) -> Union[Tuple[str, int], None]:
+        """
+        Looks up a Cypress Test Case by its External ID.
+
+        Parameters
+        ----------
+        external_id: str
+            External ID of the Test Case (value of TBCS_AUTID)
+
+        Returns
+        -------
+        Tuple[str, int]
+            Path of the spec file and line of the it() call (starting with 1); None if the External ID is unknown
+        """
+        return self.__ids.get(external_id)
+
+    def save(self) -> None:
+        """
+        Writes the index to disk (if a path is given).
+        """
+        if not self.__path:
+            return
+
+        tmp_path = self.__path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': self.VERSION, 'root': self.__root, 'files': self.__files}, file)
+            os.replace(tmp_path, self.__path)
+        except OSError as e:
+            self.__logger.warning(f"Could not write Cypress spec index '{self.__path}'\n\t{e.__str__()}")
+
+
+def _new_report_result(name: str, names: List[str]) -> dict:
+    return {
+        'name': name,
+        'names': names,
+        'external_id': '',
+        'failed': False,
+        'skipped': False,
+        'error': '',
+        'steps': [],
+    }
+
+
+def read_junit_report(file: str) -> Iterator[dict]:
+    """
+    Reads the test results of a JUnit report with a streaming parser.
+
+    Parameters
+    ----------
+    file: str
+        Path of the JUnit XML file
+
+    Returns
+    -------
+    Iterator[dict]
+        {'name': test name, 'names': possible full names, 'external_id': str, 'failed': bool, 'skipped': bool,
+         'error': str, 'steps': List[str]} for each test case
+    """
+    suites: List[str] = []
+    test = None
+    for event, elem in ET.iterparse(file, events=('start', 'end', 'comment')):
+        if event == 'comment':
+            match = _REPORT_AUTID_RE.search(elem.text or '')
+            if test is not None and match:
+                test['external_id'] = match.group(1).strip()
+        elif event == 'start':
+            if elem.tag == 'testsuite':
+                suites.append(elem.get('name', ''))
+            elif elem.tag == 'testcase':
+                name = elem.get('name', '')
+                test = _new_report_result(name, [name] + ([suites[-1] + ' ' + name] if suites else []))
+        elif elem.tag == 'testcase':
+            if test is not None:
+                yield test
+            test = None
+            elem.clear()
+        elif elem.tag == 'testsuite':
+            suites.pop()
+            elem.clear()
+        elif test is not None:
+            if elem.tag in ('failure', 'error'):
+                test['failed'] = True
+                test['error'] = elem.get('message') or (elem.text or '').strip()
+            elif elem.tag == 'skipped':
+                test['skipped'] = True
+            elif elem.tag == 'system-out':
+                # the TBCS reporter writes one cy.log() step per line
+                test['steps'] = [line.strip() for line in (elem.text or '').splitlines() if line.strip()]
+
+
+def read_mochawesome_report(file: str) -> Iterator[dict]:
+    """
+    Reads the test results of a mochawesome JSON report.
+
+    Parameters
+    ----------
+    file: str
+        Path of the mochawesome JSON file
+
+    Returns
+    -------
+    Iterator[dict]
+        Test results as returned by read_junit_report(); External ID and steps are taken from the test code
+    """
+    with open(file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    suites = list(data.get('results', []))
+    while suites:
+        suite = suites.pop(0)
+        suites.extend(suite.get('suites', []))
+        for test in suite.get('tests', []):
+            result = _new_report_result(test.get('title', ''), [test.get('title', ''), test.get('fullTitle', '')])
+            result['failed'] = bool(test.get('fail')) or test.get('state') == 'failed'
+            result['skipped'] = bool(test.get('pending') or test.get('skipped'))
+            result['error'] = (test.get('err') or {}).get('message', '')
+            for match in _CODE_CALL_RE.finditer(test.get('code') or ''):
+                if match.group('fn') == 'TBCS_AUTID':
+                    result['external_id'] = _unquote(match.group('arg'))
+                else:
+                    result['steps'].append(_unquote(match.group('arg')))
+            yield result
+
+
+def read_reports(logger: Logger, pattern: str, since: float = 0.0) -> Dict[str, dict]:
+    """
+    Reads all JUnit (*.xml) and mochawesome (*.json) reports matching a file pattern.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    pattern: str
+        Glob pattern of the report files, e.g. "./test-results/*.xml"
+
+    since: float
+        (optional) Only files modified at or after this time (seconds since the epoch) are read
+
+    Returns
+    -------
+    Dict[str, dict]
+        Test results (see read_junit_report()) by "id:<External ID>" and by "name:<full name>"
+    """
+    results: Dict[str, dict] = {}
+    for file in sorted(glob.glob(pattern, recursive=True)):
+        try:
+            if os.path.getmtime(file) < since:
+                continue
+            reader = read_mochawesome_report if file.endswith('.json') else read_junit_report
+            for result in reader(file):
+                if result['external_id']:
+                    results['id:' + result['external_id']] = result
+                for name in result['names']:
+                    if name:
+                        results.setdefault('name:' + name, result)
+        except (OSError, ValueError, ET.ParseError) as e:
+            logger.warning(f"Could not read Cypress report '{file}'\n\t{e.__str__()}")
+    return results
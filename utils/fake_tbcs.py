@@ -0,0 +1,1222 @@
+import copy
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+from urllib.parse import unquote
+
+# Marks the values of a DDT row in concrete Test Cases, like TestBench CS (see tbcs_utils.DDT_VALUE_MARKER)
+DDT_VALUE_MARKER = "#*#"
+
+_TENANT = r"/api/tenants/(?P<tenant>\d+)"
+_PRODUCT = _TENANT + r"/products/(?P<product>\d+)"
+_TEST_CASE = _PRODUCT + r"/specifications/testCases/(?P<test_case>\d+)"
+_DDT_TABLE = _PRODUCT + r"/ddt/testCases/(?P<test_case>\d+)/tables/(?P<table>\d+)"
+_EXECUTION = _PRODUCT + r"/executions/testCases/(?P<test_case>\d+)/executions/(?P<execution>\d+)"
+
+# Operations of the GraphQL API (/api/kdt/) => name of the operation in TbcsApi (and in the request counts)
+_GQL_OPERATIONS = {
+    'createKeyword': 'create_keyword',
+    'updateKeyword': 'update_keyword',
+    'updateKeywordParameter': 'update_keyword_parameter',
+    'createKeywordParam': 'create_keyword_param',
+    'deleteKeywordParameter': 'delete_keyword_param',
+    'getKeywords': 'get_keyword_list',
+    'getKeyword': 'get_keyword',
+    'getKeywordParametersAndValues': 'get_keyword_parameters_and_values',
+    'deleteKeyword': 'delete_keyword',
+    'addKeywordUsage': 'add_keyword_usage',
+    'upsertKeywordParamValue': 'update_kwd_par_value',
+}
+
+_GQL_NAME_PATTERN = re.compile(r"\b(\w+)\s*\(")
+_GQL_IDS_PATTERN = re.compile(r"\b(ids|keywordUsageParams)\s*:\s*\{([^}]*)\}")
+_GQL_ID_PATTERN = re.compile(r"(\w+)\s*:\s*\"?([^\",\s]*)\"?")
+_GQL_TEXT_PATTERN = re.compile(r"\btext\s*:\s*\"(.*?)\",?\s*\n", re.DOTALL)
+
+_MULTIPART_FILE_PATTERN = re.compile(rb'filename="([^"]*)"\r\n(?:.*\r\n)*?\r\n', re.IGNORECASE)
+
+
+class FakeResponse:
+    """
+    Response of the fake server: status code and body (dict or list: JSON, bytes: file content, None: no content).
+    """
+
+    def __init__(self, status: int, body: Union[dict, list, bytes, None] = None):
+        self.status = status
+        self.body = body
+
+
+class FakeTbcs:
+    """
+    In-memory stand-in for a TestBench CS workspace: implements the REST routes and the GraphQL operations (/api/kdt/)
+    used by TbcsApi, so the agent and the importers can run without a TestBench CS tenant (see FakeTbcsServer).
+
+    Fill the workspace with the add_* methods or with generate_workspace(). Latency and failures of requests can be
+    simulated, the requests are counted by operation (names of the operations of TbcsApi, as in metrics_utils).
+    """
+
+    def __init__(self,
+                 workspace: str = "fake",
+                 login: str = "agent",
+                 password: str = "agent",
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 error_operations: Iterable[str] = (),
+                 seed: Union[int, None] = None):
+        """
+        Initializes an empty workspace.
+
+        Parameters
+        ----------
+        workspace: str
+            Name of the workspace (tenant) for the login
+
+        login: str
+            Login of the only user
+
+        password: str
+            Password of the user
+
+        latency: float
+            Delay of each response in seconds
+
+        latency_jitter: float
+            Random additional delay of each response in seconds (0 to latency_jitter)
+
+        error_rate: float
+            Probability (0 to 1) of a request failing with error_status
+
+        error_status: int
+            Status code of the failed requests
+
+        error_operations: Iterable[str]
+            Operations which may fail (e.g. "post_execution"); empty: all operations
+
+        seed: int | None
+            Seed of the random numbers for latency and failures; None: not reproducible
+        """
+        self.workspace = workspace
+        self.login = login
+        self.password = password
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_operations = set(error_operations)
+
+        self.tenant_id = 1
+        self.user_id = 1
+        self.products: Dict[int, dict] = {}
+        self.custom_fields: Dict[int, dict] = {}
+        self.custom_field_blocks: Dict[int, dict] = {}
+        self.custom_field_containers: Dict[Tuple[str, str], List[int]] = {}
+
+        self.__random = random.Random(seed)
+        self.__ids = count(1000)
+        self.__session_tokens: set = set()
+        self.__request_counts: Counter = Counter()
+        self.__lock = threading.RLock()
+        self.__routes = self.__get_routes()
+
+    # ----- content of the workspace
+
+    def add_product(self, name: str) -> int:
+        """
+        Adds a product and returns its id.
+        """
+        with self.__lock:
+            product_id = self.__next_id()
+            self.products[product_id] = {
+                'id': product_id,
+                'name': name,
+                'suites': {},
+                'sessions': {},
+                'test_cases': {},
+                'executions': {},
+                'ddt_tables': {},
+                'files': {},
+                'epics': {},
+                'user_stories': {},
+                'defects': {},
+                'keywords': {},
+                'keyword_params': {},
+            }
+            return product_id
+
+    def add_custom_field(self, name: str) -> int:
+        """
+        Adds a custom field of Test Cases and returns its id (the id of an existing field with this name, if any).
+        """
+        with self.__lock:
+            for custom_field in self.custom_fields.values():
+                if custom_field['name'] == name:
+                    return custom_field['id']
+            custom_field_id = self.__next_id()
+            self.custom_fields[custom_field_id] = {'id': custom_field_id, 'name': name, 'label': name}
+            return custom_field_id
+
+    def add_test_case(self,
+                      product_id: int,
+                      name: str,
+                      blocks: Union[Dict[str, List[Union[str, dict]]], None] = None,
+                      external_id: str = "",
+                      custom_fields: Union[Dict[str, str], None] = None,
+                      user_story_id: Union[int, None] = None) -> int:
+        """
+        Adds a structured Test Case and returns its id.
+
+        Parameters
+        ----------
+        product_id: int
+            Id of the product
+
+        name: str
+            Name of the Test Case
+
+        blocks: Dict[str, List[str | dict]] | None
+            Title of each Test Step Block => its Test Steps: descriptions of text steps (str) or Keyword steps (dict
+            with keys "keywordId", "description" and "values": id of a parameter => value)
+
+        external_id: str
+            External ID of the automation
+
+        custom_fields: Dict[str, str] | None
+            Name of a custom field => value, missing custom fields are added
+
+        user_story_id: int | None
+            Id of the User Story of the Test Case
+
+        Returns
+        -------
+        int
+            Id of the Test Case
+        """
+        with self.__lock:
+            test_case_id = self.__next_id()
+            test_case = self.__new_test_case(product_id, test_case_id, name, "StructuredTestCase", user_story_id)
+            test_case['automation']['externalId'] = external_id
+            test_case['isAutomated'] = external_id != ""
+            for field_name, value in (custom_fields or {}).items():
+                test_case['customFields'].append({'customFieldId': self.add_custom_field(field_name), 'value': value})
+
+            for title, steps in (blocks or {}).items():
+                block = {'id': self.__next_id(), 'title': title, 'steps': []}
+                for step in steps:
+                    if isinstance(step, str):
+                        block['steps'].append(self.__new_test_step("TestStep", step))
+                    else:
+                        block['steps'].append(
+                            self.__new_test_step("Keyword", step.get('description', ""), step['keywordId'],
+                                                 step.get('values')))
+                test_case['testSequence']['testStepBlocks'].append(block)
+
+            self.products[product_id]['test_cases'][test_case_id] = test_case
+            return test_case_id
+
+    def add_ddt_table(self, product_id: int, test_case_id: int, columns: List[str], rows: List[List[str]]) -> List[int]:
+        """
+        Adds a DDT table to a Test Case (references "${column}" in texts of the Test Case are replaced by the values
+        of a row in its concrete Test Case) and returns the ids of its rows.
+        """
+        with self.__lock:
+            table_id = self.__next_id()
+            column_ids = [self.__next_id() for _ in columns]
+            self.products[product_id]['ddt_tables'][table_id] = {
+                'id': table_id,
+                'testCaseId': test_case_id,
+                'name': f"Table {table_id}",
+                'columnsMetaData': [{'id': column_id, 'name': name} for column_id, name in zip(column_ids, columns)],
+                'rowData': [{
+                    'id': self.__next_id(),
+                    'data': [{'columnId': column_id, 'value': value} for column_id, value in zip(column_ids, row)]
+                } for row in rows]
+            }
+            self.products[product_id]['test_cases'][test_case_id]['testCaseType'] = "DataDrivenTestCase"
+            return [row['id'] for row in self.products[product_id]['ddt_tables'][table_id]['rowData']]
+
+    def add_keyword(self,
+                    product_id: int,
+                    name: str,
+                    parameters: Iterable[str] = (),
+                    library: str = "",
+                    description: str = "") -> str:
+        """
+        Adds an implemented Keyword with parameters (names) and returns its id.
+        """
+        with self.__lock:
+            keyword_id = self.__new_keyword(product_id, {
+                'name': name,
+                'originalText': name,
+                'library': library,
+                'description': description,
+                'isImplemented': True
+            })
+            for parameter in parameters:
+                self.__new_keyword_param(product_id, keyword_id, {'paramName': parameter})
+            return keyword_id
+
+    def add_file(self, product_id: int, name: str, content: bytes, test_case_id: Union[int, None] = None) -> int:
+        """
+        Adds a file (as attachment of a Test Case, if test_case_id is given) and returns its id.
+        """
+        with self.__lock:
+            file_id = self.__next_id()
+            self.products[product_id]['files'][file_id] = {'fileId': file_id, 'name': name, 'content': content}
+            if test_case_id != None:
+                self.products[product_id]['test_cases'][test_case_id]['attachments'].append({
+                    'fileId': file_id,
+                    'name': name,
+                    'size': len(content)
+                })
+            return file_id
+
+    def add_suite(self, product_id: int, name: str, test_case_ids: Iterable[int], status: str = "Active") -> int:
+        """
+        Adds a Test Suite (the user is responsible) with the Test Cases (with all rows of their DDT tables) and returns
+        its id.
+        """
+        with self.__lock:
+            suite_id = self.__next_id()
+            test_cases = [{
+                'name': self.products[product_id]['test_cases'][test_case_id]['name'],
+                'testCaseIds': test_case_ids
+            } for test_case_id, test_case_ids in self.__get_test_case_ids(product_id, test_case_ids)]
+            self.products[product_id]['suites'][suite_id] = {
+                'testSuiteId': suite_id,
+                'name': name,
+                'status': status,
+                'responsibles': [self.user_id],
+                'testCases': test_cases
+            }
+            return suite_id
+
+    def add_session(self, product_id: int, name: str, test_case_ids: Iterable[int], status: str = "Ready") -> int:
+        """
+        Adds a Test Session (the user is participant) with an execution of each Test Case (and of each row of its DDT
+        tables) and returns its id.
+        """
+        with self.__lock:
+            session_id = self.__new_session(product_id, name)
+            self.products[product_id]['sessions'][session_id]['status'] = status
+            self.products[product_id]['sessions'][session_id]['participants'].append({'userId': self.user_id})
+            for test_case_id, test_case_ids in self.__get_test_case_ids(product_id, test_case_ids):
+                execution_id = self.__new_execution(product_id, test_case_id, test_case_ids['ddtTableIds'])
+                self.products[product_id]['sessions'][session_id]['testCaseExecutions'].append({
+                    'testCaseIds': test_case_ids,
+                    'executionId': execution_id
+                })
+            return session_id
+
+    # ----- requests
+
+    def request_counts(self) -> Dict[str, int]:
+        """
+        Returns the number of requests by operation (names of the operations of TbcsApi, "unknown": unknown routes).
+        """
+        with self.__lock:
+            return dict(self.__request_counts)
+
+    def reset_request_counts(self) -> None:
+        with self.__lock:
+            self.__request_counts.clear()
+
+    def handle(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> FakeResponse:
+        """
+        Handles a request to the fake server.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method, e.g. "GET"
+
+        path: str
+            Path of the request with query, e.g. "/api/tenants/1/products"
+
+        headers: Dict[str, str]
+            Headers of the request
+
+        body: bytes
+            Body of the request
+
+        Returns
+        -------
+        FakeResponse
+            The response
+        """
+        route, _, query_string = path.partition('?')
+        query = {}
+        for parameter in query_string.split('&'):
+            key, _, value = parameter.partition('=')
+            query[key] = unquote(value)
+        payload: Any = None
+        if body and not headers.get('Content-Type', "").startswith("multipart/"):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return FakeResponse(400, {'message': "Invalid JSON"})
+
+        operation, handler, match = "unknown", None, None
+        for route_method, pattern, route_operation, route_handler in self.__routes:
+            match = pattern.fullmatch(route)
+            if route_method == method and match != None:
+                operation, handler = route_operation, route_handler
+                break
+        if handler != None:
+            operation = self.__get_operation(operation, query, payload)
+
+        with self.__lock:
+            self.__request_counts[operation] += 1
+            delay = self.latency + self.__random.uniform(0, self.latency_jitter)
+            failed = (self.error_rate > 0 and (not self.error_operations or operation in self.error_operations) and
+                      self.__random.random() < self.error_rate)
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return FakeResponse(self.error_status, {'message': f"Injected failure of {operation}"})
+        if handler == None or match == None:
+            return FakeResponse(404, {'message': f"No route {method} {route}"})
+        if operation != "setup" and headers.get('Authorization') not in self.__session_tokens:
+            return FakeResponse(401, {'message': "Not logged in"})
+        if 'tenant' in match.groupdict() and int(match.group('tenant')) != self.tenant_id:
+            return FakeResponse(403, {'message': f"No access to tenant {match.group('tenant')}"})
+
+        # ids in the path are ints, like the ids in the bodies
+        params = {key: int(value) if value.isdigit() else value for key, value in match.groupdict().items()}
+        with self.__lock:
+            if 'product' in params and params['product'] not in self.products:
+                return FakeResponse(404, {'message': f"Product {params['product']} not found"})
+            try:
+                return handler(params, query, payload if payload != None else body, headers)
+            except KeyError as e:
+                return FakeResponse(404, {'message': f"Not found: {e.__str__()}"})
+            except (AttributeError, IndexError, TypeError, ValueError) as e:
+                return FakeResponse(400, {'message': f"Invalid request: {e.__str__()}"})
+
+    def __get_routes(self) -> List[Tuple[str, 're.Pattern', str, Callable[..., FakeResponse]]]:
+        routes = [
+            ("POST", r"/api/tenants/login/session", "setup", self.__login),
+            ("GET", r"/api/serverInfo", "get_server", self.__get_server),
+            ("GET", _TENANT + r"/products", "get_products", self.__get_products),
+            ("GET", _PRODUCT + r"/planning/suites/v1", "get_suites", self.__get_suites),
+            ("POST", _PRODUCT + r"/planning/suites/v1", "post_suite", self.__post_suite),
+            ("GET", _PRODUCT + r"/planning/suites/(?P<suite>\d+)/v1", "get_suite", self.__get_suite),
+            ("PATCH", _PRODUCT + r"/planning/suites/(?P<suite>\d+)/v1", "patch_suite", self.__patch_suite),
+            ("GET", _PRODUCT + r"/planning/sessions/v1", "get_sessions", self.__get_sessions),
+            ("POST", _PRODUCT + r"/planning/sessions/v1", "post_session", self.__post_session),
+            ("GET", _PRODUCT + r"/planning/sessions/(?P<session>\d+)/v1", "get_session", self.__get_session),
+            ("PATCH", _PRODUCT + r"/planning/sessions/(?P<session>\d+)/v1", "patch_session", self.__patch_session),
+            ("DELETE", _PRODUCT + r"/planning/sessions/(?P<session>\d+)/v1", "delete_session", self.__delete_session),
+            ("PATCH", _PRODUCT + r"/planning/sessions/(?P<session>\d+)/participant/self/v1", "join_session",
+             self.__join_session),
+            ("PATCH", _PRODUCT + r"/planning/sessions/(?P<session>\d+)/assign/executions/v1",
+             "add_execution_to_session", self.__add_executions),
+            ("GET", _PRODUCT + r"/specifications/testCases", "get_all_test_cases", self.__get_test_cases),
+            ("POST", _PRODUCT + r"/specifications/testCases", "post_test_case", self.__post_test_case),
+            ("GET", _TEST_CASE, "get_test_case", self.__get_test_case),
+            ("PATCH", _TEST_CASE, "patch_test_case", self.__patch_test_case),
+            ("GET", _TEST_CASE + r"/table/(?P<table>\d+)/row/(?P<row>\d+)", "get_concrete_test_case",
+             self.__get_concrete_test_case),
+            ("POST", _TEST_CASE + r"/testStepBlocks", "add_test_step_block", self.__post_test_step_block),
+            ("PATCH", _TEST_CASE + r"/testStepBlocks/(?P<block>\d+)", "patch_test_step_block",
+             self.__patch_test_step_block),
+            ("DELETE", _TEST_CASE + r"/testStepBlocks/(?P<block>\d+)", "remove_test_step_block",
+             self.__delete_test_step_block),
+            ("POST", _TEST_CASE + r"/testSteps", "add_test_step", self.__post_test_step),
+            ("PATCH", _TEST_CASE + r"/testSteps/(?P<step>\d+)", "patch_test_step", self.__patch_test_step),
+            ("DELETE", _TEST_CASE + r"/testSteps/(?P<step>\d+)", "remove_test_step", self.__delete_test_step),
+            ("POST", _PRODUCT + r"/executions/testCases/(?P<test_case>\d+)/v1", "post_execution",
+             self.__post_execution),
+            ("POST", _PRODUCT + r"/executions/testCases/(?P<test_case>\d+)/tables/(?P<table>\d+)/rows/(?P<row>\d+)/v1",
+             "post_execution_ddt", self.__post_execution),
+            ("PATCH", _EXECUTION + r"/v1", "patch_execution", self.__patch_execution),
+            ("PATCH", _EXECUTION + r"/testSteps/(?P<step>\d+)/v1", "report_step_result", self.__patch_step_result),
+            ("GET", _DDT_TABLE + r"/v1", "get_ddt_table", self.__get_ddt_table),
+            ("PATCH", _DDT_TABLE + r"/v1", "patch_ddt_table", self.__patch_ddt_table),
+            ("POST", _PRODUCT + r"/ddt/testCases/(?P<test_case>\d+)/v1", "post_ddt_table", self.__post_ddt_table),
+            ("POST", _DDT_TABLE + r"/rows/v1", "post_ddt_row", self.__post_ddt_row),
+            ("PATCH", _DDT_TABLE + r"/rows/(?P<row>\d+)/v1", "patch_ddt_row", self.__patch_ddt_row),
+            ("GET", _PRODUCT + r"/file/download", "get_file_response", self.__download_file),
+            ("POST", _PRODUCT + r"/file/upload", "upload_file", self.__upload_file),
+            ("GET", _TENANT + r"/customFields/containers", "get_custom_field_containers",
+             self.__get_custom_field_containers),
+            ("PUT", _TENANT + r"/customFields/containers/(?P<container>\w+)/(?P<anchor>\w+)",
+             "update_custom_field_containers", self.__put_custom_field_container),
+            ("GET", _TENANT + r"/customFields/fields", "get_custom_field_list", self.__get_custom_fields),
+            ("POST", _TENANT + r"/customFields/fields", "add_custom_field", self.__post_custom_field),
+            ("GET", _TENANT + r"/customFields/blocks", "get_custom_field_block_list", self.__get_custom_field_blocks),
+            ("POST", _TENANT + r"/customFields/blocks", "add_custom_field_block", self.__post_custom_field_block),
+            ("PATCH", _TENANT + r"/customFields/blocks/(?P<block>\d+)", "patch_custom_field_block",
+             self.__patch_custom_field_block),
+            ("POST", _PRODUCT + r"/defects/v1", "create_defect", self.__post_defect),
+            ("POST", _PRODUCT + r"/defects/assignments/v1", "assign_defect", self.__assign_defect),
+            ("POST", _PRODUCT + r"/requirements/epics", "post_epic", self.__post_epic),
+            ("PATCH", _PRODUCT + r"/requirements/epics/(?P<epic>\d+)", "patch_epic", self.__patch_epic),
+            ("POST", _PRODUCT + r"/requirements/userStories", "post_user_story", self.__post_user_story),
+            ("GET", _PRODUCT + r"/requirements/userStories/(?P<user_story>\d+)", "get_user_story",
+             self.__get_user_story),
+            ("PATCH", _PRODUCT + r"/requirements/userStories/(?P<user_story>\d+)", "patch_user_story",
+             self.__patch_user_story),
+            ("POST", r"/api/kdt/?", "graphql", self.__graphql),
+        ]
+        return [(method, re.compile(pattern), operation, handler) for method, pattern, operation, handler in routes]
+
+    # ----- helpers
+
+    def __next_id(self) -> int:
+        return next(self.__ids)
+
+    def __new_test_case(self, product_id: int, test_case_id: int, name: str, test_case_type: str,
+                        user_story_id: Union[int, None]) -> dict:
+        return {
+            'id': test_case_id,
+            'productId': product_id,
+            'name': name,
+            'testCaseType': test_case_type,
+            'description': {
+                'text': ""
+            },
+            'automation': {
+                'externalId': ""
+            },
+            'isAutomated': False,
+            'toBeReviewed': False,
+            'userStoryId': user_story_id,
+            'customFields': [],
+            'attachments': [],
+            'testSequence': {
+                'testStepBlocks': []
+            },
+            'executions': [],
+        }
+
+    def __new_test_step(self,
+                        test_step_type: str,
+                        description: str,
+                        keyword_id: Union[str, None] = None,
+                        values: Union[Dict[str, str], None] = None) -> dict:
+        # Test Steps are created with the type "keyword" or "TestStep", but read as "Keyword" or "TestStep"
+        step = {'id': self.__next_id(), 'testStepType': test_step_type[:1].upper() + test_step_type[1:],
+                'description': description}
+        if keyword_id:
+            step['keywordId'] = keyword_id
+            step['parameterValues'] = dict(values or {})
+        return step
+
+    def __new_session(self, product_id: int, name: str) -> int:
+        session_id = self.__next_id()
+        self.products[product_id]['sessions'][session_id] = {
+            'testSessionId': session_id,
+            'name': name,
+            'status': "Planned",
+            'responsibles': [],
+            'participants': [],
+            'testCaseExecutions': []
+        }
+        return session_id
+
+    def __new_execution(self, product_id: int, test_case_id: int, ddt_table_ids: Union[dict, None]) -> int:
+        product = self.products[product_id]
+        test_case = product['test_cases'][test_case_id]
+        execution_id = self.__next_id()
+        product['executions'][execution_id] = {
+            'executionId': execution_id,
+            'testCaseId': test_case_id,
+            'ddtTableIds': ddt_table_ids,
+            'executionResult': None,
+            'testSteps': {},
+            'files': []
+        }
+        test_case['executions'].append({'executionId': execution_id})
+        return execution_id
+
+    def __new_keyword(self, product_id: int, variables: dict) -> str:
+        keyword_id = f"{self.__next_id():024x}"
+        keyword = {
+            'id': keyword_id,
+            'name': "",
+            'description': "",
+            'library': "",
+            'parameters': [],
+            'originalText': "",
+            'isImplemented': False
+        }
+        keyword.update(variables)
+        self.products[product_id]['keywords'][keyword_id] = keyword
+        return keyword_id
+
+    def __new_keyword_param(self, product_id: int, keyword_id: str, variables: dict) -> str:
+        param_id = f"{self.__next_id():024x}"
+        self.products[product_id]['keywords'][keyword_id]['parameters'].append({
+            'id': param_id,
+            'name': variables.get('paramName', ""),
+            'description': variables.get('paramDescription', "")
+        })
+        self.products[product_id]['keyword_params'][param_id] = keyword_id
+        return param_id
+
+    def __get_test_case_ids(self, product_id: int, test_case_ids: Iterable[int]) -> List[Tuple[int, dict]]:
+        # ids of the executable items of the Test Cases: each row of their DDT tables or the Test Case itself
+        tables: Dict[int, List[dict]] = {}
+        for table in self.products[product_id]['ddt_tables'].values():
+            tables.setdefault(table['testCaseId'], []).append(table)
+        result = []
+        for test_case_id in test_case_ids:
+            if test_case_id not in tables:
+                result.append((test_case_id, {'testCaseId': test_case_id, 'ddtTableIds': None}))
+            for table in tables.get(test_case_id, []):
+                for row in table['rowData']:
+                    result.append((test_case_id, {
+                        'testCaseId': test_case_id,
+                        'ddtTableIds': {
+                            'tableId': table['id'],
+                            'rowId': row['id']
+                        }
+                    }))
+        return result
+
+    def __find_step(self, test_case: dict, step_id: int) -> Tuple[dict, dict]:
+        for block in test_case['testSequence']['testStepBlocks']:
+            for step in block['steps']:
+                if step['id'] == step_id:
+                    return block, step
+        raise KeyError(f"Test Step {step_id}")
+
+    def __find_block(self, test_case: dict, block_id: int) -> dict:
+        for block in test_case['testSequence']['testStepBlocks']:
+            if block['id'] == block_id:
+                return block
+        raise KeyError(f"Test Step Block {block_id}")
+
+    @staticmethod
+    def __summary(test_case: dict) -> dict:
+        return {
+            'id': test_case['id'],
+            'name': test_case['name'],
+            'testCaseType': test_case['testCaseType'],
+            'externalId': test_case['automation']['externalId'],
+            'isAutomated': test_case['isAutomated']
+        }
+
+    # ----- REST routes
+
+    def __login(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        credentials = (body.get('tenantName'), body.get('login'), body.get('password'))
+        if credentials != (self.workspace, self.login, self.password):
+            return FakeResponse(401, {'message': "Invalid credentials"})
+        session_token = f"fake-{self.__next_id()}"
+        self.__session_tokens.add(session_token)
+        return FakeResponse(201, {'tenantId': self.tenant_id, 'userId': self.user_id, 'sessionToken': session_token})
+
+    def __get_server(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, {'version': "fake", 'workspace': self.workspace})
+
+    def __get_products(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, [{'id': product['id'], 'name': product['name']} for product in self.products.values()])
+
+    def __get_suites(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        suites = self.products[params['product']]['suites'].values()
+        return FakeResponse(200, [{
+            'testSuiteId': suite['testSuiteId'],
+            'name': suite['name'],
+            'status': suite['status']
+        } for suite in suites])
+
+    def __post_suite(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        suite_id = self.__next_id()
+        self.products[params['product']]['suites'][suite_id] = {
+            'testSuiteId': suite_id,
+            'name': body['name'],
+            'status': "Planned",
+            'responsibles': [],
+            'testCases': []
+        }
+        return FakeResponse(201, {'testSuiteId': suite_id})
+
+    def __get_suite(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, copy.deepcopy(self.products[params['product']]['suites'][params['suite']]))
+
+    def __patch_suite(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['suites'][params['suite']].update(body)
+        return FakeResponse(200, {})
+
+    def __get_sessions(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        sessions = self.products[params['product']]['sessions'].values()
+        return FakeResponse(200, [{
+            'testSessionId': session['testSessionId'],
+            'name': session['name'],
+            'status': session['status']
+        } for session in sessions])
+
+    def __post_session(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        return FakeResponse(201, {'testSessionId': self.__new_session(params['product'], body['name'])})
+
+    def __get_session(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, copy.deepcopy(self.products[params['product']]['sessions'][params['session']]))
+
+    def __patch_session(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        session = self.products[params['product']]['sessions'][params['session']]
+        for key, value in body.items():
+            if key == 'addParticipants':
+                session['participants'] += [{'userId': int(user_id)} for user_id in value]
+            elif key == 'responsibles':
+                session['responsibles'] = [int(user_id) for user_id in value]
+            else:
+                session[key] = value
+        return FakeResponse(200, {})
+
+    def __delete_session(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        del self.products[params['product']]['sessions'][params['session']]
+        return FakeResponse(200, {})
+
+    def __join_session(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        session = self.products[params['product']]['sessions'][params['session']]
+        if self.user_id not in [participant['userId'] for participant in session['participants']]:
+            session['participants'].append({'userId': self.user_id})
+        return FakeResponse(200, {})
+
+    def __add_executions(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        product = self.products[params['product']]
+        session = product['sessions'][params['session']]
+        for execution in body.get('addExecutions', []):
+            ddt_table_ids = product['executions'][int(execution['executionId'])]['ddtTableIds']
+            session['testCaseExecutions'].append({
+                'testCaseIds': dict(execution['testCaseIds'], ddtTableIds=ddt_table_ids),
+                'executionId': int(execution['executionId'])
+            })
+        return FakeResponse(200, {})
+
+    def __get_test_cases(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        test_cases = self.products[params['product']]['test_cases'].values()
+        if 'fieldValue' not in query:
+            return FakeResponse(200, [self.__summary(test_case) for test_case in test_cases])
+
+        field, _, filter = query['fieldValue'].partition(':')
+        operator, _, value = filter.partition(':')
+        if operator != "equals" or field not in ('title', 'externalId'):
+            return FakeResponse(400, {'message': f"Unsupported filter {query['fieldValue']}"})
+        return FakeResponse(200, [
+            self.__summary(test_case) for test_case in test_cases
+            if (test_case['name'] if field == 'title' else test_case['automation']['externalId']) == value
+        ])
+
+    def __post_test_case(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        test_case_id = self.__next_id()
+        test_case = self.__new_test_case(params['product'], test_case_id, body['name'],
+                                         body.get('testCaseType', "StructuredTestCase"), body.get('userStoryId'))
+        for title in body.get('customTestSequenceTitles', []):
+            test_case['testSequence']['testStepBlocks'].append({'id': self.__next_id(), 'title': title, 'steps': []})
+        self.products[params['product']]['test_cases'][test_case_id] = test_case
+        self.__patch_test_case(dict(params, test_case=test_case_id), query, body, headers)
+        return FakeResponse(201, {'testCaseId': test_case_id})
+
+    def __get_test_case(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, copy.deepcopy(self.products[params['product']]['test_cases'][params['test_case']]))
+
+    def __patch_test_case(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        for key, value in body.items():
+            if key == 'externalId':
+                test_case['automation']['externalId'] = value['value']
+            elif key == 'customFields':
+                values = {field['customFieldId']: field for field in test_case['customFields']}
+                for field in value:
+                    values[field['customFieldId']] = dict(field)
+                test_case['customFields'] = list(values.values())
+            elif key in ('name', 'description', 'isAutomated', 'toBeReviewed', 'userStoryId'):
+                test_case[key] = value
+        return FakeResponse(200, {})
+
+    def __get_concrete_test_case(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        product = self.products[params['product']]
+        table = product['ddt_tables'][params['table']]
+        columns = {column['id']: column['name'] for column in table['columnsMetaData']}
+        row = [row for row in table['rowData'] if row['id'] == params['row']][0]
+        values = {"${" + columns[entry['columnId']] + "}": entry['value'] for entry in row['data']}
+
+        def expand(item: Any) -> Any:
+            if isinstance(item, dict):
+                return {key: expand(value) for key, value in item.items()}
+            if isinstance(item, list):
+                return [expand(value) for value in item]
+            if isinstance(item, str):
+                return re.sub(r"\$\{[^}]*\}",
+                              lambda match: DDT_VALUE_MARKER + values[match.group(0)] + DDT_VALUE_MARKER
+                              if match.group(0) in values else match.group(0), item)
+            return item
+
+        return FakeResponse(200, expand(product['test_cases'][params['test_case']]))
+
+    def __post_test_step_block(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        blocks = self.products[params['product']]['test_cases'][params['test_case']]['testSequence']['testStepBlocks']
+        block = {'id': self.__next_id(), 'title': body['title'], 'steps': []}
+        blocks.insert(body.get('position', len(blocks)), block)
+        return FakeResponse(201, {'testStepBlockId': block['id']})
+
+    def __patch_test_step_block(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        block = self.__find_block(test_case, params['block'])
+        block['title'] = body.get('title', block['title'])
+        if 'position' in body:
+            test_case['testSequence']['testStepBlocks'].remove(block)
+            test_case['testSequence']['testStepBlocks'].insert(body['position'], block)
+        return FakeResponse(200, {})
+
+    def __delete_test_step_block(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        test_case['testSequence']['testStepBlocks'].remove(self.__find_block(test_case, params['block']))
+        return FakeResponse(200, {})
+
+    def __post_test_step(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        block = self.__find_block(test_case, int(body['testStepBlockId']))
+        step = self.__new_test_step(body['testStepType'], body.get('description', ""), body.get('keywordId'))
+        # position: 1-based position of the new step in the block (see TbcsApi.add_test_step)
+        block['steps'].insert(body['position'] - 1 if 'position' in body else len(block['steps']), step)
+        return FakeResponse(201, {'testStepId': step['id']})
+
+    def __patch_test_step(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        self.__find_step(test_case, params['step'])[1]['description'] = body['description']
+        return FakeResponse(200, {})
+
+    def __delete_test_step(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        test_case = self.products[params['product']]['test_cases'][params['test_case']]
+        block, step = self.__find_step(test_case, params['step'])
+        block['steps'].remove(step)
+        return FakeResponse(200, {})
+
+    def __post_execution(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        ddt_table_ids = {'tableId': params['table'], 'rowId': params['row']} if 'table' in params else None
+        if ddt_table_ids != None:
+            self.products[params['product']]['ddt_tables'][params['table']]  # the table must exist
+        return FakeResponse(201, {
+            'executionId': self.__new_execution(params['product'], params['test_case'], ddt_table_ids)
+        })
+
+    def __patch_execution(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['executions'][params['execution']].update(body)
+        return FakeResponse(204)
+
+    def __patch_step_result(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        execution = self.products[params['product']]['executions'][params['execution']]
+        execution['testSteps'][params['step']] = body
+        return FakeResponse(204)
+
+    def __get_ddt_table(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, copy.deepcopy(self.products[params['product']]['ddt_tables'][params['table']]))
+
+    def __post_ddt_table(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['test_cases'][params['test_case']]  # the Test Case must exist
+        table_id = self.__next_id()
+        self.products[params['product']]['ddt_tables'][table_id] = {
+            'id': table_id,
+            'testCaseId': params['test_case'],
+            'name': body.get('name', ""),
+            'columnsMetaData': [],
+            'rowData': []
+        }
+        return FakeResponse(201, {'tableId': table_id})
+
+    def __patch_ddt_table(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        # adds a column, e.g. {'addColumn': {'name': <name>}} or {'name': <name>}
+        table = self.products[params['product']]['ddt_tables'][params['table']]
+        column = body.get('addColumn', body)
+        column_id = self.__next_id()
+        table['columnsMetaData'].append({'id': column_id, 'name': column.get('name', "")})
+        for row in table['rowData']:
+            row['data'].append({'columnId': column_id, 'value': ""})
+        return FakeResponse(200, {'columnId': column_id})
+
+    def __post_ddt_row(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        table = self.products[params['product']]['ddt_tables'][params['table']]
+        row = {'id': self.__next_id(), 'data': [{'columnId': column['id'], 'value': ""}
+                                                for column in table['columnsMetaData']]}
+        table['rowData'].append(row)
+        return FakeResponse(201, {'rowId': row['id']})
+
+    def __patch_ddt_row(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        # sets values, e.g. {'data': [{'columnId': <id>, 'value': <value>}, ...]}
+        table = self.products[params['product']]['ddt_tables'][params['table']]
+        row = [row for row in table['rowData'] if row['id'] == params['row']][0]
+        values = {int(entry['columnId']): entry['value'] for entry in body.get('data', [])}
+        for entry in row['data']:
+            entry['value'] = values.get(entry['columnId'], entry['value'])
+        return FakeResponse(204)
+
+    def __download_file(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, self.products[params['product']]['files'][int(query.get('fileIds', 0))]['content'])
+
+    def __upload_file(self, params: dict, query: dict, body: bytes, headers: dict) -> FakeResponse:
+        match = _MULTIPART_FILE_PATTERN.search(body)
+        boundary = headers.get('Content-Type', "").partition("boundary=")[2]
+        if match == None or boundary == "":
+            return FakeResponse(400, {'message': "No file in the request"})
+        content = body[match.end():body.rindex(b"\r\n--" + boundary.encode())]
+        name = match.group(1).decode('utf-8')
+
+        if query.get('element') == "Execution":
+            execution = self.products[params['product']]['executions'][int(query['executionId'])]
+            file_id = self.add_file(params['product'], name, content)
+            execution['files'].append(file_id)
+        elif query.get('element') == "TestCase":
+            file_id = self.add_file(params['product'], name, content, int(query['elementId']))
+        else:
+            return FakeResponse(400, {'message': f"Unsupported element {query.get('element')}"})
+        return FakeResponse(201, {'fileId': file_id, 'name': name, 'size': len(content)})
+
+    def __get_custom_field_containers(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        containers: Dict[str, List[dict]] = {}
+        for (container, anchor), block_ids in self.custom_field_containers.items():
+            containers.setdefault(container, []).append({'anchor': anchor, 'blockIds': list(block_ids)})
+        return FakeResponse(200, [{
+            'containerType': container,
+            'customBlocks': blocks
+        } for container, blocks in containers.items()])
+
+    def __put_custom_field_container(self, params: dict, query: dict, body: list, headers: dict) -> FakeResponse:
+        self.custom_field_containers[(params['container'], params['anchor'])] = list(body)
+        return FakeResponse(200, {})
+
+    def __get_custom_fields(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, [dict(custom_field) for custom_field in self.custom_fields.values()])
+
+    def __post_custom_field(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        custom_field_id = self.__next_id()
+        self.custom_fields[custom_field_id] = dict(body, id=custom_field_id)
+        return FakeResponse(201, {'customFieldId': custom_field_id})
+
+    def __get_custom_field_blocks(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, copy.deepcopy(list(self.custom_field_blocks.values())))
+
+    def __post_custom_field_block(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        block_id = self.__next_id()
+        self.custom_field_blocks[block_id] = {
+            'id': block_id,
+            'name': body['name'],
+            'productIds': body.get('productIds', []),
+            'customFieldIds': body.get('customFieldIds', [])
+        }
+        return FakeResponse(201, {'blockId': block_id})
+
+    def __patch_custom_field_block(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.custom_field_blocks[params['block']].update(body)
+        return FakeResponse(200, {})
+
+    def __post_defect(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        defect_id = self.__next_id()
+        self.products[params['product']]['defects'][defect_id] = dict(body, id=defect_id, assignments=[])
+        return FakeResponse(201, {'defectId': defect_id})
+
+    def __assign_defect(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['defects'][int(body['defectId'])]['assignments'].append(body)
+        return FakeResponse(200, {})
+
+    def __post_epic(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        epic_id = self.__next_id()
+        self.products[params['product']]['epics'][epic_id] = dict(body, id=epic_id)
+        return FakeResponse(201, {'epicId': epic_id})
+
+    def __patch_epic(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['epics'][params['epic']].update(body)
+        return FakeResponse(200, {})
+
+    def __post_user_story(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        user_story_id = self.__next_id()
+        self.products[params['product']]['user_stories'][user_story_id] = dict(body, id=user_story_id)
+        return FakeResponse(201, {'userStoryId': user_story_id})
+
+    def __get_user_story(self, params: dict, query: dict, body: Any, headers: dict) -> FakeResponse:
+        return FakeResponse(200, dict(self.products[params['product']]['user_stories'][params['user_story']]))
+
+    def __patch_user_story(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        self.products[params['product']]['user_stories'][params['user_story']].update(body)
+        return FakeResponse(200, {})
+
+    # ----- GraphQL operations (/api/kdt/)
+
+    @staticmethod
+    def __get_operation(operation: str, query: Dict[str, str], payload: Any) -> str:
+        # operations of TbcsApi sharing a route
+        if operation == "get_all_test_cases" and 'fieldValue' in query:
+            return "get_test_case_by_filter"
+        if operation == "upload_file":
+            return "upload_file_to_test_case" if query.get('element') == "TestCase" else "upload_file_to_execution"
+        if operation == "graphql":
+            text = payload.get('query', "") if isinstance(payload, dict) else ""
+            for match in _GQL_NAME_PATTERN.finditer(text):
+                if match.group(1) in _GQL_OPERATIONS:
+                    return _GQL_OPERATIONS[match.group(1)]
+            return "unknown"
+        return operation
+
+    def __graphql(self, params: dict, query: dict, body: dict, headers: dict) -> FakeResponse:
+        # The queries of TbcsApi contain the ids as literals, values are passed as variables.
+        text = body.get('query', "")
+        variables = body.get('variables') or {}
+        name = next((match.group(1) for match in _GQL_NAME_PATTERN.finditer(text) if match.group(1) in _GQL_OPERATIONS),
+                    "")
+        ids: Dict[str, str] = {}
+        for match in _GQL_IDS_PATTERN.finditer(text):
+            ids.update(_GQL_ID_PATTERN.findall(match.group(2)))
+        if int(ids.get('tenantId', 0)) != self.tenant_id or int(ids.get('productId', 0)) not in self.products:
+            return FakeResponse(200, {'data': {name: None}, 'errors': [{'message': "Unknown tenant or product"}]})
+        product_id = int(ids['productId'])
+        product = self.products[product_id]
+
+        try:
+            if name == 'createKeyword':
+                data: Any = {'id': self.__new_keyword(product_id, variables)}
+            elif name == 'updateKeyword':
+                product['keywords'][ids['keywordId']].update(variables)
+                data = {'_id': ids['keywordId']}
+            elif name == 'updateKeywordParameter':
+                parameters = product['keywords'][product['keyword_params'][ids['paramId']]]['parameters']
+                parameter = [parameter for parameter in parameters if parameter['id'] == ids['paramId']][0]
+                parameter['name'] = variables.get('paramName', parameter['name'])
+                parameter['description'] = variables.get('paramDescription', parameter['description'])
+                data = {'_id': ids['paramId']}
+            elif name == 'createKeywordParam':
+                data = {'id': self.__new_keyword_param(product_id, ids['keywordId'], variables)}
+            elif name == 'deleteKeywordParameter':
+                keyword = product['keywords'][product['keyword_params'].pop(ids['paramId'])]
+                keyword['parameters'] = [param for param in keyword['parameters'] if param['id'] != ids['paramId']]
+                data = {'_id': ids['paramId']}
+            elif name == 'getKeywords':
+                data = copy.deepcopy(list(product['keywords'].values()))
+            elif name == 'getKeyword':
+                data = copy.deepcopy(product['keywords'][ids['keywordId']])
+            elif name == 'getKeywordParametersAndValues':
+                step = self.__find_step(product['test_cases'][int(ids['testCaseId'])], int(ids['testStepId']))[1]
+                data = {'value': step.get('parameterValues', {}).get(ids['paramId'], "")}
+            elif name == 'deleteKeyword':
+                del product['keywords'][ids['keywordId']]
+                data = {'_id': ids['keywordId']}
+            elif name == 'addKeywordUsage':
+                step = self.__find_step(product['test_cases'][int(ids['testCaseId'])], int(ids['testStepId']))[1]
+                step['keywordId'] = ids['keywordId']
+                step.setdefault('parameterValues', {})
+                data = {'keywordId': ids['keywordId']}
+            elif name == 'upsertKeywordParamValue':
+                match = _GQL_TEXT_PATTERN.search(text)
+                step = self.__find_step(product['test_cases'][int(ids['testCaseId'])], int(ids['testStepId']))[1]
+                step.setdefault('parameterValues', {})[ids['paramId']] = match.group(1) if match != None else ""
+                data = {'paramValue': step['parameterValues'][ids['paramId']]}
+            else:
+                return FakeResponse(400, {'errors': [{'message': "Unsupported GraphQL operation"}]})
+        except (KeyError, ValueError, IndexError) as e:
+            return FakeResponse(200, {'data': {name: None}, 'errors': [{'message': f"Not found: {e.__str__()}"}]})
+        return FakeResponse(200, {'data': {name: data}})
+
+
+def generate_workspace(fake: FakeTbcs,
+                       products: int = 1,
+                       test_cases: int = 100,
+                       steps: int = 5,
+                       keywords: int = 0,
+                       ddt_tables: int = 0,
+                       ddt_rows: int = 5,
+                       attachments: int = 0,
+                       attachment_size: int = 1024,
+                       suites: int = 1,
+                       sessions: int = 0,
+                       suite_size: int = 0,
+                       custom_fields: Union[Dict[str, str], None] = None,
+                       seed: int = 0) -> Dict[int, List[int]]:
+    """
+    Fills a fake workspace with synthetic content, e.g. 50 products with 10000 Test Cases and 20000 Keywords.
+
+    Parameters
+    ----------
+    fake: FakeTbcs
+        The fake workspace
+
+    products: int
+        Number of products ("Product 1", ...)
+
+    test_cases: int
+        Number of Test Cases of all products, spread evenly (each with the blocks "Setup", "Test Steps", "Teardown")
+
+    steps: int
+        Number of Test Steps in the block "Test Steps" of each Test Case
+
+    keywords: int
+        Number of Keywords of all products, spread evenly; if there are Keywords, the Test Steps use them (with up
+        to 3 parameters), otherwise they are text steps
+
+    ddt_tables: int
+        Number of Test Cases (of all products) with a DDT table, the first Test Cases of each product get one
+
+    ddt_rows: int
+        Number of rows of each DDT table
+
+    attachments: int
+        Number of attachments of each Test Case
+
+    attachment_size: int
+        Size of each attachment in bytes
+
+    suites: int
+        Number of active Test Suites of each product (with the user as responsible)
+
+    sessions: int
+        Number of ready Test Sessions of each product (with the user as participant)
+
+    suite_size: int
+        Number of Test Cases of each Test Suite and Test Session; 0: all Test Cases of the product
+
+    custom_fields: Dict[str, str] | None
+        Custom fields of all Test Cases (name => value), e.g. the adapter and "Parallel"
+
+    seed: int
+        Seed of the random content
+
+    Returns
+    -------
+    Dict[int, List[int]]
+        Id of each product => ids of its Test Cases
+    """
+    generator = random.Random(seed)
+    result: Dict[int, List[int]] = {}
+    for product_index in range(products):
+        product_id = fake.add_product(f"Product {product_index + 1}")
+        share = lambda total: total // products + (1 if product_index < total % products else 0)
+
+        keyword_ids = []
+        keyword_params: Dict[str, List[str]] = {}
+        for index in range(share(keywords)):
+            params = [f"arg{param}" for param in range(generator.randint(0, 3))]
+            keyword_id = fake.add_keyword(product_id, f"Keyword {product_index + 1}-{index + 1}", params, "Library")
+            keyword_ids.append(keyword_id)
+            keyword_params[keyword_id] = [param['id'] for param in fake.products[product_id]['keywords'][keyword_id]
+                                          ['parameters']]
+
+        test_case_ids = []
+        for index in range(share(test_cases)):
+            ddt = index < share(ddt_tables)
+            columns = [f"column{column}" for column in range(3)] if ddt else []
+            test_steps: List[Union[str, dict]] = []
+            for step in range(steps):
+                value = "${" + columns[step % len(columns)] + "}" if ddt else f"value {step}"
+                if keyword_ids:
+                    keyword_id = generator.choice(keyword_ids)
+                    values = {param_id: value for param_id in keyword_params[keyword_id]}
+                    keyword_name = fake.products[product_id]['keywords'][keyword_id]['name']
+                    test_steps.append({
+                        'keywordId': keyword_id,
+                        'description': "    ".join([keyword_name] + list(values.values())),
+                        'values': values
+                    })
+                else:
+                    test_steps.append(f"Step {step + 1} with {value}")
+
+            name = f"Test Case {product_index + 1}-{index + 1}"
+            test_case_id = fake.add_test_case(product_id, name, {
+                "Setup": [],
+                "Test Steps": test_steps,
+                "Teardown": []
+            }, f"TC-{product_index + 1}-{index + 1}", custom_fields)
+            if ddt:
+                fake.add_ddt_table(product_id, test_case_id, columns,
+                                   [[f"{column} row {row + 1}" for column in columns] for row in range(ddt_rows)])
+            for attachment in range(attachments):
+                content = generator.getrandbits(8 * attachment_size).to_bytes(attachment_size, 'little')
+                fake.add_file(product_id, f"attachment{attachment + 1}.bin", content, test_case_id)
+            test_case_ids.append(test_case_id)
+
+        members = test_case_ids[:suite_size] if suite_size > 0 else test_case_ids
+        for index in range(suites):
+            fake.add_suite(product_id, f"Test Suite {product_index + 1}-{index + 1}", members)
+        for index in range(sessions):
+            fake.add_session(product_id, f"Test Session {product_index + 1}-{index + 1}", members)
+        result[product_id] = test_case_ids
+    return result
+
+
+class _FakeTbcsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def __handle(self) -> None:
+        if self.headers.get('Transfer-Encoding', "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        response = self.server.fake.handle(self.command, self.path, dict(self.headers.items()), body)  # type: ignore
+        if isinstance(response.body, bytes):
+            content, content_type = response.body, 'application/octet-stream'
+        elif response.body != None:
+            content, content_type = json.dumps(response.body).encode('utf-8'), 'application/json'
+        else:
+            content, content_type = b"", ""
+        self.send_response(response.status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = __handle
+
+    def log_message(self, format, *args):
+        # requests are not logged
+        pass
+
+
+class FakeTbcsServer:
+    """
+    Serves a fake workspace (see FakeTbcs) at http://<host>:<port> in a background thread. Use url as TBCS_BASE and
+    the workspace, login and password of the fake as account.
+    """
+
+    def __init__(self, fake: FakeTbcs, host: str = "127.0.0.1", port: int = 0):
+        """
+        Starts the server.
+
+        Parameters
+        ----------
+        fake: FakeTbcs
+            The fake workspace
+
+        host: str
+            Address to listen on, e.g. "127.0.0.1" (local only) or "0.0.0.0"
+
+        port: int
+            Port to listen on; 0: any free port
+        """
+        self.fake = fake
+        self.__server = ThreadingHTTPServer((host, port), _FakeTbcsHandler)
+        self.__server.daemon_threads = True
+        self.__server.fake = fake  # type: ignore
+        self.port = self.__server.server_address[1]
+        self.url = f"http://{host}:{self.port}"
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="fake-tbcs-server", daemon=True)
+        self.__thread.start()
+
+    def get_account(self) -> Dict[str, str]:
+        """
+        Returns the account for the fake workspace (see config.ACCOUNT).
+        """
+        return {
+            "TBCS_BASE": self.url,
+            "WORKSPACE": self.fake.workspace,
+            "LOGIN": self.fake.login,
+            "PASSWORD": self.fake.password,
+        }
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import os
+from logging import Logger
+from typing import Any, Dict, Union
+
+
+class ImportManifest():
+    """
+    Local manifest of already imported source files and items (Test Cases, Keywords, ...).
+
+    For each source file and each item within it the manifest stores a content hash and the ids of the elements
+    created in TestBench CS. Importers use it to skip unchanged files and items without any call to TestBench CS.
+
+    Entries are kept per scope (server, workspace, product and importer), so the same manifest file can be used for
+    several products or workspaces.
+    """
+
+    VERSION = 1
+
+    def __init__(self, logger: Logger, path: str, scope: str, enabled: bool = True):
+        """
+        Initializes the manifest and loads existing entries from disk.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger instance
+
+        path: str
+            Path of the manifest file
+
+        scope: str
+            Scope of the entries, e.g. "<server>/<workspace>/<product id>/<importer>"
+
+        enabled: bool
+            If False, nothing is read and every file and item is reported as changed (entries are still recorded)
+        """
+        self.__logger = logger
+        self.__path = path
+        self.__scope = scope
+        self.__data: Dict[str, Any] = {'version': self.VERSION, 'scopes': {}}
+
+        if enabled and path and os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == self.VERSION:
+                    self.__data = data
+                else:
+                    logger.info(f"Import manifest '{path}' has an outdated format and is ignored")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read import manifest '{path}' - importing everything\n\t{e.__str__()}")
+
+        if not enabled:
+            # keep entries of other scopes, but forget this one
+            self.__data['scopes'].pop(scope, None)
+
+        self.__entries: Dict[str, dict] = self.__data['scopes'].setdefault(scope, {})
+
+    @staticmethod
+    def __key(source: str, item: str = "") -> str:
+        key = os.path.abspath(source) if source else ""
+        if item:
+            key += "::" + item
+        return key
+
+    def is_unchanged(self, source: str, content_hash: str, item: str = "") -> bool:
+        """
+        Checks if a source file (or an item within it) has already been imported with the same content.
+
+        Parameters
+        ----------
+        source: str
+            Path of the source file (or another unique name of the source)
+
+        content_hash: str
+            Hash of the current content, see hash_file() and hash_content()
+
+        item: str
+            (optional) Name of an item within the source, e.g. a Test Case name
+
+        Returns
+        -------
+        bool
+            True if the stored hash equals the given one
+        """
+        entry = self.__entries.get(self.__key(source, item))
+        return entry is not None and entry['hash'] == content_hash
+
+    def get_ids(self, source: str, item: str = "") -> dict:
+        """
+        Returns the TestBench CS ids stored for a source file or item.
+
+        Parameters
+        ----------
+        source: str
+            Path of the source file (or another unique name of the source)
+
+        item: str
+            (optional) Name of an item within the source
+
+        Returns
+        -------
+        dict
+            Stored ids, e.g. {'testCaseId': '42'}; empty if nothing has been stored
+        """
+        entry = self.__entries.get(self.__key(source, item))
+        if entry is None:
+            return {}
+        return entry['ids']
+
+    def update(self, source: str, content_hash: str, item: str = "", ids: Union[dict, None] = None) -> None:
+        """
+        Records a successfully imported source file or item.
+
+        Parameters
+        ----------
+        source: str
+            Path of the source file (or another unique name of the source)
+
+        content_hash: str
+            Hash of the imported content
+
+        item: str
+            (optional) Name of an item within the source
+
+        ids: dict
+            (optional) TestBench CS ids of the created or updated elements, e.g. {'testCaseId': '42'}
+        """
+        self.__entries[self.__key(source, item)] = {'hash': content_hash, 'ids': ids or {}}
+
+    def remove(self, source: str, item: str = "") -> None:
+        """
+        Forgets a source file or item, so it is imported again on the next run.
+
+        Parameters
+        ----------
+        source: str
+            Path of the source file (or another unique name of the source)
+
+        item: str
+            (optional) Name of an item within the source
+        """
+        self.__entries.pop(self.__key(source, item), None)
+
+    def save(self) -> None:
+        """
+        Writes the manifest to disk (atomically, so an interrupted import never leaves a broken file).
+        """
+        if not self.__path:
+            return
+
+        tmp_path = self.__path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.__data, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.__path)
+            self.__logger.debug(f"Import manifest written to '{self.__path}'")
+        except OSError as e:
+            self.__logger.warning(f"Could not write import manifest '{self.__path}'\n\t{e.__str__()}")
+
+
+def add_manifest_args(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the command line flags controlling the import manifest to an importer.
+
+    Parameters
+    ----------
+    parser: ArgumentParser
+        Instance of an argument parser
+    """
+    parser.add_argument('-f',
+                        '--full',
+                        dest='full',
+                        action='store_const',
+                        const=True,
+                        default=False,
+                        help='ignore the import manifest and import all files and items again')
+
+
+def get_manifest(logger: Logger, path: str, account: dict, product_id: str, importer: str,
+                 full: bool = False) -> ImportManifest:
+    """
+    Creates the import manifest for an importer and a product.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    path: str
+        Path of the manifest file (config.IMPORT_MANIFEST); an empty string disables incremental imports
+
+    account: dict
+        Dictionary that contains TestBench CS account information (TBCS_BASE, WORKSPACE)
+
+    product_id: str
+        Id of the product the import writes to
+
+    importer: str
+        Name of the importer, e.g. "import_tc_rf"
+
+    full: bool
+        If True, all stored entries of this importer and product are ignored
+
+    Returns
+    -------
+    ImportManifest
+        The manifest instance
+    """
+    scope = f"{account['TBCS_BASE']}/{account['WORKSPACE']}/{product_id}/{importer}"
+    if path and not full:
+        logger.info(f"Using import manifest '{path}' - unchanged files and items are skipped")
+    return ImportManifest(logger, path, scope, enabled=not full)
+
+
+def hash_file(path: str) -> str:
+    """
+    Computes the content hash of a file.
+
+    Parameters
+    ----------
+    path: str
+        Path of the file
+
+    Returns
+    -------
+    str
+        Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_content(content: Any) -> str:
+    """
+    Computes the content hash of any JSON serializable object.
+
+    Parameters
+    ----------
+    content: Any
+        Object to be hashed, e.g. a dictionary describing a Test Case
+
+    Returns
+    -------
+    str
+        Hex digest of the canonical JSON representation
+    """
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
@@ -0,0 +1,523 @@
+import json
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Logger
+from typing import Dict, List, Tuple, Union
+
+# Upper bounds (seconds) of the buckets of latency histograms, the last bucket (+Inf) is implicit
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds (seconds) of the buckets of histograms of test and poll cycle durations
+DURATION_BUCKETS: Tuple[float, ...] = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _histogram_lines(name: str, labels: str, bounds: Tuple[float, ...], buckets: List[int], total: float,
+                     count: int) -> List[str]:
+    # Lines of a histogram in the text format of Prometheus (labels: 'name="value",...' or "")
+    lines = []
+    cumulative = 0
+    for bound, value in zip([str(bound) for bound in bounds] + ['+Inf'], buckets):
+        cumulative += value
+        lines.append(f'{name}_bucket{{{labels + "," if labels else ""}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {total}' if labels else f'{name}_sum {total}')
+    lines.append(f'{name}_count{{{labels}}} {count}' if labels else f'{name}_count {count}')
+    return lines
+
+
+class OperationMetrics:
+    """
+    Metrics of one logical operation (e.g. "get_test_case"): number of calls, failed calls, latency histogram,
+    transferred bytes and status codes.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.status_codes: Dict[str, int] = {}
+
+    def add(self, duration: float, status: str, bytes_out: int = 0, bytes_in: int = 0) -> None:
+        """
+        Adds a call of the operation.
+
+        Parameters
+        ----------
+        duration: float
+            Duration of the call in seconds
+
+        status: str
+            Status code of the response, "error" if there was no response (e.g. connection errors)
+
+        bytes_out: int
+            Size of the request body
+
+        bytes_in: int
+            Size of the response body
+        """
+        self.count += 1
+        if not status.startswith('2'):
+            self.errors += 1
+        self.duration += duration
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+    def copy(self) -> 'OperationMetrics':
+        metrics = OperationMetrics()
+        metrics.merge(self)
+        return metrics
+
+    def merge(self, other: 'OperationMetrics', sign: int = 1) -> None:
+        """
+        Adds (sign = 1) or subtracts (sign = -1) the metrics of another instance.
+        """
+        self.count += sign * other.count
+        self.errors += sign * other.errors
+        self.duration += sign * other.duration
+        self.buckets = [own + sign * value for own, value in zip(self.buckets, other.buckets)]
+        self.bytes_out += sign * other.bytes_out
+        self.bytes_in += sign * other.bytes_in
+        for status, count in other.status_codes.items():
+            self.status_codes[status] = self.status_codes.get(status, 0) + sign * count
+            if self.status_codes[status] == 0:
+                del self.status_codes[status]
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns an estimate of a quantile of the latency (upper bound of the bucket containing it).
+        """
+        rank = q * self.count
+        total = 0
+        for index, value in enumerate(self.buckets):
+            total += value
+            if total >= rank and value > 0:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float('inf')
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'duration': self.duration,
+            'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], self.buckets)),
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'status_codes': dict(self.status_codes)
+        }
+
+
+class MetricsRegistry:
+    """
+    Collects metrics per logical operation, safe to be used by several threads.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__operations: Dict[str, OperationMetrics] = {}
+
+    def record(self, operation: str, duration: float, status: str, bytes_out: int = 0, bytes_in: int = 0) -> None:
+        """
+        Records a call of an operation, see OperationMetrics.add().
+        """
+        with self.__lock:
+            if operation not in self.__operations:
+                self.__operations[operation] = OperationMetrics()
+            self.__operations[operation].add(duration, status, bytes_out, bytes_in)
+
+    def snapshot(self) -> Dict[str, OperationMetrics]:
+        """
+        Returns a copy of the metrics collected so far (operation => metrics).
+        """
+        with self.__lock:
+            return {operation: metrics.copy() for operation, metrics in self.__operations.items()}
+
+
+def subtract(metrics: Dict[str, OperationMetrics],
+             previous: Dict[str, OperationMetrics]) -> Dict[str, OperationMetrics]:
+    """
+    Returns the metrics collected between two snapshots (e.g. during a Test Session).
+
+    Parameters
+    ----------
+    metrics: Dict[str, OperationMetrics]
+        Later snapshot
+
+    previous: Dict[str, OperationMetrics]
+        Earlier snapshot
+
+    Returns
+    -------
+    Dict[str, OperationMetrics]
+        Metrics of the operations called in between
+    """
+    result = {}
+    for operation, operation_metrics in metrics.items():
+        difference = operation_metrics.copy()
+        if operation in previous:
+            difference.merge(previous[operation], -1)
+        if difference.count > 0:
+            result[operation] = difference
+    return result
+
+
+def to_prometheus(metrics: Dict[str, OperationMetrics], prefix: str = "tbcs_agent_requests") -> str:
+    """
+    Returns metrics in the text format of Prometheus.
+
+    Parameters
+    ----------
+    metrics: Dict[str, OperationMetrics]
+        Metrics by operation (cumulative)
+
+    prefix: str
+        Prefix of the metric names
+
+    Returns
+    -------
+    str
+        Metrics as text
+    """
+    lines = [
+        f"# HELP {prefix}_total Requests to TestBench CS by operation and status code",
+        f"# TYPE {prefix}_total counter"
+    ]
+    for operation, operation_metrics in sorted(metrics.items()):
+        for status, count in sorted(operation_metrics.status_codes.items()):
+            lines.append(f'{prefix}_total{{operation="{operation}",status="{status}"}} {count}')
+
+    lines.extend([
+        f"# HELP {prefix}_duration_seconds Latency of requests to TestBench CS by operation",
+        f"# TYPE {prefix}_duration_seconds histogram"
+    ])
+    for operation, operation_metrics in sorted(metrics.items()):
+        lines.extend(
+            _histogram_lines(f"{prefix}_duration_seconds", f'operation="{operation}"', LATENCY_BUCKETS,
+                             operation_metrics.buckets, operation_metrics.duration, operation_metrics.count))
+
+    for direction in ['out', 'in']:
+        lines.extend([
+            f"# HELP {prefix}_bytes_{direction}_total Bytes " + ("sent to" if direction == 'out' else "received from") +
+            " TestBench CS by operation", f"# TYPE {prefix}_bytes_{direction}_total counter"
+        ])
+        for operation, operation_metrics in sorted(metrics.items()):
+            lines.append(f'{prefix}_bytes_{direction}_total{{operation="{operation}"}} ' +
+                         str(getattr(operation_metrics, 'bytes_' + direction)))
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsSink:
+    """
+    Receives the metrics at the end of each Test Session, see get_sinks().
+    """
+
+    def emit(self, session_metrics: Dict[str, OperationMetrics], total_metrics: Dict[str, OperationMetrics]) -> None:
+        """
+        Parameters
+        ----------
+        session_metrics: Dict[str, OperationMetrics]
+            Metrics of the Test Session
+
+        total_metrics: Dict[str, OperationMetrics]
+            Metrics since the start of the agent
+        """
+        raise NotImplementedError
+
+
+class LogSink(MetricsSink):
+    """
+    Logs a summary of the metrics of the Test Session, the operations with the most calls first.
+    """
+
+    def __init__(self, logger: Logger, max_operations: int = 10):
+        self.__logger = logger
+        self.__max_operations = max_operations
+
+    def emit(self, session_metrics, total_metrics):
+        if session_metrics == {}:
+            return
+        operations = sorted(session_metrics.items(), key=lambda item: item[1].count, reverse=True)
+        count = sum(metrics.count for _, metrics in operations)
+        duration = sum(metrics.duration for _, metrics in operations)
+        lines = [
+            f"{count} request(s) to TestBench CS in {duration:.2f} s (operation: count, errors, avg, p95, kB out/in)"
+        ]
+        for operation, metrics in operations[:self.__max_operations]:
+            lines.append(
+                f"  {operation}: {metrics.count}, {metrics.errors}, {metrics.duration / metrics.count:.3f} s, " +
+                f"{metrics.quantile(0.95)} s, {metrics.bytes_out / 1024:.1f}/{metrics.bytes_in / 1024:.1f}")
+        if len(operations) > self.__max_operations:
+            lines.append(f"  ... {len(operations) - self.__max_operations} more operation(s)")
+        self.__logger.info("\n".join(lines))
+
+
+class JsonSink(MetricsSink):
+    """
+    Writes the metrics of the Test Session and the total metrics into a JSON file (overwritten by each Test Session).
+    """
+
+    def __init__(self, path: str):
+        self.__path = path
+
+    def emit(self, session_metrics, total_metrics):
+        with open(self.__path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'session': {operation: metrics.to_dict() for operation, metrics in session_metrics.items()},
+                    'total': {operation: metrics.to_dict() for operation, metrics in total_metrics.items()}
+                },
+                file,
+                indent=2)
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Writes the total metrics in the text format of Prometheus into a file (e.g. for the textfile collector of the node
+    exporter).
+    """
+
+    def __init__(self, path: str):
+        self.__path = path
+
+    def emit(self, session_metrics, total_metrics):
+        with open(self.__path, 'w', encoding='utf-8') as file:
+            file.write(to_prometheus(total_metrics))
+
+
+# Registry of the requests to TestBench CS, see get_registry()
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Returns the registry of the metrics of the requests to TestBench CS (filled by TbcsApi).
+    """
+    return _registry
+
+
+def get_sinks(logger: Logger, names: List[str]) -> List[MetricsSink]:
+    """
+    Creates sinks for the metrics.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    names: List[str]
+        "log": summary in the log, "json:<file>": JSON file, "prometheus:<file>": file in the text format of Prometheus;
+        unknown names are ignored
+
+    Returns
+    -------
+    List[MetricsSink]
+        Sinks
+    """
+    sinks: List[MetricsSink] = []
+    for name in names:
+        kind, _, path = name.partition(':')
+        sink: Union[MetricsSink, None] = None
+        if kind == 'log':
+            sink = LogSink(logger)
+        elif kind == 'json' and path:
+            sink = JsonSink(path)
+        elif kind == 'prometheus' and path:
+            sink = PrometheusSink(path)
+        if sink == None:
+            logger.warning(f"Unknown metrics sink '{name}' is ignored")
+        else:
+            sinks.append(sink)
+    return sinks
+
+
+def emit(logger: Logger, sinks: List[MetricsSink], session_metrics: Dict[str, OperationMetrics]) -> None:
+    """
+    Passes the metrics of a Test Session and the total metrics to the sinks; failures of sinks are logged.
+    """
+    total_metrics = _registry.snapshot()
+    for sink in sinks:
+        try:
+            sink.emit(session_metrics, total_metrics)
+        except Exception as e:
+            logger.error(f"Writing metrics with {sink.__class__.__name__} failed!\n\t{e.__str__()}")
+
+
+class Histogram:
+    """
+    Histogram of observed values (e.g. durations in seconds).
+    """
+
+    def __init__(self, bounds: Tuple[float, ...] = DURATION_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class AgentMetrics:
+    """
+    Metrics of the agent process: executions waiting to be started, executions running per adapter, durations of tests
+    and poll cycles, attachment cache hits and misses. Served together with the metrics of the requests to TestBench
+    CS by MetricsServer.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__queue_depth = 0
+        self.__running: Dict[str, int] = {}
+        self.__tests: Dict[Tuple[str, str], Histogram] = {}
+        self.__poll_cycles = Histogram()
+        self.__attachments: Dict[str, int] = {'hit': 0, 'miss': 0}
+
+    def set_queue_depth(self, queue_depth: int) -> None:
+        """
+        Sets the number of executions of the current Test Session which have not been started yet.
+        """
+        with self.__lock:
+            self.__queue_depth = queue_depth
+
+    def set_running(self, adapters: List[str]) -> None:
+        """
+        Sets the executions which have been started and whose results have not been collected yet.
+
+        Parameters
+        ----------
+        adapters: List[str]
+            Name of the adapter of each execution
+        """
+        with self.__lock:
+            self.__running = {adapter: 0 for adapter in self.__running}
+            for adapter in adapters:
+                self.__running[adapter] = self.__running.get(adapter, 0) + 1
+
+    def observe_test(self, adapter: str, result: str, duration: float) -> None:
+        """
+        Adds the duration (seconds) of a test executed by an adapter with its result ("Passed" or "Failed").
+        """
+        with self.__lock:
+            if (adapter, result) not in self.__tests:
+                self.__tests[(adapter, result)] = Histogram()
+            self.__tests[(adapter, result)].observe(duration)
+
+    def observe_poll_cycle(self, duration: float) -> None:
+        """
+        Adds the duration (seconds) of a cycle of the main loop (polling TestBench CS and executing Test Sessions).
+        """
+        with self.__lock:
+            self.__poll_cycles.observe(duration)
+
+    def count_attachment(self, hit: bool) -> None:
+        """
+        Counts a lookup of the attachment cache.
+        """
+        with self.__lock:
+            self.__attachments['hit' if hit else 'miss'] += 1
+
+    def to_prometheus(self, prefix: str = "tbcs_agent") -> str:
+        """
+        Returns the metrics of the agent and of the requests to TestBench CS (see to_prometheus()) in the text format
+        of Prometheus.
+        """
+        with self.__lock:
+            lines = [
+                f"# HELP {prefix}_queue_depth Executions of the current Test Session not started yet",
+                f"# TYPE {prefix}_queue_depth gauge", f"{prefix}_queue_depth {self.__queue_depth}",
+                f"# HELP {prefix}_running_executions Executions started and not collected yet by adapter",
+                f"# TYPE {prefix}_running_executions gauge"
+            ]
+            for adapter, count in sorted(self.__running.items()):
+                lines.append(f'{prefix}_running_executions{{adapter="{adapter}"}} {count}')
+
+            lines.extend([
+                f"# HELP {prefix}_test_duration_seconds Duration of tests by adapter and result",
+                f"# TYPE {prefix}_test_duration_seconds histogram"
+            ])
+            for (adapter, result), histogram in sorted(self.__tests.items()):
+                lines.extend(
+                    _histogram_lines(f"{prefix}_test_duration_seconds", f'adapter="{adapter}",result="{result}"',
+                                     histogram.bounds, histogram.buckets, histogram.total, histogram.count))
+
+            lines.extend([
+                f"# HELP {prefix}_poll_cycle_duration_seconds Duration of the cycles of the main loop",
+                f"# TYPE {prefix}_poll_cycle_duration_seconds histogram"
+            ])
+            lines.extend(
+                _histogram_lines(f"{prefix}_poll_cycle_duration_seconds", "", self.__poll_cycles.bounds,
+                                 self.__poll_cycles.buckets, self.__poll_cycles.total, self.__poll_cycles.count))
+
+            lines.extend([
+                f"# HELP {prefix}_attachment_cache_total Lookups of the attachment cache by result",
+                f"# TYPE {prefix}_attachment_cache_total counter"
+            ])
+            for result, count in self.__attachments.items():
+                lines.append(f'{prefix}_attachment_cache_total{{result="{result}"}} {count}')
+
+        return "\n".join(lines) + "\n" + to_prometheus(_registry.snapshot(), prefix + "_requests")
+
+
+# Metrics of the agent process, see get_agent_metrics()
+_agent_metrics = AgentMetrics()
+
+
+def get_agent_metrics() -> AgentMetrics:
+    """
+    Returns the metrics of the agent process (filled by the agent).
+    """
+    return _agent_metrics
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = _agent_metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # requests are not logged
+        pass
+
+
+class MetricsServer:
+    """
+    Serves the metrics of the agent (see AgentMetrics.to_prometheus()) at http://<host>:<port>/metrics in a background
+    thread.
+    """
+
+    def __init__(self, host: str, port: int):
+        """
+        Starts the server.
+
+        Parameters
+        ----------
+        host: str
+            Address to listen on, e.g. "127.0.0.1" (local only) or "0.0.0.0"
+
+        port: int
+            Port to listen on
+        """
+        self.__server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.__server.daemon_threads = True
+        self.port = self.__server.server_address[1]
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="metrics-server", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
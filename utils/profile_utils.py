@@ -0,0 +1,288 @@
+import json
+import os
+import sys
+import threading
+import time
+from logging import Logger
+from typing import Dict, List, Tuple, Union
+
+import utils.tracing_utils as tracing_utils
+
+# Spans that end a profile: a profile is written for each of them, containing the samples and phases since the
+# previous profile
+SESSION_SPANS = ('test_session', )
+
+# Default interval of the samples in seconds
+SAMPLE_INTERVAL = 0.005
+
+
+def _frame_key(frame) -> Tuple[str, str, int]:
+    # Function, file and first line of a frame; ";" separates the frames of collapsed stacks
+    code = frame.f_code
+    return code.co_name.replace(";", ":"), code.co_filename.replace(";", ":"), code.co_firstlineno
+
+
+class Sampler:
+    """
+    Sampling profiler: a background thread records the stacks of all threads of the process at a fixed interval.
+    Waiting threads are sampled as well, so the samples show where the wall-clock time is spent.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """
+        Initializes the sampler, see start().
+
+        Parameters
+        ----------
+        interval: float
+            Interval of the samples in seconds
+        """
+        self.interval = interval
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread: Union[threading.Thread, None] = None
+        # stacks (thread name, then the frames from the outermost to the innermost) and their number of samples
+        self.__stacks: Dict[Tuple[Union[str, Tuple[str, str, int]], ...], int] = {}
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(target=self.__run, name="Profiler", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread != None:
+            self.__thread.join()
+
+    def __run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.__stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: List[Tuple[str, str, int]] = []
+                while frame != None:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                samples.append((names.get(thread_id, str(thread_id)), ) + tuple(reversed(stack)))
+            with self.__lock:
+                for sample in samples:
+                    self.__stacks[sample] = self.__stacks.get(sample, 0) + 1
+
+    def take(self) -> Dict[tuple, int]:
+        """
+        Returns the samples since the last call: the stacks (thread name, then the frames (function, file, line) from
+        the outermost to the innermost) and their number of samples.
+        """
+        with self.__lock:
+            stacks, self.__stacks = self.__stacks, {}
+        return stacks
+
+
+class PhaseTimers:
+    """
+    Wall-clock time of the phases of the process, i.e. of the finished spans (see tracing_utils) by name: number,
+    total and maximum duration.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__phases: Dict[str, List[float]] = {}
+
+    def add(self, span: tracing_utils.Span) -> None:
+        duration = (span.end_time or span.start_time) - span.start_time
+        with self.__lock:
+            phase = self.__phases.setdefault(span.name, [0, 0.0, 0.0])
+            phase[0] += 1
+            phase[1] += duration
+            phase[2] = max(phase[2], duration)
+
+    def take(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the phases since the last call, by name: 'count', 'seconds' (total) and 'max_seconds'.
+        """
+        with self.__lock:
+            phases, self.__phases = self.__phases, {}
+        return {
+            name: {
+                'count': count,
+                'seconds': seconds,
+                'max_seconds': max_seconds
+            }
+            for name, (count, seconds, max_seconds) in phases.items()
+        }
+
+
+def to_collapsed(stacks: Dict[tuple, int]) -> str:
+    """
+    Returns samples (see Sampler.take()) as collapsed stacks ("thread;outer function;...;inner function count" per
+    line), e.g. for flamegraph.pl or speedscope.
+    """
+    lines = []
+    for stack, count in sorted(stacks.items(), key=lambda item: item[1], reverse=True):
+        frames = [stack[0]] + [f"{name} ({os.path.basename(file)}:{line})" for name, file, line in stack[1:]]
+        lines.append(";".join(frames) + f" {count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(name: str, stacks: Dict[tuple, int], interval: float) -> dict:
+    """
+    Returns samples (see Sampler.take()) in the file format of speedscope (https://www.speedscope.app), one sampled
+    profile per thread, weighted in seconds.
+    """
+    frames: List[dict] = []
+    frame_indexes: Dict[Tuple[str, str, int], int] = {}
+    profiles: Dict[str, dict] = {}
+    for stack, count in stacks.items():
+        indexes = []
+        for frame in stack[1:]:
+            if frame not in frame_indexes:
+                frame_indexes[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            indexes.append(frame_indexes[frame])
+        profile = profiles.setdefault(stack[0], {
+            'type': 'sampled',
+            'name': stack[0],
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': 0,
+            'samples': [],
+            'weights': []
+        })
+        profile['samples'].append(indexes)
+        profile['weights'].append(count * interval)
+        profile['endValue'] += count * interval
+    return {
+        '$schema': "https://www.speedscope.app/file-format-schema.json",
+        'name': name,
+        'exporter': "tbcs profile_utils",
+        'activeProfileIndex': 0,
+        'shared': {
+            'frames': frames
+        },
+        'profiles': sorted(profiles.values(), key=lambda profile: profile['endValue'], reverse=True)
+    }
+
+
+class Profiler:
+    """
+    Profiles the process: samples of all threads (see Sampler) and the wall-clock time of its phases (see PhaseTimers).
+    A profile is written for each Test Session (see SESSION_SPANS) and at the end of the process, each one with the
+    samples and phases since the previous one:
+    - <name>.collapsed: collapsed stacks
+    - <name>.speedscope.json: the samples for https://www.speedscope.app
+    - <name>.phases.json: the phases
+    """
+
+    def __init__(self, logger: Union[Logger, None], directory: str, service_name: str,
+                 interval: float = SAMPLE_INTERVAL):
+        """
+        Initializes the profiler, see start().
+
+        Parameters
+        ----------
+        logger: logging.Logger | None
+            Logger instance
+
+        directory: str
+            Directory of the profiles, created if missing
+
+        service_name: str
+            Name of the process in the names of the profiles, e.g. "agent"
+
+        interval: float
+            Interval of the samples in seconds
+        """
+        self.__logger = logger
+        self.__directory = directory
+        self.__prefix = f"{service_name}-{os.getpid()}"
+        self.__sampler = Sampler(interval)
+        self.__phases = PhaseTimers()
+        self.__lock = threading.Lock()
+        self.__count = 0
+        self.__start = time.time()
+        self.__stopped = False
+
+    def start(self) -> None:
+        """
+        Starts the sampling and the phase timers; stop() is called at the end of the process.
+        """
+        import atexit
+
+        os.makedirs(self.__directory, exist_ok=True)
+        tracing_utils.add_span_listener(self.__span_finished)
+        self.__sampler.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Stops the sampling and writes the last profile.
+        """
+        if self.__stopped:
+            return
+        self.__stopped = True
+        self.__sampler.stop()
+        self.write("end")
+
+    def __span_finished(self, span: tracing_utils.Span) -> None:
+        self.__phases.add(span)
+        if span.local_root and span.name in SESSION_SPANS:
+            self.write("session-" + str(span.attributes.get('tbcs.test_session_id', "")))
+
+    def write(self, label: str) -> None:
+        """
+        Writes a profile with the samples and phases since the previous one.
+
+        Parameters
+        ----------
+        label: str
+            End of the names of the files, e.g. "session-42"
+        """
+        with self.__lock:
+            stacks = self.__sampler.take()
+            phases = self.__phases.take()
+            now = time.time()
+            seconds, self.__start = now - self.__start, now
+            self.__count += 1
+            name = f"{self.__prefix}-{self.__count}-{label}"
+
+        path = os.path.join(self.__directory, name)
+        try:
+            with open(path + ".collapsed", 'w', encoding='utf-8') as file:
+                file.write(to_collapsed(stacks))
+            with open(path + ".speedscope.json", 'w', encoding='utf-8') as file:
+                json.dump(to_speedscope(name, stacks, self.__sampler.interval), file)
+            with open(path + ".phases.json", 'w', encoding='utf-8') as file:
+                json.dump({'seconds': seconds, 'phases': phases}, file, indent=2)
+        except OSError as e:
+            if self.__logger != None:
+                self.__logger.warning(f"Writing profile '{path}' failed!\n\t{e.__str__()}")
+            return
+
+        if self.__logger != None:
+            lines = [f"Profile written to '{path}.*' ({seconds:.2f} s; phase: count, total, max)"]
+            for phase, timer in sorted(phases.items(), key=lambda item: item[1]['seconds'], reverse=True)[:10]:
+                lines.append(f"  {phase}: {timer['count']}, {timer['seconds']:.3f} s, {timer['max_seconds']:.3f} s")
+            self.__logger.info("\n".join(lines))
+
+
+_profiler: Union[Profiler, None] = None
+
+
+def start(logger: Union[Logger, None], directory: str, service_name: str,
+          interval: float = SAMPLE_INTERVAL) -> Profiler:
+    """
+    Starts profiling the process, see Profiler.
+    """
+    global _profiler
+    _profiler = Profiler(logger, directory, service_name, interval)
+    _profiler.start()
+    return _profiler
+
+
+def get_profiler() -> Union[Profiler, None]:
+    """
+    Returns the profiler of the process, None if it is not profiled.
+    """
+    return _profiler
@@ -0,0 +1,270 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from logging import Logger
+from typing import List, Tuple, Union
+
+import config
+import utils.comparison_utils as comparison_utils
+import utils.tbcs_utils as tbcs_utils
+from utils.tbcs_api import TbcsApi
+
+# Robot Framework statuses of keywords and tests => results of TestBench CS
+_RESULTS = {'PASS': "Passed", 'FAIL': "Failed"}
+
+
+def _get_duration(status: ET.Element) -> Union[float, None]:
+    # Robot Framework >= 7 writes start time and elapsed seconds, older versions start and end time
+    if status.get('elapsed') is not None:
+        return float(status.get('elapsed'))  # type: ignore
+    try:
+        start = datetime.strptime(status.get('starttime', ''), '%Y%m%d %H:%M:%S.%f')
+        end = datetime.strptime(status.get('endtime', ''), '%Y%m%d %H:%M:%S.%f')
+        return (end - start).total_seconds()
+    except ValueError:
+        return None
+
+
+def _is_step_keyword(test_step: dict, kwname: str) -> bool:
+    # same check as in addons/robotListener.py: keyword name = description of the Test Step without arguments
+    return comparison_utils.is_equal_ignore_separators(test_step['description'].split("  ")[0], kwname)
+
+
+def read_outputs(output_file: str, test_steps: List[dict]) -> List[dict]:
+    """
+    Reads the results of all tests and their Test Steps from an output.xml of Robot Framework.
+
+    The file is read with a streaming parser and elements are dropped as soon as they are processed, so memory usage
+    does not depend on the size of the file. Keywords are assigned to the Test Steps in the same way as the listener
+    (addons/robotListener.py) does it during the run.
+
+    Parameters
+    ----------
+    output_file: str
+        Path of the output.xml
+
+    test_steps: List[dict]
+        Test Steps of the Test Case in order of execution, the keyword is the 'description' of a Test Step (the same
+        for all tests of the file)
+
+    Returns
+    -------
+    List[dict]
+        [{'name': str, 'status': str, 'duration': float, 'tags': List[str], 'steps': [{'test_step': dict,
+         'status': str, 'duration': float, 'messages': List[str]}, ...]}, ...] for each test in order of execution,
+        the steps in order of execution and 'messages' containing the failure messages
+    """
+    results: List[dict] = []
+    stack: List[ET.Element] = []
+    test: Union[dict, None] = None
+    index = 0
+    skip = False
+    messages: List[str] = []
+
+    for event, elem in ET.iterparse(output_file, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag == 'test':
+                test = {'name': elem.get('name', ''), 'status': '', 'duration': None, 'tags': [], 'steps': []}
+                index = 0
+                skip = False
+                messages = []
+            elif elem.tag == 'kw' and test is not None and index < len(test_steps):
+                if _is_step_keyword(test_steps[index], elem.get('name', '')):
+                    skip = True
+            continue
+
+        stack.pop()
+        if test is not None:
+            if elem.tag == 'kw':
+                status = elem.find('status')
+                if index < len(test_steps):
+                    if _is_step_keyword(test_steps[index], elem.get('name', '')):
+                        skip = False
+                    if not skip and status is not None:
+                        test['steps'].append({
+                            'test_step': test_steps[index],
+                            'status': status.get('status', ''),
+                            'duration': _get_duration(status),
+                            'messages': messages
+                        })
+                        index += 1
+                        messages = []
+            elif elem.tag == 'msg' and elem.get('level') == 'FAIL':
+                # failure messages belong to the Test Step currently running
+                messages.append(elem.text or '')
+            elif elem.tag == 'tag' and stack and stack[-1].tag == 'test':
+                test['tags'].append(elem.text or '')
+            elif elem.tag == 'status' and stack and stack[-1].tag == 'test':
+                test['status'] = elem.get('status', '')
+                test['duration'] = _get_duration(elem)
+            elif elem.tag == 'test':
+                results.append(test)
+                test = None
+
+        # processed elements are not needed anymore
+        if stack and elem.tag != 'status':
+            stack[-1].remove(elem)
+
+    return results
+
+
+def read_output(output_file: str,
+                test_steps: List[dict],
+                test_name: str = '',
+                external_id: str = '') -> Union[dict, None]:
+    """
+    Reads the result of a test and its Test Steps from an output.xml of Robot Framework (see read_outputs()).
+
+    Parameters
+    ----------
+    output_file: str
+        Path of the output.xml
+
+    test_steps: List[dict]
+        Test Steps of the Test Case in order of execution, the keyword is the 'description' of a Test Step
+
+    test_name: str
+        Name of the test; if empty or not found, the first test is used
+
+    external_id: str
+        External ID of the test (tag "ID:<external_id>"), preferred to the name
+
+    Returns
+    -------
+    dict | None
+        Result of the test, see read_outputs(); None if the file contains no test
+    """
+    results = read_outputs(output_file, test_steps)
+    if results == []:
+        return None
+
+    for result in results:
+        if external_id and "ID:" + external_id in result['tags']:
+            return result
+    for result in results:
+        if result['name'] == test_name:
+            return result
+    return results[0]
+
+
+def report_output(logger: Logger,
+                  tbcs: TbcsApi,
+                  test_case_item: dict,
+                  execution_id: str,
+                  output_file: str,
+                  test_name: str = '',
+                  external_id: str = '') -> Union[str, None]:
+    """
+    Reports the results of the Test Steps of an execution from an output.xml of Robot Framework.
+
+    This is the alternative to reporting each keyword during the run with the listener (addons/robotListener.py): the
+    results are reported concurrently after the run (see tbcs_utils.report_step_results). Defects are created for
+    failed Test Steps if config.CREATE_DEFECTS is set, as the listener does.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    tbcs: TbcsApi
+        TbcsApi instance
+
+    test_case_item: dict
+        Test Case with its Test Steps, as passed to the listener
+
+    execution_id: str
+        Id of the Execution
+
+    output_file: str
+        Path of the output.xml
+
+    test_name: str
+        Name of the test, see read_output()
+
+    external_id: str
+        External ID of the test, see read_output()
+
+    Returns
+    -------
+    str | None
+        Result of the test ("Passed" or "Failed"); None if the result could not be read or the test neither passed
+        nor failed (e.g. skipped)
+    """
+    try:
+        result = read_output(output_file, get_test_steps(test_case_item), test_name, external_id)
+    except (OSError, ET.ParseError) as e:
+        logger.error(f"Reading '{output_file}' failed!\n\t{e.__str__()}")
+        return None
+    if result == None:
+        logger.error(f"No test found in '{output_file}'")
+        return None
+
+    return report_result(logger, tbcs, test_case_item, execution_id, result)
+
+
+def get_test_steps(test_case_item: dict) -> List[dict]:
+    """
+    Returns the Test Steps of a Test Case in order of execution.
+    """
+    return [step for block in test_case_item['testSequence']['testStepBlocks'] for step in block['steps']]
+
+
+def report_result(logger: Logger, tbcs: TbcsApi, test_case_item: dict, execution_id: str,
+                  result: dict) -> Union[str, None]:
+    """
+    Reports the results of the Test Steps of an execution read by read_outputs() or read_output().
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    tbcs: TbcsApi
+        TbcsApi instance
+
+    test_case_item: dict
+        Test Case with its Test Steps, as passed to the listener
+
+    execution_id: str
+        Id of the Execution
+
+    result: dict
+        Result of the test, see read_outputs()
+
+    Returns
+    -------
+    str | None
+        Result of the test ("Passed" or "Failed"); None if the test neither passed nor failed (e.g. skipped)
+    """
+    product_id = str(test_case_item['productId'])
+    test_case_id = str(test_case_item['id'])
+
+    step_results: List[Tuple[str, dict]] = []
+    for step in result['steps']:
+        logger.debug(f"Test Step '{step['test_step']['description']}': {step['status']} ({step['duration']} s)")
+        step_results.append((str(step['test_step']['id']), {"result": _RESULTS.get(step['status'], "Undefined")}))
+
+    failed = tbcs_utils.report_step_results(logger, tbcs, product_id, test_case_id, execution_id, step_results,
+                                            getattr(config, "RESULT_UPLOAD_WORKERS", 4))
+    if failed > 0:
+        logger.error(f"{failed} step result(s) of Test Case '{test_case_item['name']}' could not be reported")
+
+    if config.CREATE_DEFECTS:
+        for step in result['steps']:
+            for message in step['messages']:
+                test_step = step['test_step']
+                defect_id = tbcs.create_defect(product_id, {
+                    "name": f"Execution {execution_id} - {test_step['description']}",
+                    "description": message
+                })
+                tbcs.assign_defect(
+                    product_id, {
+                        "defectId": defect_id,
+                        "parentType": "TestStep",
+                        "parentId": f"{test_case_id}-{execution_id}-{test_step['id']}"
+                    })
+                logger.error("Test Step with ID: " + str(test_step["id"]) + " and name: " + test_step["description"] +
+                             " failed!")
+
+    logger.debug(f"Test '{result['name']}': {result['status']} ({result['duration']} s)")
+    return _RESULTS.get(result['status'])
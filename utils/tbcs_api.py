@@ -1,6 +1,122 @@
+import os
+import time
 from typing import Dict, List, Union
 
 import requests
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
+
+import utils.cassette_utils as cassette_utils
+import utils.metrics_utils as metrics_utils
+import utils.tracing_utils as tracing_utils
+
+
+# Requests with these methods are idempotent and retried on transient failures: connection errors, timeouts and the
+# status codes below. Delay before the first retry in seconds, doubled for each further retry.
+_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+_TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+REQUEST_RETRIES = 3
+REQUEST_BACKOFF = 1.0
+
+
+def _request(operation: str, method: str, url: str, **kwargs) -> requests.Response:
+    # Sends a request, idempotent requests are retried on transient failures (other requests may have been processed
+    # by the server already, so they are never repeated)
+    retries = REQUEST_RETRIES if method.upper() in _IDEMPOTENT_METHODS else 0
+    attempt = 0
+    while True:
+        try:
+            response = _send(operation, method, url, **kwargs)
+            if response.status_code not in _TRANSIENT_STATUS_CODES or attempt >= retries:
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= retries:
+                raise
+        time.sleep(REQUEST_BACKOFF * (2**attempt))
+        attempt += 1
+
+
+def _send(operation: str, method: str, url: str, **kwargs) -> requests.Response:
+    # Sends a request once and records count, latency, bytes and status code of the operation (see metrics_utils).
+    # Within a traced phase the request gets a span of its own, its context is sent in the header "traceparent" if the
+    # spans are exported (see tracing_utils.get_traceparent()).
+    # If a cassette is recorded or replayed (see cassette_utils), the request is recorded or answered from it.
+    span = tracing_utils.start_child_span("tbcs." + operation, {'http.request.method': method.upper()})
+    traceparent = tracing_utils.get_traceparent(span) if span != None else ""
+    if traceparent != "":
+        kwargs['headers'] = dict(kwargs.get('headers') or {}, traceparent=traceparent)
+
+    start = time.perf_counter()
+    try:
+        response = cassette_utils.send(operation, method, url, **kwargs)
+    except Exception as e:
+        metrics_utils.get_registry().record(operation, time.perf_counter() - start, "error")
+        if span != None:
+            span.set_error(e.__str__())
+            span.end()
+        raise
+
+    body = response.request.body
+    bytes_out = len(body) if body is not None and hasattr(body, '__len__') else 0
+    metrics_utils.get_registry().record(operation,
+                                        time.perf_counter() - start, str(response.status_code), bytes_out,
+                                        len(response.content))
+    if span != None:
+        span.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 400:
+            span.set_error(f"HTTP {response.status_code}")
+        span.end()
+    return response
+
+
+class _MultipartFile:
+    """
+    multipart/form-data body containing a single file, which is read from disk while the request is sent.
+
+    requests would read the whole file into memory to build the body.
+    """
+
+    def __init__(self, field_name: str, path_to_file: str):
+        field = RequestField(field_name, b'', os.path.basename(path_to_file))
+        field.make_multipart()
+        boundary = choose_boundary()
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.__parts = [f"--{boundary}\r\n".encode() + field.render_headers().encode('utf-8'), None,
+                        f"\r\n--{boundary}--\r\n".encode()]
+        self.__file = open(path_to_file, 'rb')
+        self.__len = len(self.__parts[0]) + os.fstat(self.__file.fileno()).st_size + len(self.__parts[2])
+        self.__part = 0
+
+    def __enter__(self) -> '_MultipartFile':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.__file.close()
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(65536)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        data = b''
+        while self.__part < 3 and (size < 0 or len(data) < size):
+            remaining = -1 if size < 0 else size - len(data)
+            if self.__part == 1:
+                chunk = self.__file.read(remaining)
+            else:
+                chunk = self.__parts[self.__part][:remaining] if remaining >= 0 else self.__parts[self.__part]
+                self.__parts[self.__part] = self.__parts[self.__part][len(chunk):]
+            data += chunk
+            if not chunk or (self.__part != 1 and not self.__parts[self.__part]):
+                self.__part += 1
+        return data
 
 
 class TbcsApi:
@@ -44,10 +160,10 @@ class TbcsApi:
         """
         route_login = f"{tbcs_base}/api/tenants/login/session"
         login_body = {'tenantName': workspace, 'login': login, 'password': password, 'force': True}
-        login_response = requests.post(route_login,
-                                       json=login_body,
-                                       headers={'Content-Type': 'application/json'},
-                                       verify=TbcsApi.verify)
+        login_response = _request("setup", "post", route_login,
+                                  json=login_body,
+                                  headers={'Content-Type': 'application/json'},
+                                  verify=TbcsApi.verify)
         assert login_response.status_code == 201, f"Login failed: {login_response.text}"
         tenant_id = str(login_response.json()['tenantId'])
         user_id: str = str(login_response.json()['userId'])
@@ -102,7 +218,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Products/get_api_tenants__tenantId__products
         """
         route = f"{self.tenant_route}/products"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_products", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET products failed: {response.text}"
         return response.json()
 
@@ -141,7 +257,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Static%20Calls/get_api_serverInfo
         """
         route = f"{self.tbcs_base}/api/serverInfo"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_server", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET server info failed: {response.text}"
         return response.json()
 
@@ -166,7 +282,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Suite/getTenantTestSuites
         """
         route = f"{self.__product_route(product_id)}/planning/suites/v1"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_suites", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET suites failed: {response.text}"
         return response.json()
 
@@ -194,7 +310,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Suite/getTenantTestSuite
         """
         route = f"{self.__product_route(product_id)}/planning/suites/{suite_id}/v1"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_suite", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET suite {suite_id} failed: {response.text}"
         return response.json()
 
@@ -222,7 +338,12 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Suite/postTenantTestSuite
         """
         route = f"{self.__product_route(product_id)}/planning/suites/v1"
-        response = requests.post(route, json={'name': name}, headers=self.rest_header, verify=self.verify)
+        response = _request("post_suite",
+                            "post",
+                            route,
+                            json={'name': name},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"POST suite failed: {response.text}"
         return str(response.json()['testSuiteId'])
 
@@ -252,7 +373,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Suite/patchTenantTestSuite
         """
         route = f"{self.__product_route(product_id)}/planning/suites/{suite_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_suite", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH suite {suite_id} failed: {response.text}"
 
     def get_sessions(self, product_id: str) -> dict:
@@ -276,7 +397,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/getTenantTestSessions
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/v1"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_sessions", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET all sessions failed: {response.text}"
         return response.json()
 
@@ -304,7 +425,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/getTenantTestSession
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/{session_id}/v1"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_session", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET session failed: {response.text}"
         return response.json()
 
@@ -332,7 +453,12 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/postTenantTestSession
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/v1"
-        response = requests.post(route, json={'name': name}, headers=self.rest_header, verify=self.verify)
+        response = _request("post_session",
+                            "post",
+                            route,
+                            json={'name': name},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"POST session failed: {response.text}"
         self.test_session_id = str(response.json()['testSessionId'])
         return self.test_session_id
@@ -363,7 +489,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/patchTenantTestSession
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/{session_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_session", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH session {session_id} failed: {response.text}"
 
     def delete_session(self, product_id: str, session_id: str) -> None:
@@ -389,7 +515,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/deleteTenantTestSession
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/{session_id}/v1"
-        response = requests.delete(route, headers=self.rest_header, verify=self.verify)
+        response = _request("delete_session", "delete", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"Session remove failed: {response.text}"
 
     def join_session(self, product_id: str, session_id: str) -> None:
@@ -415,8 +541,14 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/test-planning/openapi.yaml#/Test%20Session/joinAsParticipant
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/{session_id}/participant/self/v1"
-        response = requests.patch(route, json={'active': True}, headers=self.rest_header, verify=self.verify)
+        response = _request("join_session",
+                            "patch",
+                            route,
+                            json={'active': True},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"JOIN session {session_id} failed: {response.text}"
+        self.test_session_id = str(session_id)
 
     def add_execution_to_session(self, product_id: str, session_id: str, test_case_id: str, execution_id: str) -> None:
         """
@@ -448,7 +580,12 @@ class TbcsApi:
         """
         route = f"{self.__product_route(product_id)}/planning/sessions/{session_id}/assign/executions/v1"
         body = {'addExecutions': [{'testCaseIds': {'testCaseId': int(test_case_id)}, 'executionId': execution_id}]}
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("add_execution_to_session",
+                            "patch",
+                            route,
+                            json=body,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"ADD execution to session {session_id} failed: {response.text}"
 
     def get_all_test_cases(self, product_id: str) -> dict:
@@ -472,7 +609,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/get_api_tenants__tenantId__products__productId__specifications_testCases
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_all_test_cases", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET all test cases failed: {response.text}"
         return response.json()
 
@@ -500,7 +637,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/get_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId_/
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_test_case", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET test case {test_case_id} failed: {response.text}"
         return response.json()
 
@@ -535,7 +672,7 @@ class TbcsApi:
         """
         search_filter: str = f"fieldValue={field}:{operator}:{filter}"
         route = f"{self.__product_route(product_id)}/specifications/testCases?{search_filter}"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_test_case_by_filter", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200 or response.status_code == 404, f"GET specific test case by filter failed: {response.text}"
         return response.json()
 
@@ -565,7 +702,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/post_api_tenants__tenantId__products__productId__specifications_testCases
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases"
-        response = requests.post(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("post_test_case", "post", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST test_case failed: {response.text}"
         return str(response.json()['testCaseId'])
 
@@ -595,7 +732,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/patch_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId_/
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_test_case", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH test_case failed: {response.text}"
 
     def post_execution(self, product_id: str, test_case_id: str) -> str:
@@ -622,7 +759,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/executions/openapi.yaml#/Executions/startExecution/
         """
         route = f"{self.__product_route(product_id)}/executions/testCases/{test_case_id}/v1"
-        response = requests.post(route, headers=self.rest_header, verify=self.verify)
+        response = _request("post_execution", "post", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST execution failed: {response.text}"
         return response.json()['executionId']
 
@@ -656,7 +793,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/executions/openapi.yaml#/Executions/startConcreteTestCaseExecution/
         """
         route = f"{self.__product_route(product_id)}/executions/testCases/{test_case_id}/tables/{table_id}/rows/{row_id}/v1"
-        response = requests.post(route, headers=self.rest_header, verify=self.verify)
+        response = _request("post_execution_ddt", "post", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST DDT execution failed: {response.text}"
         return response.json()['executionId']
 
@@ -689,7 +826,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/executions/openapi.yaml#/Executions/patchExecution/
         """
         route = f"{self.__product_route(product_id)}/executions/testCases/{test_case_id}/executions/{execution_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_execution", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 204, f"PATCH execution failed: {response.text}"
 
     def get_concrete_test_case(self, product_id: str, test_case_id: str, table_id: str, row_id: str) -> dict:
@@ -722,7 +859,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/get_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId__table__tableId__row__rowId_/
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/table/{table_id}/row/{row_id}"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_concrete_test_case", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET concrete Test Case failed: {response.text}"
         return response.json()
 
@@ -753,7 +890,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/ddt/openapi.yaml#/Data-Driven%20Tables/getOneDDT
         """
         route = f"{self.__product_route(product_id)}/ddt/testCases/{test_case_id}/tables/{table_id}/v1"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_ddt_table", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET ddt table {table_id} failed: {response.text}"
         return response.json()
 
@@ -784,7 +921,12 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/ddt/openapi.yaml#/Data-Driven%20Tables/createDDT
         """
         route = f"{self.__product_route(product_id)}/ddt/testCases/{test_case_id}/v1"
-        response = requests.post(route, json={'name': name}, headers=self.rest_header, verify=self.verify)
+        response = _request("post_ddt_table",
+                            "post",
+                            route,
+                            json={'name': name},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"POST ddt table failed: {response.text}"
         return str(response.json()['tableId'])
 
@@ -818,7 +960,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/ddt/openapi.yaml#/Data-Driven%20Tables/updateOneDDT
         """
         route = f"{self.__product_route(product_id)}/ddt/testCases/{test_case_id}/tables/{table_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_ddt_table", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH ddt table {table_id} failed: {response.text}"
         return str(response.json()["columnId"])
 
@@ -848,14 +990,36 @@ class TbcsApi:
 
         #This method can be simplified when https://testbenchcs.atlassian.net/browse/ITB-5885
         #is completed.
+        return self.get_ddt_rows(product_id, test_case_id, table_id)[row_id]
+
+    def get_ddt_rows(self, product_id: str, test_case_id: str, table_id: str) -> Dict[str, List[dict]]:
+        """
+        Returns all values of all rows of a Data-driven table with a single request.
+
+        Parameters
+        ----------
+        product_id: str
+            Id of the product
+            
+        test_case_id: str
+            Id of the Test Case
+
+        table_id: str
+            Id of the table
+
+        Returns
+        -------
+        Dict[str, List[dict]]
+            Id of the row => List of dictionaries containing all column - value pairs of the row (see get_ddt_row())
+        """
         ddt_table = self.get_ddt_table(product_id, test_case_id, table_id)
-        ddt_rows = ddt_table['rowData']
-        ddt_cols = ddt_table['columnsMetaData']
-        ddt_row = next(ddt_row['data'] for ddt_row in ddt_rows if ddt_row['id'] == row_id)
-        return [{
-            'column': next(ddt_col['name'] for ddt_col in ddt_cols if ddt_col['id'] == entry['columnId']),
-            'value': entry['value']
-        } for entry in ddt_row]
+        ddt_cols = {ddt_col['id']: ddt_col['name'] for ddt_col in ddt_table['columnsMetaData']}
+        return {
+            ddt_row['id']: [{
+                'column': ddt_cols[entry['columnId']],
+                'value': entry['value']
+            } for entry in ddt_row['data']] for ddt_row in ddt_table['rowData']
+        }
 
     def post_ddt_row(self, product_id: str, test_case_id: str, table_id: str) -> str:
         """
@@ -884,7 +1048,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/ddt/openapi.yaml#/Data-Driven%20Tables/createRowInDDT
         """
         route = f"{self.__product_route(product_id)}/ddt/testCases/{test_case_id}/tables/{table_id}/rows/v1"
-        response = requests.post(route, headers=self.rest_header, verify=self.verify)
+        response = _request("post_ddt_row", "post", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST DDT Row to table {table_id} failed: {response.text}"
         return str(response.json()['rowId'])
 
@@ -920,7 +1084,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/ddt/openapi.yaml#/Data-Driven%20Tables/updateRowInDDT
         """
         route = f"{self.__product_route(product_id)}/ddt/testCases/{test_case_id}/tables/{table_id}/rows/{row_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_ddt_row", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 204, f"PATCH DDT Row to table {table_id} failed: {response.text}"
 
     def get_file_response(self, product_id: str, file_id: str) -> requests.Response:
@@ -947,7 +1111,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/File/get_api_tenants__tenantId__products__productId__file_download
         """
         route = f"{self.__product_route(product_id)}/file/download?fileIds={file_id}"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_file_response", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET file {file_id} failed: {response.text}"
         return response
 
@@ -982,12 +1146,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/File/post_api_tenants__tenantId__products__productId__file_upload
         """
         route = f"{self.__product_route(product_id)}/file/upload?element=Execution&executionId={execution_id}&parentId={test_case_id}"
-        response = requests.post(route,
-                                 files={'formData': open(path_to_file, 'rb')},
-                                 headers=self.form_data_header,
-                                 verify=self.verify)
-        assert response.status_code == 201, f"Upload file failed: {response.text}"
-        return response.json()
+        return self.__upload_file("upload_file_to_execution", route, path_to_file)
 
     def upload_file_to_test_case(self, product_id: str, test_case_id: str, path_to_file: str) -> dict:
         """
@@ -1016,10 +1175,33 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/File/post_api_tenants__tenantId__products__productId__file_upload
         """
         route = f"{self.__product_route(product_id)}/file/upload?element=TestCase&elementId={test_case_id}"
-        response = requests.post(route,
-                                 files={'formData': open(path_to_file, 'rb')},
-                                 headers=self.form_data_header,
-                                 verify=self.verify)
+        return self.__upload_file("upload_file_to_test_case", route, path_to_file)
+
+    def __upload_file(self, operation: str, route: str, path_to_file: str) -> dict:
+        """
+        Uploads a file as form data, the file is streamed from disk.
+
+        Parameters
+        ----------
+        operation: str
+            Name of the operation for the metrics of the request
+
+        route: str
+            Upload route
+
+        path_to_file: str
+            Path to the file that should be uploaded
+
+        Returns
+        -------
+        dict
+            Dictionary containing fileId, name and size of the uploaded file
+        """
+        with _MultipartFile('formData', path_to_file) as body:
+            response = _request(operation, "post", route,
+                                data=body,
+                                headers=dict(self.form_data_header, **{'Content-Type': body.content_type}),
+                                verify=self.verify)
         assert response.status_code == 201, f"Upload file failed: {response.text}"
         return response.json()
 
@@ -1043,7 +1225,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Custom%20Fields/get_api_tenants__tenantId__customFields_containers
         """
         route = f"{self.tenant_route}/customFields/containers"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_custom_field_containers", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET customFields failed: {response.text}"
         return response.json()
 
@@ -1076,7 +1258,12 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Custom%20Fields/put_api_tenants__tenantId__customFields_containers__container___anchor_
         """
         route = f"{self.tenant_route}/customFields/containers/{container}/{anchor}"
-        response = requests.put(route, json=fieldList, headers=self.rest_header, verify=self.verify)
+        response = _request("update_custom_field_containers",
+                            "put",
+                            route,
+                            json=fieldList,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"GET customFields failed: {response.text}"
 
     def get_custom_field_list(self) -> List[dict]:
@@ -1099,7 +1286,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Custom%20Fields/get_api_tenants__tenantId__customFields_fields
         """
         route = f"{self.tenant_route}/customFields/fields"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_custom_field_list", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET customFields failed: {response.text}"
         return response.json()
 
@@ -1123,7 +1310,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Custom%20Fields/get_api_tenants__tenantId__customFields_blocks
         """
         route = f"{self.tenant_route}/customFields/blocks"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_custom_field_block_list", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET customFieldlocks failed: {response.text}"
         return response.json()
 
@@ -1157,7 +1344,12 @@ class TbcsApi:
 
         route = f"{self.tenant_route}/customFields/blocks"
 
-        response = requests.post(route, json=cf_block_data, headers=self.rest_header, verify=self.verify)
+        response = _request("add_custom_field_block",
+                            "post",
+                            route,
+                            json=cf_block_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"Add Custom Field Block failed: {response.text}"
         return response.json()['blockId']
 
@@ -1200,7 +1392,12 @@ class TbcsApi:
 
         route = f"{self.tenant_route}/customFields/blocks/{blockid}"
 
-        response = requests.patch(route, json=cf_block_data, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_custom_field_block",
+                            "patch",
+                            route,
+                            json=cf_block_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"Update Custom Field Block failed: {response.text}"
 
     def add_custom_field(self, name: str, label: str = "", type: str = "SingleLineText", default: str = "") -> int:
@@ -1237,7 +1434,12 @@ class TbcsApi:
 
         route = f"{self.tenant_route}/customFields/fields"
 
-        response = requests.post(route, json=cf_data, headers=self.rest_header, verify=self.verify)
+        response = _request("add_custom_field",
+                            "post",
+                            route,
+                            json=cf_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"Add Custom Field failed: {response.text}"
         return response.json()['customFieldId']
 
@@ -1276,7 +1478,12 @@ class TbcsApi:
             test_block_data['position'] = position
 
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testStepBlocks"
-        response = requests.post(route, json=test_block_data, headers=self.rest_header, verify=self.verify)
+        response = _request("add_test_step_block",
+                            "post",
+                            route,
+                            json=test_block_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"Add Test Step Block failed: {response.text}"
         return str(response.json()['testStepBlockId'])
 
@@ -1322,7 +1529,12 @@ class TbcsApi:
             test_block_data['position'] = position
 
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testStepBlocks/{test_step_block_id}"
-        response = requests.patch(route, json=test_block_data, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_test_step_block",
+                            "patch",
+                            route,
+                            json=test_block_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"Patch Test Step Block failed: {response.text}"
 
     def remove_test_step_block(self, product_id: str, test_case_id: str, test_step_block_id: str) -> None:
@@ -1351,7 +1563,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/delete_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId__testStepBlocks__testStepBlockId_/
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testStepBlocks/{test_step_block_id}"
-        response = requests.delete(route, headers=self.rest_header, verify=self.verify)
+        response = _request("remove_test_step_block", "delete", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"Remove Test Step Block failed: {response.text}"
 
     def add_test_step(self,
@@ -1410,7 +1622,12 @@ class TbcsApi:
             test_step_data['position'] = previous_test_step_id + 1
 
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testSteps"
-        response = requests.post(route, json=test_step_data, headers=self.rest_header, verify=self.verify)
+        response = _request("add_test_step",
+                            "post",
+                            route,
+                            json=test_step_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
 
         assert response.status_code == 201, f"Add Test Step failed: {response.text}"
         return str(response.json()['testStepId'])
@@ -1462,10 +1679,50 @@ class TbcsApi:
             test_step_data['position'] = {'relation': 'after', 'testStepId': previous_test_step_id}
 
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testSteps"
-        response = requests.post(route, json=test_step_data, headers=self.rest_header, verify=self.verify)
+        response = _request("add_test_step_old",
+                            "post",
+                            route,
+                            json=test_step_data,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 201, f"Add Test Step failed: {response.text}"
         return str(response.json()['testStepId'])
 
+    def patch_test_step(self, product_id: str, test_case_id: str, test_step_id: str, description: str) -> None:
+        """
+        Updates the description of a Test Step.
+
+        Parameters
+        ----------
+        product_id: str
+            Id of the product
+
+        test_case_id: str
+            Id of the Test Case
+
+        test_step_id: str
+            Id of the Test Step
+
+        description: str
+            New description of the Test Step
+
+        Returns
+        -------
+        None
+
+        Notes
+        -----
+        For more information visit:
+
+        https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/patch_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId__testSteps__testStepId_
+        """
+        route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testSteps/{test_step_id}"
+        response = _request("patch_test_step", "patch", route,
+                            json={'description': description},
+                            headers=self.rest_header,
+                            verify=self.verify)
+        assert response.status_code == 200, f"Patch Test Step failed: {response.text}"
+
     def remove_test_step(self, product_id: str, test_case_id: str, test_step_id: str) -> None:
         """
         Removes a Test Step.
@@ -1492,7 +1749,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Specifications/delete_api_tenants__tenantId__products__productId__specifications_testCases__testCaseId__testSteps__testStepId_/
         """
         route = f"{self.__product_route(product_id)}/specifications/testCases/{test_case_id}/testSteps/{test_step_id}"
-        response = requests.delete(route, headers=self.rest_header, verify=self.verify)
+        response = _request("remove_test_step", "delete", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"Delete Test Step failed: {response.text}"
 
     def report_step_result(self, product_id: str, test_case_id: str, test_step_id: str, execution_id: str,
@@ -1530,7 +1787,12 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/executions/openapi.yaml#/Executions/patchTestStepExecution/
         """
         route = f"{self.__product_route(product_id)}/executions/testCases/{test_case_id}/executions/{execution_id}/testSteps/{test_step_id}/v1"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("report_step_result",
+                            "patch",
+                            route,
+                            json=body,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 204, f"Patch Test Step result failed: {response.text}"
 
     def create_defect(self, product_id: str, body: dict) -> str:
@@ -1558,7 +1820,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/defects/openapi.yaml#/Defects/postDefectV1
         """
         route = f"{self.__product_route(product_id)}/defects/v1"
-        response = requests.post(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("create_defect", "post", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"Create defect failed: {response.text}"
         return str(response.json()['defectId'])
 
@@ -1588,7 +1850,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/defects/openapi.yaml#/Defect%20Assignments/postDefectAssignmentV1
         """
         route = f"{self.__product_route(product_id)}/defects/assignments/v1"
-        response = requests.post(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("assign_defect", "post", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"Assign defect failed: {response.text}"
 
     def get_user_story(self, product_id: str, user_story_id: str) -> dict:
@@ -1615,7 +1877,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Requirements/get_api_tenants__tenantId__products__productId__requirements_userStories__userStoryId_/
         """
         route = f"{self.__product_route(product_id)}/requirements/userStories/{user_story_id}"
-        response = requests.get(route, headers=self.rest_header, verify=self.verify)
+        response = _request("get_user_story", "get", route, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"GET user Story {user_story_id} failed: {response.text}"
         return response.json()
 
@@ -1644,7 +1906,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Requirements/post_api_tenants__tenantId__products__productId__requirements_epics
         """
         route = f"{self.__product_route(product_id)}/requirements/epics"
-        response = requests.post(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("post_epic", "post", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST epic failed: {response.text}"
         return str(response.json()['epicId'])
 
@@ -1674,7 +1936,7 @@ class TbcsApi:
         https://test01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Requirements/patch_api_tenants__tenantId__products__productId__requirements_epics__epicId_
         """
         route = f"{self.__product_route(product_id)}/requirements/epics/{epic_id}"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_epic", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH epic failed: {response.text}"
 
     def post_user_story(self, product_id: str, body: dict) -> str:
@@ -1702,7 +1964,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Requirements/post_api_tenants__tenantId__products__productId__requirements_userStories
         """
         route = f"{self.__product_route(product_id)}/requirements/userStories"
-        response = requests.post(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("post_user_story", "post", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 201, f"POST user_story failed: {response.text}"
         return str(response.json()['userStoryId'])
 
@@ -1732,7 +1994,7 @@ class TbcsApi:
         https://cloud01-eu.testbench.com/openapi-ui/?url=/doc/api.json#/Requirements/patch_api_tenants__tenantId__products__productId__requirements_userStories__userStoryId_/
         """
         route = f"{self.__product_route(product_id)}/requirements/userStories/{user_story_id}"
-        response = requests.patch(route, json=body, headers=self.rest_header, verify=self.verify)
+        response = _request("patch_user_story", "patch", route, json=body, headers=self.rest_header, verify=self.verify)
         assert response.status_code == 200, f"PATCH user_story failed: {response.text}"
 
     def __gql_definition(self, variables: dict) -> str:
@@ -1832,7 +2094,12 @@ class TbcsApi:
         query: Dict[str, Union[str, Dict[str, str]]] = {'query': mutation}
         query['variables'] = variables
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/", json=query, headers=self.rest_header, verify=self.verify)
+        response = _request("create_keyword",
+                            "post",
+                            f"{self.tbcs_base}/api/kdt/",
+                            json=query,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION create keyword failed: {response.text}"
         return str(response.json()['data']['createKeyword']['id'])
 
@@ -1887,7 +2154,12 @@ class TbcsApi:
         query: Dict[str, Union[str, Dict[str, str]]] = {'query': mutation}
         query['variables'] = variables
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/", json=query, headers=self.rest_header, verify=self.verify)
+        response = _request("update_keyword",
+                            "post",
+                            f"{self.tbcs_base}/api/kdt/",
+                            json=query,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION update keyword failed: {response.text}"
         return str(response.json()['data']['updateKeyword']['_id'])
 
@@ -1937,7 +2209,12 @@ class TbcsApi:
         query: Dict[str, Union[str, Dict[str, str]]] = {'query': mutation}
         query['variables'] = variables
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/", json=query, headers=self.rest_header, verify=self.verify)
+        response = _request("update_keyword_parameter",
+                            "post",
+                            f"{self.tbcs_base}/api/kdt/",
+                            json=query,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION update keyword parameter failed: {response.text}"
         return str(response.json()['data']['updateKeywordParameter']['_id'])
 
@@ -1986,7 +2263,12 @@ class TbcsApi:
 
         query: Dict[str, Union[str, Dict[str, str]]] = {'query': mutation}
         query['variables'] = variables
-        response = requests.post(f"{self.tbcs_base}/api/kdt/", json=query, headers=self.rest_header, verify=self.verify)
+        response = _request("create_keyword_param",
+                            "post",
+                            f"{self.tbcs_base}/api/kdt/",
+                            json=query,
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION create keyword parameter failed: {response.text}"
         return str(response.json()['data']['createKeywordParam']['id'])
 
@@ -2029,10 +2311,10 @@ class TbcsApi:
         }
         """
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': mutation},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("delete_keyword_param", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': mutation},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION delete keyword parameter failed: {response.text}"
         return response.json()['data']['deleteKeywordParameter']
 
@@ -2078,10 +2360,10 @@ class TbcsApi:
             }     
         }
         """
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': query},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("get_keyword_list", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': query},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"QUERY get keyword list failed:{response.text}"
         return response.json()['data']['getKeywords']
 
@@ -2131,10 +2413,10 @@ class TbcsApi:
             }
         }
         """
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': query},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("get_keyword", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': query},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"QUERY get keyword failed: {response.text}"
         return response.json()['data']['getKeyword']
 
@@ -2182,10 +2464,10 @@ class TbcsApi:
             }
         }
         """
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': query},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("get_keyword_parameters_and_values", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': query},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"QUERY get keyword failed: {response.text}"
         return response.json()['data']['getKeywordParametersAndValues']['value']
 
@@ -2227,10 +2509,10 @@ class TbcsApi:
             }
         }
         """
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': mutation},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("delete_keyword", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': mutation},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION delete keyword failed: {response.text}"
         return response.json()['data']['deleteKeyword']
 
@@ -2297,10 +2579,10 @@ class TbcsApi:
         }
         """
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': mutation},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("add_keyword_usage", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': mutation},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION add keyword usage failed: {response.text}"
         return response.json()['data']['addKeywordUsage']
 
@@ -2361,9 +2643,9 @@ class TbcsApi:
             }
             """
 
-        response = requests.post(f"{self.tbcs_base}/api/kdt/",
-                                 json={'query': mutation},
-                                 headers=self.rest_header,
-                                 verify=self.verify)
+        response = _request("update_kwd_par_value", "post", f"{self.tbcs_base}/api/kdt/",
+                            json={'query': mutation},
+                            headers=self.rest_header,
+                            verify=self.verify)
         assert response.status_code == 200, f"MUTATION upsert Keyword Param Value failed: {response.text}"
         return response.json()['data']['upsertKeywordParamValue']['paramValue']
@@ -1,12 +1,20 @@
 import argparse
 import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from logging import Logger
-from typing import List, Union
+from time import sleep
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Type, Union
+
+import requests
 
 import config
 
+import utils.cassette_utils as cassette_utils
 import utils.comparison_utils as comparison_utils
+import utils.profile_utils as profile_utils
 from utils.tbcs_api import TbcsApi
 
 
@@ -410,6 +418,9 @@ def par_in_List(par: dict, par_list: [dict]) -> bool:
     return result
 
 
+_keyword_lock = threading.Lock()
+
+
 def get_or_create_kwd(logger: Logger,
                       tbcs: TbcsApi,
                       product_id: str,
@@ -454,6 +465,14 @@ def get_or_create_kwd(logger: Logger,
     - par_list => List of the parameters containing dictionaries (keys: id, name, description)
     - {} => if the signature of the keyword is wrong
     """
+    # Importers may resolve Keywords from several threads (see ImportExecutor), so lookup and creation
+    # have to be atomic - otherwise the same Keyword could be created twice.
+    with _keyword_lock:
+        return __get_or_create_kwd(logger, tbcs, product_id, new_keyword, signature_check, update_level)
+
+
+def __get_or_create_kwd(logger: Logger, tbcs: TbcsApi, product_id: str, new_keyword: dict, signature_check: bool,
+                        update_level: int) -> dict:
     if tbcs.keyword_list == {}:
         tbcs.keyword_list = tbcs.get_keyword_list(product_id)
     keyword_list = tbcs.keyword_list
@@ -528,8 +547,10 @@ def get_or_create_kwd(logger: Logger,
                         mismatch = mismatch + 1
 
             if mismatch == 0 or signature_check == False:
+                # Copies, as the callers add the values of their Test Step to the parameters, concurrently to other
+                # Test Cases using the same Keyword (see ImportExecutor)
                 for parameter in keyword['parameters']:
-                    par_list.append(parameter)
+                    par_list.append(dict(parameter))
 
                 logger.debug(f"Found existing Keyword {keyword['name']} with id: {keyword['id']}")
                 if updated > 0:
@@ -551,10 +572,18 @@ def get_or_create_kwd(logger: Logger,
             if 'description' in arg.keys():
                 variables['paramDescription'] = arg['description']
             par_id = tbcs.create_keyword_param(product_id, keyword_id, variables)
-            if 'paramDescription' in variables:
-                par_list.append({'id': par_id, 'name': arg['name'], 'description': variables['paramDescription']})
+            par_list.append({'id': par_id, 'name': arg['name'], 'description': variables.get('paramDescription', "")})
             # logger.debug(f"Successfully created Parameter with id: {par_id}")
 
+    # Remember the new Keyword, so it is reused instead of created again within this import
+    keyword_list.append({
+        'id': keyword_id,
+        'name': name,
+        'description': description,
+        'originalText': name,
+        'parameters': [dict(parameter) for parameter in par_list],
+    })
+
     return {'id': keyword_id, 'par_list': par_list, 'action': 'created'}
 
 
@@ -635,9 +664,48 @@ def handle_default_args(account: dict, parser: argparse.ArgumentParser) -> argpa
                         const=True,
                         default=False,
                         help='for debugging only: ignore SSL warnings')
+    parser.add_argument('--record',
+                        nargs=1,
+                        metavar='CASSETTE',
+                        help='record the requests to TestBench CS and their responses to a file (".gz": compressed)')
+    parser.add_argument('--replay',
+                        nargs=1,
+                        metavar='CASSETTE',
+                        help='answer the requests from a file recorded with --record instead of TestBench CS')
+    parser.add_argument('--replay-latency',
+                        type=float,
+                        default=0.0,
+                        metavar='FACTOR',
+                        help='delay replayed responses by their recorded duration multiplied by FACTOR (default: 0)')
+    parser.add_argument('--profile',
+                        nargs=1,
+                        metavar='DIRECTORY',
+                        help='write profiles (collapsed stacks, speedscope, phase timers) of each session to DIRECTORY')
+    parser.add_argument('--profile-interval',
+                        type=float,
+                        default=profile_utils.SAMPLE_INTERVAL * 1000,
+                        metavar='MS',
+                        help=f'interval of the profile samples in ms (default: {profile_utils.SAMPLE_INTERVAL * 1000:g})')
 
     parameter_set = parser.parse_args()
 
+    if parameter_set.profile != None:
+        import utils.logger_utils as logger_utils
+        profile_utils.start(logger_utils.get_logger('Profiler', config.LOGLEVEL), parameter_set.profile[0],
+                            os.path.splitext(os.path.basename(parser.prog))[0], parameter_set.profile_interval / 1000)
+
+    if parameter_set.record != None and parameter_set.replay != None:
+        parser.error("--record and --replay cannot be combined")
+    if parameter_set.record != None:
+        cassette_utils.record(parameter_set.record[0])
+    if parameter_set.replay != None:
+        if not os.path.isfile(parameter_set.replay[0]):
+            parser.error(f"cassette '{parameter_set.replay[0]}' not found")
+        cassette_utils.replay(parameter_set.replay[0], parameter_set.replay_latency)
+        # the login is replayed as well, so no credentials are needed
+        for key in ('WORKSPACE', 'LOGIN', 'PASSWORD'):
+            account[key] = account[key] or "replay"
+
     # for debugging on local setups -->
     import urllib3
 
@@ -748,3 +816,373 @@ def get_sections(logger: Logger, tbcs: TbcsApi, product_id: str, tc_id: str) ->
         result_sections[section['title']] = section['id']
 
     return result_sections
+
+
+class DependencyFailedError(Exception):
+    """
+    Raised for an import task which was not run because one of the tasks it depends on failed.
+    """
+
+
+class ImportTask():
+    """
+    Handle of a single upload step (e.g. "create Test Case") scheduled by an ImportExecutor.
+
+    A task can be passed as argument to further tasks: it is replaced by its result before those run.
+    """
+
+    def __init__(self, name: str, depends_on: List['ImportTask']):
+        self.name = name
+        self.depends_on = depends_on
+        self.future: Future = Future()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def failed(self) -> bool:
+        return self.future.done() and self.future.exception() is not None
+
+    def result(self, timeout: Union[float, None] = None) -> Any:
+        """
+        Waits for the task and returns its result (or raises its exception).
+        """
+        return self.future.result(timeout)
+
+
+class ImportExecutor():
+    """
+    Runs the uploads of an importer as a dependency graph (Epic -> User Story -> Test Case -> Test Step Block -> ...).
+
+    A task is started as soon as all tasks it depends on have finished successfully, so independent branches
+    (e.g. different Test Cases) are uploaded concurrently while parent-child ordering is kept. Tasks which only have to
+    run one after the other (e.g. imports of Test Cases with the same title) are ordered with 'after' instead: such a
+    task also runs if the earlier one failed. Concurrency is bounded by the number of worker threads. Transient
+    failures of single requests are retried by TbcsApi; tasks themselves are only retried if 'retries' is set, which is
+    safe for idempotent tasks only (e.g. a retried task creating a Test Case and its Test Steps would create them
+    twice).
+
+    Usage:
+        with ImportExecutor(logger, getattr(config, "IMPORT_WORKERS", 4)) as executor:
+            epic = executor.submit("Epic", tbcs.post_epic, product_id, {"name": "Epic"})
+            story = executor.submit("User Story", create_user_story, epic)  # epic is replaced by the Epic id
+        failed = executor.failed_tasks()
+    """
+
+    def __init__(self,
+                 logger: Logger,
+                 max_workers: int = 4,
+                 retries: int = 0,
+                 backoff: float = 1.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (requests.exceptions.RequestException, )):
+        """
+        Initializes the executor.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger instance
+
+        max_workers: int
+            Maximum number of uploads running at the same time
+
+        retries: int
+            Number of retries for a failed task (only for exceptions listed in retry_on); tasks must be idempotent
+
+        backoff: float
+            Delay in seconds before the first retry; doubled for each further retry
+
+        retry_on: Tuple[Type[BaseException], ...]
+            Exceptions considered transient. TbcsApi reports unexpected status codes as AssertionError, which are
+            mostly permanent (e.g. validation errors), so they are not retried by default.
+        """
+        self.__logger = logger
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__retry_on = retry_on
+        self.__pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="import")
+        self.__lock = threading.Lock()
+        self.__tasks: List[ImportTask] = []
+
+    def __enter__(self) -> 'ImportExecutor':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.wait()
+        self.shutdown()
+
+    def submit(self,
+               name: str,
+               fn: Callable,
+               *args,
+               depends_on: Union[List[ImportTask], None] = None,
+               after: Union[List[ImportTask], None] = None,
+               **kwargs) -> ImportTask:
+        """
+        Schedules a task.
+
+        Parameters
+        ----------
+        name: str
+            Name of the task used for logging, e.g. "Test Case 'Login'"
+
+        fn: Callable
+            Function to be called
+
+        *args, **kwargs:
+            Arguments of fn. ImportTask arguments are dependencies and are replaced by their results.
+
+        depends_on: List[ImportTask]
+            (optional) Additional tasks which have to finish successfully before this one starts
+
+        after: List[ImportTask]
+            (optional) Tasks which have to finish before this one starts; unlike depends_on, this task is also run if
+            they failed
+
+        Returns
+        -------
+        ImportTask
+            Handle of the scheduled task
+        """
+        dependencies = list(depends_on or [])
+        dependencies.extend(arg for arg in list(args) + list(kwargs.values()) if isinstance(arg, ImportTask))
+
+        task = ImportTask(name, dependencies)
+        with self.__lock:
+            self.__tasks.append(task)
+
+        pending = [len(dependencies) + len(after or [])]
+
+        def on_dependency_done(_):
+            with self.__lock:
+                pending[0] -= 1
+                if pending[0] > 0:
+                    return
+
+            failed = [dependency.name for dependency in dependencies if dependency.failed()]
+            if failed:
+                task.future.set_exception(DependencyFailedError(f"Skipped - failed dependencies: {', '.join(failed)}"))
+                return
+
+            self.__pool.submit(self.__run, task, fn, args, kwargs)
+
+        if pending[0] == 0:
+            self.__pool.submit(self.__run, task, fn, args, kwargs)
+        for dependency in dependencies + list(after or []):
+            dependency.future.add_done_callback(on_dependency_done)
+
+        return task
+
+    def __run(self, task: ImportTask, fn: Callable, args: tuple, kwargs: dict) -> None:
+        if not task.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            args = tuple(arg.result() if isinstance(arg, ImportTask) else arg for arg in args)
+            kwargs = {key: value.result() if isinstance(value, ImportTask) else value for key, value in kwargs.items()}
+
+            attempt = 0
+            while True:
+                try:
+                    result = fn(*args, **kwargs)
+                    break
+                except self.__retry_on as e:
+                    if attempt >= self.__retries:
+                        raise
+                    delay = self.__backoff * (2**attempt)
+                    attempt += 1
+                    self.__logger.debug(
+                        f"Import task {task.name} failed - retry {attempt} in {delay}s\n\t{e.__str__()}")
+                    sleep(delay)
+        except BaseException as e:
+            self.__logger.error(f"Import task {task.name} failed\n\t{e.__str__()}")
+            task.future.set_exception(e)
+            return
+
+        task.future.set_result(result)
+
+    def wait(self) -> List[ImportTask]:
+        """
+        Waits until all scheduled tasks are finished (including tasks scheduled while waiting).
+
+        Returns
+        -------
+        List[ImportTask]
+            Tasks which failed or were skipped because a dependency failed
+        """
+        while True:
+            with self.__lock:
+                tasks = list(self.__tasks)
+            wait([task.future for task in tasks])
+            with self.__lock:
+                if len(tasks) == len(self.__tasks):
+                    break
+
+        return self.failed_tasks()
+
+    def failed_tasks(self) -> List[ImportTask]:
+        """
+        Returns all finished tasks which failed or were skipped.
+        """
+        with self.__lock:
+            return [task for task in self.__tasks if task.failed()]
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker threads (after running tasks are finished).
+        """
+        self.__pool.shutdown(wait=True)
+
+
+def report_step_results(logger: Logger,
+                        tbcs: TbcsApi,
+                        product_id: str,
+                        test_case_id: str,
+                        execution_id: str,
+                        step_results: List[Tuple[str, dict]],
+                        max_workers: int = 4) -> int:
+    """
+    Reports the results of several Test Steps of an execution in one go.
+
+    TestBench CS accepts only one Test Step result per request, so the requests are sent concurrently.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    tbcs: TbcsApi
+        TbcsApi instance
+
+    product_id: str
+        Id of the product
+
+    test_case_id: str
+        Id of the Test Case
+
+    execution_id: str
+        Id of the Execution
+
+    step_results: List[Tuple[str, dict]]
+        List of (Test Step id, body), the body as for TbcsApi.report_step_result, e.g. {"result": "Passed"}
+
+    max_workers: int
+        Maximum number of requests running at the same time
+
+    Returns
+    -------
+    int
+        Number of Test Step results which could not be reported
+    """
+    if not step_results:
+        return 0
+
+    with ImportExecutor(logger, min(max_workers, len(step_results))) as executor:
+        for test_step_id, body in step_results:
+            executor.submit(f"Test Step result {test_step_id}", tbcs.report_step_result, product_id, test_case_id,
+                            str(test_step_id), execution_id, body)
+    return len(executor.failed_tasks())
+
+
+def get_user_stories(logger: Logger,
+                     tbcs: TbcsApi,
+                     product_id: str,
+                     user_story_ids: Iterable[str],
+                     max_workers: int = 4) -> Dict[str, dict]:
+    """
+    Returns several User Stories, the requests are sent concurrently.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    tbcs: TbcsApi
+        TbcsApi instance
+
+    product_id: str
+        Id of the product
+
+    user_story_ids: Iterable[str]
+        Ids of the User Stories, duplicates are requested only once
+
+    max_workers: int
+        Maximum number of requests running at the same time
+
+    Returns
+    -------
+    Dict[str, dict]
+        User Stories by id (as returned by TbcsApi.get_user_story); User Stories which could not be read are missing
+    """
+    user_story_ids = list(dict.fromkeys(str(user_story_id) for user_story_id in user_story_ids))
+    if not user_story_ids:
+        return {}
+
+    with ImportExecutor(logger, min(max_workers, len(user_story_ids))) as executor:
+        tasks = {
+            user_story_id: executor.submit(f"User Story {user_story_id}", tbcs.get_user_story, product_id,
+                                           user_story_id) for user_story_id in user_story_ids
+        }
+    return {user_story_id: task.result() for user_story_id, task in tasks.items() if not task.failed()}
+
+
+# Marks the values of a DDT row in a concrete Test Case returned by TestBench CS
+DDT_VALUE_MARKER = "#*#"
+
+
+def remove_ddt_markers(item: Any) -> Any:
+    """
+    Removes the markers of DDT values (DDT_VALUE_MARKER) from all texts of a concrete Test Case.
+
+    Parameters
+    ----------
+    item: Any
+        Concrete Test Case (as returned by TbcsApi.get_concrete_test_case) or a part of it, changed in place
+
+    Returns
+    -------
+    Any
+        The item without markers
+    """
+    if isinstance(item, dict):
+        for key, value in item.items():
+            item[key] = remove_ddt_markers(value)
+    elif isinstance(item, list):
+        for index, value in enumerate(item):
+            item[index] = remove_ddt_markers(value)
+    elif isinstance(item, str):
+        return item.replace(DDT_VALUE_MARKER, "")
+    return item
+
+
+def expand_ddt_test_case(test_case_item: dict, ddt_row: List[dict]) -> dict:
+    """
+    Builds the concrete Test Case of a DDT row locally: each reference to a column ("${column}") in the texts of the
+    abstract Test Case is replaced by the value of the row.
+
+    Parameters
+    ----------
+    test_case_item: dict
+        Abstract Test Case, not changed
+
+    ddt_row: List[dict]
+        Column - value pairs of the row (see TbcsApi.get_ddt_row)
+
+    Returns
+    -------
+    dict
+        Concrete Test Case (without markers of the values, see remove_ddt_markers)
+    """
+    values = {"${" + entry['column'] + "}": entry['value'] for entry in ddt_row}
+    # one pass over each text, so values containing references are not replaced again
+    reference = re.compile("|".join(re.escape(name) for name in sorted(values, key=len, reverse=True)))
+
+    def expand(item: Any) -> Any:
+        if isinstance(item, dict):
+            return {key: expand(value) for key, value in item.items()}
+        if isinstance(item, list):
+            return [expand(value) for value in item]
+        if isinstance(item, str) and values:
+            return reference.sub(lambda match: values[match.group(0)], item)
+        return item
+
+    return expand(test_case_item)
@@ -0,0 +1,435 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import Logger
+from typing import Callable, Dict, Iterator, List, Union
+
+import requests
+
+# Environment variable with the trace context passed to subprocesses (W3C Trace Context "traceparent")
+TRACEPARENT_ENV = "TRACEPARENT"
+
+_TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# OTLP span kind INTERNAL and status codes OK / ERROR
+_SPAN_KIND_INTERNAL = 1
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+class SpanContext:
+    """
+    Identifies a span within a trace (trace id: 32 hex digits, span id: 16 hex digits).
+    """
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def to_traceparent(self) -> str:
+        """
+        Returns the context as value of the W3C header "traceparent" (sampled).
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @staticmethod
+    def from_traceparent(value: Union[str, None]) -> Union['SpanContext', None]:
+        """
+        Parses the value of a W3C header "traceparent"; None if the value is empty or invalid.
+        """
+        match = _TRACEPARENT_PATTERN.match((value or "").strip().lower())
+        if match == None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+            return None
+        return SpanContext(match.group(1), match.group(2))
+
+
+class Span:
+    """
+    A timed phase of the agent (e.g. a poll cycle, the run of a Test Case) with attributes; use Tracer.start_span() or
+    Tracer.span() to create spans.
+    """
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Union[SpanContext, None], local_root: bool,
+                 attributes: Union[dict, None], links: Union[List[SpanContext], None], start_time: Union[float, None]):
+        self.name = name
+        self.context = SpanContext(parent.trace_id if parent != None else os.urandom(16).hex(), os.urandom(8).hex())
+        self.parent = parent
+        # the span has no parent in this process, ending it exports the finished spans
+        self.local_root = local_root
+        self.attributes = dict(attributes or {})
+        self.links = list(links or [])
+        self.start_time = start_time or time.time()
+        self.end_time: Union[float, None] = None
+        self.error: Union[str, None] = None
+        self.__tracer = tracer
+
+    def set_attribute(self, key: str, value: Union[str, int, float, bool]) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    def end(self, end_time: Union[float, None] = None) -> None:
+        """
+        Ends the span (at end_time, default: now); only the first call has an effect.
+        """
+        if self.end_time != None:
+            return
+        self.end_time = end_time or time.time()
+        self.__tracer._finish(self)
+
+    def to_otlp(self) -> dict:
+        """
+        Returns the span in the JSON encoding of OTLP (OpenTelemetry protocol).
+        """
+        otlp = {
+            'traceId': self.context.trace_id,
+            'spanId': self.context.span_id,
+            'name': self.name,
+            'kind': _SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(int(self.start_time * 1e9)),
+            'endTimeUnixNano': str(int((self.end_time or self.start_time) * 1e9)),
+            'attributes': _to_otlp_attributes(self.attributes),
+            'status': {
+                'code': _STATUS_OK
+            } if self.error == None else {
+                'code': _STATUS_ERROR,
+                'message': self.error
+            }
+        }
+        if self.parent != None:
+            otlp['parentSpanId'] = self.parent.span_id
+        if self.links:
+            otlp['links'] = [{'traceId': link.trace_id, 'spanId': link.span_id} for link in self.links]
+        return otlp
+
+
+def _to_otlp_attributes(attributes: dict) -> List[dict]:
+    otlp = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            otlp_value = {'boolValue': value}
+        elif isinstance(value, int):
+            otlp_value = {'intValue': str(value)}
+        elif isinstance(value, float):
+            otlp_value = {'doubleValue': value}
+        else:
+            otlp_value = {'stringValue': str(value)}
+        otlp.append({'key': key, 'value': otlp_value})
+    return otlp
+
+
+class SpanExporter:
+    """
+    Base class of the exporters of finished spans.
+    """
+
+    def export(self, payload: dict) -> None:
+        """
+        Exports spans (payload: OTLP ExportTraceServiceRequest in JSON encoding).
+        """
+        raise NotImplementedError
+
+
+class FileExporter(SpanExporter):
+    """
+    Appends the spans to a file, one OTLP JSON request per line (e.g. for the file receiver of the OpenTelemetry
+    Collector). Several processes (agent, Robot Framework listener) may write to the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, payload: dict) -> None:
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(payload) + "\n")
+
+
+class OtlpHttpExporter(SpanExporter):
+    """
+    Sends the spans to a collector with OTLP/HTTP in JSON encoding, e.g. to http://localhost:4318/v1/traces.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def export(self, payload: dict) -> None:
+        response = requests.post(self.url, json=payload, timeout=10)
+        response.raise_for_status()
+
+
+# Called with each finished span, whether or not spans are exported (e.g. by the phase timers of profile_utils)
+_span_listeners: List[Callable[[Span], None]] = []
+
+# Marks the default parent of a span: the current span
+_CURRENT = SpanContext("", "")
+
+# Span of the current thread or task, see get_current_span()
+_current_span: ContextVar[Union[Span, None]] = ContextVar('tbcs_current_span', default=None)
+
+
+class Tracer:
+    """
+    Creates spans and exports them when a trace of this process is finished (i.e. when a span without a parent in this
+    process ends). Without exporter, spans are only created for the span listeners (see add_span_listener()): they are
+    neither kept nor exported, and their context is not passed on (see get_traceparent()).
+    """
+
+    def __init__(self, logger: Union[Logger, None], exporter: Union[SpanExporter, None], service_name: str,
+                 remote_parent: Union[SpanContext, None] = None):
+        """
+        Initializes the tracer.
+
+        Parameters
+        ----------
+        logger: logging.Logger | None
+            Logger instance for failed exports
+
+        exporter: SpanExporter | None
+            Exporter of the finished spans; None: tracing is off
+
+        service_name: str
+            Name of the process in the traces (resource attribute "service.name")
+
+        remote_parent: SpanContext | None
+            Parent of the spans started without a current span, e.g. the span of the agent which started this process
+        """
+        self.__logger = logger
+        self.__exporter = exporter
+        self.__service_name = service_name
+        self.__remote_parent = remote_parent
+        self.__lock = threading.Lock()
+        self.__finished: List[Span] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.__exporter != None or _span_listeners != []
+
+    @property
+    def exporting(self) -> bool:
+        return self.__exporter != None
+
+    def start_span(self,
+                   name: str,
+                   attributes: Union[dict, None] = None,
+                   parent: Union[SpanContext, None] = _CURRENT,
+                   links: Union[List[SpanContext], None] = None,
+                   start_time: Union[float, None] = None) -> Span:
+        """
+        Starts a span, which must be ended with Span.end().
+
+        Parameters
+        ----------
+        name: str
+            Name of the span
+
+        attributes: dict | None
+            Attributes of the span (values: str, int, float or bool)
+
+        parent: SpanContext | None
+            Parent of the span; default: the current span (or the remote parent of the tracer), None: new trace
+
+        links: List[SpanContext] | None
+            Related spans of other traces
+
+        start_time: float | None
+            Start of the span (seconds since the epoch); default: now
+
+        Returns
+        -------
+        Span
+            The span
+        """
+        # spans with an explicit parent belong to a trace of this process (e.g. uploads in other threads)
+        local_root = parent == None
+        if parent is _CURRENT:
+            current_span = _current_span.get()
+            local_root = current_span == None
+            parent = current_span.context if current_span != None else self.__remote_parent
+        return Span(self, name, parent, local_root, attributes, links, start_time)
+
+    @contextmanager
+    def span(self,
+             name: str,
+             attributes: Union[dict, None] = None,
+             parent: Union[SpanContext, None] = _CURRENT,
+             links: Union[List[SpanContext], None] = None) -> Iterator[Span]:
+        """
+        Runs the block within a new span (the current span of the block), see start_span(). Exceptions are recorded as
+        error of the span.
+        """
+        span = self.start_span(name, attributes, parent, links)
+        try:
+            with activate(span):
+                yield span
+        except BaseException as e:
+            span.set_error(f"{e.__class__.__name__}: {e.__str__()}")
+            raise
+        finally:
+            span.end()
+
+    def flush(self) -> None:
+        """
+        Exports all finished spans; failures are logged.
+        """
+        with self.__lock:
+            spans, self.__finished = self.__finished, []
+        if spans == [] or self.__exporter == None:
+            return
+
+        payload = {
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': _to_otlp_attributes({'service.name': self.__service_name})
+                },
+                'scopeSpans': [{
+                    'scope': {
+                        'name': 'tbcs-agent'
+                    },
+                    'spans': [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        try:
+            self.__exporter.export(payload)
+        except Exception as e:
+            if self.__logger != None:
+                self.__logger.warning(f"Exporting {len(spans)} span(s) failed!\n\t{e.__str__()}")
+
+    def _finish(self, span: Span) -> None:
+        for listener in _span_listeners:
+            listener(span)
+        if self.__exporter == None:
+            return
+        with self.__lock:
+            self.__finished.append(span)
+        if span.local_root:
+            self.flush()
+
+
+# Tracer of the process, see configure()
+_tracer = Tracer(None, None, "")
+
+
+def configure(logger: Logger, exporter: str, service_name: str) -> Tracer:
+    """
+    Sets up the tracer of the process. The trace context in the environment variable TRACEPARENT_ENV (set by the agent
+    for the tools it starts) becomes the parent of the spans started without a current span.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger instance
+
+    exporter: str
+        "file:<path>": append the spans to a file, "otlp:<url>": send them to a collector (OTLP/HTTP with JSON),
+        "": tracing is off
+
+    service_name: str
+        Name of the process in the traces
+
+    Returns
+    -------
+    Tracer
+        The tracer of the process, see get_tracer()
+    """
+    global _tracer
+    kind, _, target = exporter.partition(':')
+    span_exporter: Union[SpanExporter, None] = None
+    if kind == 'file' and target:
+        span_exporter = FileExporter(target)
+    elif kind == 'otlp' and target:
+        span_exporter = OtlpHttpExporter(target)
+    elif exporter != "":
+        logger.warning(f"Unknown trace exporter '{exporter}', tracing is off")
+
+    _tracer = Tracer(logger, span_exporter, service_name,
+                     SpanContext.from_traceparent(os.environ.get(TRACEPARENT_ENV)))
+    return _tracer
+
+
+def add_span_listener(listener: Callable[[Span], None]) -> None:
+    """
+    Adds a function called with each finished span of the process. Spans are created as long as there is a listener,
+    even if tracing is off.
+    """
+    _span_listeners.append(listener)
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the tracer of the process (tracing is off until configure() is called).
+    """
+    return _tracer
+
+
+def get_current_span() -> Union[Span, None]:
+    """
+    Returns the current span of the thread or task; None if there is none.
+    """
+    return _current_span.get()
+
+
+def set_current_span(span: Union[Span, None]) -> None:
+    """
+    Sets the current span of the thread or task; prefer Tracer.span() or activate() for blocks.
+    """
+    _current_span.set(span)
+
+
+@contextmanager
+def activate(span: Union[Span, None]) -> Iterator[None]:
+    """
+    Makes a span the current span within the block, without ending it.
+    """
+    token = _current_span.set(span)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+
+
+def start_child_span(name: str, attributes: Union[dict, None] = None) -> Union[Span, None]:
+    """
+    Starts a span within the current span; None if tracing is off or there is no current span (e.g. for requests,
+    which are only of interest as part of a phase).
+    """
+    if not _tracer.enabled or _current_span.get() == None:
+        return None
+    return _tracer.start_span(name, attributes)
+
+
+def add_span(name: str, start_time: float, end_time: float, attributes: Union[dict, None] = None) -> None:
+    """
+    Adds a finished span within the current span, e.g. for work done in a worker process, which is measured there and
+    traced by the calling process (times in seconds since the epoch).
+    """
+    if _tracer.enabled:
+        _tracer.start_span(name, attributes, start_time=start_time).end(end_time)
+
+
+def get_traceparent(span: Union[Span, None] = None) -> str:
+    """
+    Returns the context of a span (default: the current span) as value of the W3C header "traceparent"; "" if tracing
+    is off or there is no span. Spans of a tracer without exporter (only created for the span listeners, e.g. the
+    profiler) stay in the process, their context is "" as well.
+    """
+    span = span or _current_span.get()
+    if not _tracer.exporting or span == None:
+        return ""
+    return span.context.to_traceparent()
+
+
+def get_env(span: Union[Span, None] = None) -> Union[Dict[str, str], None]:
+    """
+    Returns the environment for a subprocess: the environment of this process and the context of a span (default: the
+    current span) in TRACEPARENT_ENV; None (i.e. the environment is inherited) if tracing is off or there is no span.
+    """
+    traceparent = get_traceparent(span)
+    if traceparent == "":
+        return None
+    return dict(os.environ, **{TRACEPARENT_ENV: traceparent})